@@ -33,7 +33,7 @@ document.addEventListener('DOMContentLoaded', function() {
 // Загрузка списка пользователей
 async function loadUsers() {
     const tbody = document.getElementById('users-tbody');
-    tbody.innerHTML = '<tr><td colspan="6" class="loading">Загрузка...</td></tr>';
+    tbody.innerHTML = '<tr><td colspan="8" class="loading">Загрузка...</td></tr>';
 
     try {
         const response = await fetch('/api/users');
@@ -41,7 +41,7 @@ async function loadUsers() {
 
         if (result.success) {
             if (result.data.length === 0) {
-                tbody.innerHTML = '<tr><td colspan="6" class="empty-state">Пользователи не найдены</td></tr>';
+                tbody.innerHTML = '<tr><td colspan="8" class="empty-state">Пользователи не найдены</td></tr>';
                 return;
             }
 
@@ -53,13 +53,15 @@ async function loadUsers() {
                     <td>${user.username ? '@' + user.username : '—'}</td>
                     <td>${formatDate(user.created_at)}</td>
                     <td>${user.last_action_date ? formatDate(user.last_action_date) : 'Нет действий'}</td>
+                    <td>${user.wheels_count}</td>
+                    <td>${user.last_score_avg !== null ? user.last_score_avg : '—'}</td>
                 </tr>
             `).join('');
         } else {
-            tbody.innerHTML = `<tr><td colspan="6" class="empty-state">Ошибка: ${result.error}</td></tr>`;
+            tbody.innerHTML = `<tr><td colspan="8" class="empty-state">Ошибка: ${result.error}</td></tr>`;
         }
     } catch (error) {
-        tbody.innerHTML = `<tr><td colspan="6" class="empty-state">Ошибка загрузки: ${error.message}</td></tr>`;
+        tbody.innerHTML = `<tr><td colspan="8" class="empty-state">Ошибка загрузки: ${error.message}</td></tr>`;
     }
 }
 
@@ -9,10 +9,14 @@ from telegram.constants import ParseMode
 from telegram.ext import ApplicationBuilder, CommandHandler, CallbackQueryHandler, ContextTypes, MessageHandler, filters
 from telegram_wheel_bot.handlers.wheel import build_conversation as wheel_conversation
 from telegram_wheel_bot.handlers.history import history_cmd, build_callbacks as history_callbacks
-from telegram_wheel_bot.handlers.admin import clear_cmd
+from telegram_wheel_bot.handlers.admin import clear_cmd, llm_status_cmd
 from telegram_wheel_bot.handlers.clean import build_clean_handlers
 from telegram_wheel_bot.database import init_db as wheel_init_db
-from telegram_wheel_bot.main import ensure_storage as wheel_ensure_storage
+from telegram_wheel_bot.main import (
+    ensure_storage as wheel_ensure_storage,
+    on_startup as wheel_on_startup,
+    on_shutdown as wheel_on_shutdown,
+)
 
 # Импорт настроек после импортов telegram
 from app.core.config import settings
@@ -175,10 +179,17 @@ async def setup_bot(application):
     """Инициализация бота."""
     wheel_init_db()
     wheel_ensure_storage()
+    await wheel_on_startup(application)
     await setup_bot_commands(application)
     logger.info("Бот инициализирован")
 
 
+async def shutdown_bot(application):
+    """Освобождение ресурсов бота."""
+    await wheel_on_shutdown(application)
+    logger.info("Бот остановлен")
+
+
 def main() -> None:
     """Запуск бота."""
     if not settings.TELEGRAM_BOT_TOKEN:
@@ -205,6 +216,7 @@ def main() -> None:
     
     application.add_handler(CommandHandler("clear", clear_cmd))
     application.add_handler(MessageHandler(filters.Regex(r"^/Clear$"), clear_cmd))
+    application.add_handler(CommandHandler("llm", llm_status_cmd))
     application.add_handler(wheel_conversation())
 
     # Добавьте новые команды здесь по шаблону:
@@ -222,6 +234,7 @@ def main() -> None:
 
     # Инициализация бота
     application.post_init = setup_bot
+    application.post_shutdown = shutdown_bot
 
     # Запуск бота в режиме long polling
     logger.info("Запуск бота...")
@@ -0,0 +1,106 @@
+"""
+Бенчмарк списка пользователей админ-панели (/api/users) в зависимости от числа строк.
+
+Сравнивает прежнюю реализацию (2N+1 запросов) с агрегированным запросом
+get_all_users_with_last_action().
+
+Запуск:
+    python -m benchmarks.bench_admin_users --sizes 1000 10000 100000
+    python -m benchmarks.bench_admin_users --skip-legacy   # только новый запрос
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+_tmp_dir = tempfile.mkdtemp(prefix="wheel_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}"
+
+from sqlalchemy import delete, desc, insert, select  # noqa: E402
+from telegram_wheel_bot.database.models import User, UserActionLog, Wheel, WheelCategory  # noqa: E402
+from telegram_wheel_bot.database.repository import (  # noqa: E402
+    SessionLocal,
+    get_all_users_with_last_action,
+    init_db,
+)
+
+
+def legacy_get_all_users_with_last_action() -> list[dict]:
+    """Прежняя реализация: два дополнительных запроса на каждого пользователя."""
+    with SessionLocal() as session:
+        users = session.execute(select(User)).scalars().all()
+        result = []
+        for user in users:
+            last_wheel = session.execute(
+                select(Wheel).where(Wheel.user_id == user.id).order_by(desc(Wheel.created_at))
+            ).scalars().first()
+            last_action = session.execute(
+                select(UserActionLog).where(UserActionLog.user_id == user.id).order_by(desc(UserActionLog.created_at))
+            ).scalars().first()
+            dates = [x.created_at for x in (last_wheel, last_action) if x]
+            result.append({'id': user.id, 'last_action_date': max(dates) if dates else None})
+        return result
+
+
+def seed(users: int, wheels_per_user: int = 3, actions_per_user: int = 2) -> None:
+    rnd = random.Random(users)
+    now = datetime.utcnow()
+    with SessionLocal() as session:
+        for table in (WheelCategory, UserActionLog, Wheel, User):
+            session.execute(delete(table))
+        session.execute(
+            insert(User),
+            [{"id": i, "telegram_id": 10_000_000 + i, "username": f"u{i}", "first_name": "Bench", "created_at": now}
+             for i in range(1, users + 1)],
+        )
+        wheel_rows = []
+        cat_rows = []
+        wid = 0
+        for uid in range(1, users + 1):
+            for k in range(rnd.randint(0, wheels_per_user)):
+                wid += 1
+                wheel_rows.append({"id": wid, "user_id": uid, "name": f"w{k}", "created_at": now - timedelta(days=30 * k)})
+                cat_rows.extend(
+                    {"wheel_id": wid, "category_name": f"c{o}", "value": rnd.randint(1, 10), "order": o} for o in range(8)
+                )
+        session.execute(insert(Wheel), wheel_rows)
+        session.execute(insert(WheelCategory), cat_rows)
+        session.execute(
+            insert(UserActionLog),
+            [{"user_id": uid, "action": "ad_shown", "created_at": now - timedelta(hours=n)}
+             for uid in range(1, users + 1) for n in range(rnd.randint(0, actions_per_user))],
+        )
+        session.commit()
+
+
+def timed(fn) -> tuple[float, int]:
+    started = time.perf_counter()
+    rows = fn()
+    return time.perf_counter() - started, len(rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    init_db()
+    for size in args.sizes:
+        seed(size)
+        new_time, rows = timed(get_all_users_with_last_action)
+        line = f"users={size:>7} rows={rows:>7} aggregated={new_time * 1000:9.1f}ms"
+        if not args.skip_legacy:
+            old_time, _ = timed(legacy_get_all_users_with_last_action)
+            line += f" legacy={old_time * 1000:9.1f}ms speedup={old_time / new_time:5.1f}x"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
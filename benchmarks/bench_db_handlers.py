@@ -0,0 +1,112 @@
+"""
+Бенчмарк задержки callback-хендлеров при работе с БД.
+
+Моделирует N пользователей, апдейты которых приходят с фиксированной частотой;
+каждый апдейт выполняет типичную последовательность обращений к БД (регистрация, история, лог действия).
+Сравнивает синхронный repository (блокирует event loop) и async_repository.
+
+Запуск:
+    python -m benchmarks.bench_db_handlers --users 200 --rounds 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+_tmp_dir = tempfile.mkdtemp(prefix="wheel_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+
+from telegram_wheel_bot.database import repository as sync_repo  # noqa: E402
+from telegram_wheel_bot.database import async_repository as async_repo  # noqa: E402
+from telegram_wheel_bot.services.user_service import register_user  # noqa: E402
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(p / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+async def sync_callback(telegram_id: int) -> None:
+    user = sync_repo.get_or_create_user(telegram_id, f"user{telegram_id}", "Bench")
+    sync_repo.list_user_wheels(user.id)
+    sync_repo.log_user_action(user.id, "bench")
+
+
+async def async_callback(telegram_id: int) -> None:
+    user_id = await register_user(telegram_id, f"user{telegram_id}", "Bench")
+    await async_repo.list_user_wheels(user_id)
+    await async_repo.log_user_action(user_id, "bench")
+
+
+async def run_scenario(callback, users: int, rounds: int, rate: float) -> tuple[list[float], float]:
+    """Открытая модель нагрузки: апдейты приходят с заданной частотой.
+
+    Задержка считается от момента прихода апдейта до окончания обработки,
+    поэтому включает время ожидания заблокированного event loop.
+    """
+    latencies: list[float] = []
+    max_lag = 0.0
+    stop = asyncio.Event()
+
+    async def lag_probe() -> None:
+        nonlocal max_lag
+        while not stop.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.005)
+            max_lag = max(max_lag, (time.perf_counter() - started - 0.005) * 1000)
+
+    async def one_update(telegram_id: int, arrival: float) -> None:
+        await callback(telegram_id)
+        latencies.append((time.perf_counter() - arrival) * 1000)
+
+    probe = asyncio.create_task(lag_probe())
+    tasks = []
+    t0 = time.perf_counter()
+    for n in range(users * rounds):
+        arrival = t0 + n / rate
+        delay = arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one_update(1_000_000 + n % users, arrival)))
+    await asyncio.gather(*tasks)
+    stop.set()
+    await probe
+    return latencies, max_lag
+
+
+def report(name: str, latencies: list[float], elapsed: float, max_lag: float) -> None:
+    print(
+        f"{name:>6}: n={len(latencies)} total={elapsed:.2f}s "
+        f"p50={percentile(latencies, 50):.1f}ms p95={percentile(latencies, 95):.1f}ms "
+        f"p99={percentile(latencies, 99):.1f}ms mean={statistics.fmean(latencies):.1f}ms "
+        f"max_loop_lag={max_lag:.1f}ms"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--rate", type=float, default=200.0, help="апдейтов в секунду")
+    args = parser.parse_args()
+
+    sync_repo.init_db()
+    for name, callback in (("sync", sync_callback), ("async", async_callback)):
+        started = time.perf_counter()
+        latencies, max_lag = await run_scenario(callback, args.users, args.rounds, args.rate)
+        report(name, latencies, time.perf_counter() - started, max_lag)
+    await async_repo.dispose_engine()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,69 @@
+"""
+Накладные расходы на вызов LLM: новый httpx.AsyncClient на каждый запрос
+против общего клиента с пулом соединений.
+
+Запросы идут к локальной заглушке Ollama (benchmarks.llm_stub) без
+задержки генерации, поэтому разница — это создание клиента и установка
+TCP-соединения. Для HTTPS-провайдеров к ней добавляется TLS-рукопожатие.
+
+Запуск:
+    python -m benchmarks.bench_llm_client --calls 500
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.llm_stub import LLMStub, StubProfile  # noqa: E402
+
+stub = LLMStub(StubProfile(latency=0, sigma=0)).start()
+os.environ["OLLAMA_URL"] = stub.url
+os.environ["LLM_DEFAULT_PROVIDER"] = "ollama"
+
+import httpx  # noqa: E402
+from telegram_wheel_bot.services import llm_service  # noqa: E402
+
+SCORES = {f"Категория {i}": i + 1 for i in range(8)}
+
+
+async def per_call_client() -> None:
+    async with httpx.AsyncClient(timeout=httpx.Timeout(120.0)) as client:
+        await client.get(f"{llm_service.OLLAMA_URL}/api/tags")
+    async with httpx.AsyncClient(timeout=httpx.Timeout(120.0)) as client:
+        await client.post(f"{llm_service.OLLAMA_URL}/api/generate", json={"prompt": "x"})
+
+
+async def shared_client() -> None:
+    client = llm_service.get_http_client()
+    await client.get(f"{llm_service.OLLAMA_URL}/api/tags")
+    await client.post(f"{llm_service.OLLAMA_URL}/api/generate", json={"prompt": "x"})
+
+
+async def measure(name: str, fn, calls: int) -> None:
+    await fn()
+    started = time.perf_counter()
+    for _ in range(calls):
+        await fn()
+    elapsed = time.perf_counter() - started
+    print(f"{name:<16} calls={calls:>6} total={elapsed:7.2f}s per_call={elapsed / calls * 1000:7.3f}ms")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=500, help="число пар запросов (проверка + генерация)")
+    args = parser.parse_args()
+
+    await llm_service.start_http_client()
+    await measure("per-call client", per_call_client, args.calls)
+    await measure("shared client", shared_client, args.calls)
+    await measure("analyze_wheel", lambda: llm_service.analyze_wheel(SCORES), args.calls)
+    await llm_service.close_http_client()
+    stub.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,193 @@
+"""
+Сквозная нагрузка на llm_service через локальную заглушку провайдеров.
+
+Поднимает benchmarks.llm_stub, направляет на нее OLLAMA_URL и
+OPENAI_BASE_URL и вызывает analyze_wheel / compare_wheels / stream_analysis
+с фиксированным числом одновременных запросов. В запросах участвует весь
+путь бота: выбор модели (router), ограничители, объединение запросов,
+размыкатели цепи, хеджирование. Кэш ответов выключен. Сеть не нужна.
+
+Отчет: пропускная способность, p50/p95/p99 задержки успешных запросов
+(для потока — и времени до первого фрагмента), ошибки по типам исключений,
+счетчики заглушки, ограничителей и повторов.
+
+Запуск:
+    python -m benchmarks.bench_llm_throughput --requests 200 --concurrency 8
+    python -m benchmarks.bench_llm_throughput --provider openai --kind stream \\
+        --openai latency=1,sigma=0.6,error_rate=0.05 --ollama latency=3 --hedging
+    python -m benchmarks.bench_llm_throughput --json --max-error-rate 0.01  # для CI
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.llm_stub import LLMStub, StubProfile  # noqa: E402
+
+CATEGORIES = ["Здоровье", "Карьера", "Финансы", "Отношения", "Семья", "Друзья", "Развитие", "Отдых"]
+
+
+def percentile(values: list[float], p: float) -> float | None:
+    """Процентиль по ближайшему рангу; values отсортированы."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))]
+
+
+def summary(values: list[float]) -> dict:
+    values = sorted(values)
+    return {
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": values[-1] if values else None,
+    }
+
+
+def error_kind(error: Exception) -> str:
+    """Вид ошибки: тип исключения, для LLMUnavailable — и тип причины."""
+    name = type(error).__name__
+    if error.__cause__ is not None and type(error.__cause__) is not type(error):
+        name += f"({type(error.__cause__).__name__})"
+    return name
+
+
+class Load:
+    def __init__(self, llm_service, kind: str, same: bool, seed: int):
+        self.llm = llm_service
+        self.kind = kind
+        self.same = same
+        self.rng = random.Random(seed)
+        self.latencies: list[float] = []
+        self.ttft: list[float] = []
+        self.errors: Counter[str] = Counter()
+
+    def scores(self) -> dict[str, int]:
+        if self.same:
+            return {c: i + 1 for i, c in enumerate(CATEGORIES)}
+        return {c: self.rng.randint(1, 10) for c in CATEGORIES}
+
+    async def call(self) -> str:
+        if self.kind == "analysis":
+            return await self.llm.analyze_wheel(self.scores())
+        if self.kind == "comparison":
+            return await self.llm.compare_wheels(self.scores(), self.scores(), "01.01.2025", "01.02.2025")
+        started = time.perf_counter()
+        chunks = []
+        async for chunk in self.llm.stream_analysis(self.scores()):
+            if not chunks:
+                self.ttft.append(time.perf_counter() - started)
+            chunks.append(chunk)
+        return "".join(chunks)
+
+    async def one(self) -> None:
+        started = time.perf_counter()
+        try:
+            await self.call()
+        except Exception as e:
+            self.errors[error_kind(e)] += 1
+            return
+        self.latencies.append(time.perf_counter() - started)
+
+    async def run(self, requests: int, concurrency: int) -> float:
+        remaining = requests
+
+        async def worker() -> None:
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                await self.one()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.perf_counter() - started
+
+
+def print_report(report: dict) -> None:
+    print(
+        f"{report['kind']} via {report['provider']}: {report['requests']} requests, "
+        f"concurrency {report['concurrency']}, {report['elapsed_s']:.2f}s, "
+        f"{report['throughput_rps']:.2f} req/s ({report['ok']} ok)"
+    )
+    for name in ("latency_s", "ttft_s"):
+        stats = report.get(name)
+        if stats and stats["p50"] is not None:
+            print(f"  {name:<10} " + "  ".join(f"{k}={v:.3f}" for k, v in stats.items()))
+    print(f"  errors      {report['errors'] or 'none'}")
+    print(f"  stub        {report['stub']}")
+    print(f"  limiters    {report['limiters']}")
+    print(f"  retries     {report['retries']}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--provider", choices=["ollama", "openai"], default="ollama", help="LLM_DEFAULT_PROVIDER")
+    parser.add_argument("--kind", choices=["analysis", "comparison", "stream"], default="analysis")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--ollama", default="latency=0.2,sigma=0.5", help="профиль заглушки Ollama (см. llm_stub)")
+    parser.add_argument("--openai", default="latency=0.1,sigma=0.5", help="профиль заглушки OpenAI")
+    parser.add_argument("--hedging", action="store_true", help="LLM_HEDGING=1")
+    parser.add_argument("--same", action="store_true", help="одинаковые оценки во всех запросах (объединение)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="отчет одной строкой JSON")
+    parser.add_argument("--max-error-rate", type=float, default=None, help="код выхода 1, если ошибок больше")
+    args = parser.parse_args()
+
+    stub = LLMStub(StubProfile.parse(args.ollama), StubProfile.parse(args.openai), seed=args.seed).start()
+    # Настройки читаются при импорте config, поэтому окружение задается до импорта llm_service
+    os.environ.update(
+        {
+            "OLLAMA_URL": stub.url,
+            "OPENAI_BASE_URL": f"{stub.url}/v1",
+            "OPENAI_API_KEY": "stub",
+            "LLM_DEFAULT_PROVIDER": args.provider,
+            "LLM_HEDGING": "1" if args.hedging else "0",
+            "LLM_STREAMING": "1",
+            "ANALYSIS_CACHE_ENABLED": "0",
+        }
+    )
+    from telegram_wheel_bot.services import llm_service
+
+    await llm_service.start_http_client()
+    await llm_service.health.check_all()
+    load = Load(llm_service, args.kind, args.same, args.seed)
+    try:
+        elapsed = await load.run(args.requests, args.concurrency)
+    finally:
+        await llm_service.close_http_client()
+        stub.stop()
+
+    failed = sum(load.errors.values())
+    report = {
+        "provider": args.provider,
+        "kind": args.kind,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "elapsed_s": elapsed,
+        "throughput_rps": args.requests / elapsed,
+        "ok": len(load.latencies),
+        "latency_s": summary(load.latencies),
+        "ttft_s": summary(load.ttft) if args.kind == "stream" else None,
+        "errors": dict(load.errors),
+        "stub": stub.stats(),
+        "limiters": llm_service.limiter_stats(),
+        "retries": llm_service.policy_stats(),
+    }
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False))
+    else:
+        print_report(report)
+    if args.max_error_rate is not None and failed > args.max_error_rate * args.requests:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
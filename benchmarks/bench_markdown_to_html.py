@@ -0,0 +1,76 @@
+"""
+Конвертация ответа LLM в HTML: прежняя цепочка регулярных выражений
+(clean_text + markdown_to_html) против однопроходного токенизатора
+services/telegram_html и его разбиения на сообщения (markdown_to_parts:
+тот же разбор, части собираются из готовых токенов).
+
+Входные данные — ответы из benchmarks/llm_outputs.
+
+Запуск:
+    python -m benchmarks.bench_markdown_to_html --repeat 2000
+"""
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from telegram_wheel_bot.services.telegram_html import markdown_to_html, markdown_to_parts  # noqa: E402
+
+CORPUS_DIR = Path(__file__).parent / "llm_outputs"
+
+
+def legacy_clean_text(text: str) -> str:
+    text = re.sub(r"^```\w*\s*\n?", "", text, flags=re.MULTILINE)
+    text = re.sub(r"\n?```\s*$", "", text, flags=re.MULTILINE)
+    text = text.strip()
+    while text.startswith("```"):
+        text = re.sub(r"^```\w*\s*\n?", "", text)
+        text = text.strip()
+    while text.endswith("```"):
+        text = re.sub(r"\n?```\s*$", "", text)
+        text = text.strip()
+    return text.strip()
+
+
+def legacy_markdown_to_html(text: str) -> str:
+    text = legacy_clean_text(text)
+    text = re.sub(r"^##\s+(.+)$", r"<b>\1</b>", text, flags=re.MULTILINE)
+    text = re.sub(r"\*\*(.+?)\*\*", r"<b>\1</b>", text)
+    text = re.sub(r"^-\s+", "• ", text, flags=re.MULTILINE)
+    return text
+
+
+def load_corpus() -> dict[str, str]:
+    return {path.stem: path.read_text(encoding="utf-8") for path in sorted(CORPUS_DIR.glob("*.txt"))}
+
+
+def measure(func, text: str, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func(text)
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    print(f"{'sample':<22}{'chars':>7}{'legacy, us':>12}{'new, us':>10}{'+split, us':>12}{'parts':>7}")
+    totals = [0.0, 0.0, 0.0]
+    for name, text in corpus.items():
+        legacy = measure(legacy_markdown_to_html, text, args.repeat)
+        new = measure(markdown_to_html, text, args.repeat)
+        split = measure(markdown_to_parts, text, args.repeat)
+        parts = len(markdown_to_parts(text))
+        totals = [totals[0] + legacy, totals[1] + new, totals[2] + split]
+        print(f"{name:<22}{len(text):>7}{legacy:>12.1f}{new:>10.1f}{split:>12.1f}{parts:>7}")
+    print(f"{'total':<22}{'':>7}{totals[0]:>12.1f}{totals[1]:>10.1f}{totals[2]:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
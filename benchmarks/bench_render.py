@@ -0,0 +1,105 @@
+"""
+Отрисовка диаграмм при одновременных запросах: прямо в цикле событий (как
+раньше в хендлерах), в потоке (RenderPool без процессов) и в пуле прогретых
+процессов.
+
+Помимо времени отрисовки меряется задержка цикла событий: фоновая задача
+просыпается каждые 10 мс, и наибольшее опоздание показывает, насколько
+надолго бот перестал бы опрашивать Telegram и отвечать другим пользователям.
+
+Запуск:
+    python -m benchmarks.bench_render --requests 40 --concurrency 8 --workers 2
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Процессы пула (spawn) наследуют окружение и получают тот же каталог
+if __name__ == "__main__":
+    os.environ["WHEELS_DIR"] = tempfile.mkdtemp(prefix="wheel_render_")
+
+from telegram_wheel_bot.database.score_vector import CATEGORIES  # noqa: E402
+from telegram_wheel_bot.services.render_pool import RenderPool  # noqa: E402
+from telegram_wheel_bot.services.visualization import draw_wheel_comparison, draw_wheel_new  # noqa: E402
+
+
+def request_args(n: int) -> tuple:
+    scores = {c: (n + i) % 10 + 1 for i, c in enumerate(CATEGORIES)}
+    if n % 2:
+        return draw_wheel_new, n, list(scores.items())
+    previous = {c: (n + 3 * i) % 10 + 1 for i, c in enumerate(CATEGORIES)}
+    return draw_wheel_comparison, n, n + 1, scores, previous, "Октябрь", "Сентябрь"
+
+
+async def inline_draw(fn, *args):
+    return fn(*args)
+
+
+async def loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+async def measure(name: str, draw, requests: int, concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def one(n: int) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            await draw(*request_args(n))
+            latencies.append(time.perf_counter() - started)
+
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(loop_lag(stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(one(n) for n in range(requests)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    lag = await monitor
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(
+        f"{name:<8} renders={requests:>4} total={elapsed:6.2f}s rate={requests / elapsed:6.1f}/s "
+        f"p50={statistics.median(latencies) * 1000:7.0f}ms p95={p95 * 1000:7.0f}ms "
+        f"max_loop_lag={lag * 1000:6.0f}ms"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8, help="одновременных запросов пользователей")
+    parser.add_argument("--workers", type=int, default=2, help="процессов в пуле")
+    args = parser.parse_args()
+    max_queue = args.requests
+
+    # Прогрев текущего процесса, чтобы инлайн-режим не платил за импорт шрифтов
+    await inline_draw(*request_args(0))
+    await measure("inline", inline_draw, args.requests, args.concurrency)
+
+    thread = RenderPool(0, max_queue, timeout=600)
+    await measure("thread", thread.draw, args.requests, args.concurrency)
+
+    pool = RenderPool(args.workers, max_queue, timeout=600)
+    started = time.perf_counter()
+    await pool.start()
+    print(f"pool start (spawn + warm-up): {time.perf_counter() - started:.2f}s")
+    await measure("pool", pool.draw, args.requests, args.concurrency)
+    print(f"pool stats: {pool.stats()}")
+    await pool.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+"""
+Бенчмарк вставки колес: прежний ORM-путь против Core-вставки и массового импорта.
+
+  legacy  — 8 ORM-объектов WheelCategory, flush, commit и refresh на каждое колесо;
+  core    — create_wheel_with_categories(): INSERT ... RETURNING + executemany категорий;
+  bulk    — bulk_import_wheels(): пачки колес и категорий в одной транзакции.
+
+Запуск:
+    python -m benchmarks.bench_wheel_insert --count 100000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+_tmp_dir = tempfile.mkdtemp(prefix="wheel_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+
+from sqlalchemy import delete  # noqa: E402
+from telegram_wheel_bot.database import async_repository as async_repo  # noqa: E402
+from telegram_wheel_bot.database.models import Wheel, WheelCategory  # noqa: E402
+from telegram_wheel_bot.database.repository import SessionLocal, bulk_import_wheels, init_db  # noqa: E402
+
+SCORES = [(f"Категория {i}", i + 1) for i in range(8)]
+
+
+async def legacy_create(user_id: int, name: str) -> int:
+    async def op(session) -> int:
+        wheel = Wheel(user_id=user_id, name=name, created_at=datetime.utcnow())
+        session.add(wheel)
+        await session.flush()
+        for idx, (cat, val) in enumerate(SCORES):
+            session.add(WheelCategory(wheel_id=wheel.id, category_name=cat, value=val, order=idx))
+        await session.commit()
+        await session.refresh(wheel)
+        return wheel.id
+
+    return await async_repo.db_writer.submit(op)
+
+
+async def core_create(user_id: int, name: str) -> int:
+    return await async_repo.create_wheel_with_categories(user_id, name, SCORES)
+
+
+def reset() -> None:
+    with SessionLocal() as session:
+        session.execute(delete(WheelCategory))
+        session.execute(delete(Wheel))
+        session.commit()
+
+
+async def timed_single(name: str, create, count: int) -> None:
+    reset()
+    started = time.perf_counter()
+    for n in range(count):
+        await create(1, f"w{n}")
+    elapsed = time.perf_counter() - started
+    print(f"{name:<7} wheels={count:>7} total={elapsed:8.2f}s per_wheel={elapsed / count * 1e6:8.1f}us")
+
+
+def timed_bulk(count: int, batch_size: int) -> None:
+    reset()
+    started = time.perf_counter()
+    bulk_import_wheels(((1, f"w{n}", None, SCORES) for n in range(count)), batch_size=batch_size)
+    elapsed = time.perf_counter() - started
+    print(f"{'bulk':<7} wheels={count:>7} total={elapsed:8.2f}s per_wheel={elapsed / count * 1e6:8.1f}us")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    init_db()
+    await timed_single("legacy", legacy_create, args.count)
+    await timed_single("core", core_create, args.count)
+    timed_bulk(args.count, args.batch_size)
+    await async_repo.dispose_engine()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,134 @@
+"""
+Число SQL-запросов и сессий на обработку open_wheel / compare_latest / compare_cmd.
+
+Сравнивает прежнюю последовательность вызовов (get_wheel, get_scores и поиск
+колеса прошлого месяца) с read model WheelSnapshot.
+
+Запуск:
+    python -m benchmarks.bench_wheel_snapshot --history 24
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+_tmp_dir = tempfile.mkdtemp(prefix="wheel_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+
+from sqlalchemy import event  # noqa: E402
+from telegram_wheel_bot.database import init_db  # noqa: E402
+from telegram_wheel_bot.database import async_repository as repo  # noqa: E402
+from telegram_wheel_bot.database.score_vector import CATEGORIES  # noqa: E402
+from telegram_wheel_bot.services import history_service as hs  # noqa: E402
+from telegram_wheel_bot.utils import MONTHS_RU, previous_month_label, parse_month_label  # noqa: E402
+
+
+class Counter:
+    def __init__(self):
+        self.statements = 0
+        self.connections = 0
+
+    def reset(self):
+        self.statements = 0
+        self.connections = 0
+
+
+counter = Counter()
+
+
+@event.listens_for(repo.async_engine.sync_engine, "before_cursor_execute")
+def _count_statement(*args):
+    counter.statements += 1
+
+
+@event.listens_for(repo.async_engine.sync_engine, "checkout")
+def _count_checkout(*args):
+    counter.connections += 1
+
+
+async def previous_filled(user_id: int):
+    """Прежний отдельный запрос колеса за прошлый календарный месяц."""
+    return await repo.get_wheel_by_period(user_id, parse_month_label(previous_month_label()))
+
+
+async def legacy_open_wheel(wheel_id: int) -> None:
+    w = await hs.get_wheel(wheel_id)
+    await hs.get_scores(wheel_id)
+    await previous_filled(w.user_id)
+
+
+async def snapshot_open_wheel(wheel_id: int) -> None:
+    await hs.get_snapshot(wheel_id)
+
+
+async def legacy_compare_cmd(wheel_id: int) -> None:
+    w = await hs.get_wheel(wheel_id)
+    prev = await previous_filled(w.user_id)
+    await hs.get_wheel(w.id)
+    await hs.get_wheel(prev.id)
+    await hs.get_scores(w.id)
+    await hs.get_scores(prev.id)
+
+
+async def snapshot_compare_cmd(wheel_id: int) -> None:
+    await hs.get_snapshot(wheel_id)
+
+
+async def legacy_compare_latest(a: int, b: int) -> None:
+    await hs.get_wheel(a)
+    await hs.get_wheel(b)
+    await hs.get_scores(a)
+    await hs.get_scores(b)
+
+
+async def snapshot_compare_latest(a: int, b: int) -> None:
+    await hs.get_snapshots([a, b])
+
+
+async def measure(name: str, fn, *args, repeat: int = 200) -> None:
+    counter.reset()
+    await fn(*args)
+    statements, connections = counter.statements, counter.connections
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await fn(*args)
+    per_call = (time.perf_counter() - started) / repeat * 1000
+    print(f"{name:<24} statements={statements:>3} sessions={connections:>3} time={per_call:6.2f}ms")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", type=int, default=24, help="число колес в истории пользователя")
+    args = parser.parse_args()
+
+    init_db()
+    user_id = await repo.get_or_create_user_id(1, "bench", "Bench")
+    # История помесячно назад от прошлого месяца: ids[0] — колесо прошлого месяца
+    month = parse_month_label(previous_month_label())
+    ids = []
+    for _ in range(args.history):
+        name = f"{MONTHS_RU[month.month - 1]} {month.year % 100}"
+        ids.append(await repo.create_wheel_with_categories(user_id, name, [(c, i + 1) for i, c in enumerate(CATEGORIES)]))
+        month = (month - timedelta(days=1)).replace(day=1)
+    current, previous = ids[1], ids[0]
+    snapshot = await hs.get_snapshot(current)
+    assert snapshot.previous is not None and snapshot.previous.id == previous
+
+    await measure("open_wheel legacy", legacy_open_wheel, current)
+    await measure("open_wheel snapshot", snapshot_open_wheel, current)
+    await measure("compare_cmd legacy", legacy_compare_cmd, current)
+    await measure("compare_cmd snapshot", snapshot_compare_cmd, current)
+    await measure("compare_latest legacy", legacy_compare_latest, current, previous)
+    await measure("compare_latest snapshot", snapshot_compare_latest, current, previous)
+    await repo.dispose_engine()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
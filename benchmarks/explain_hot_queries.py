@@ -0,0 +1,65 @@
+"""
+Проверка планов выполнения (EXPLAIN QUERY PLAN) для горячих запросов бота.
+
+Копирует указанную базу (по умолчанию создает пустую), применяет миграции
+и проверяет, что запросы используют составные индексы. Завершается с кодом 1,
+если хотя бы один запрос не использует ожидаемый индекс.
+
+Запуск:
+    python -m benchmarks.explain_hot_queries
+    python -m benchmarks.explain_hot_queries --database data/wheel_of_life.db
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", help="путь к существующей SQLite базе (не изменяется)")
+    args = parser.parse_args()
+
+    tmp_path = os.path.join(tempfile.mkdtemp(prefix="wheel_explain_"), "explain.db")
+    if args.database:
+        shutil.copyfile(args.database, tmp_path)
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp_path}"
+
+    from sqlalchemy import desc, select, text
+    from telegram_wheel_bot.database.models import UserActionLog, Wheel
+    from telegram_wheel_bot.database.repository import engine, init_db
+
+    init_db()
+    checks = [
+        (
+            "get_latest_wheel / list_user_wheels",
+            select(Wheel).where(Wheel.user_id == 1).order_by(desc(Wheel.created_at)),
+            "ix_wheels_user_id_created_at",
+        ),
+        (
+            "get_last_user_action_time",
+            select(UserActionLog)
+            .where(UserActionLog.user_id == 1, UserActionLog.action == "ad_shown")
+            .order_by(desc(UserActionLog.created_at)),
+            "ix_user_action_logs_user_id_action_created_at",
+        ),
+    ]
+    failed = 0
+    with engine.connect() as conn:
+        for name, stmt, index in checks:
+            sql = str(stmt.compile(engine, compile_kwargs={"literal_binds": True}))
+            plan = [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+            ok = any(index in detail for detail in plan) and not any("USE TEMP B-TREE" in d for d in plan)
+            failed += not ok
+            print(f"[{'OK' if ok else 'FAIL'}] {name}")
+            for detail in plan:
+                print(f"       {detail}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
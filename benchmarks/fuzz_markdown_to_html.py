@@ -0,0 +1,135 @@
+"""
+Проверка markdown_to_html/markdown_to_parts/split_html на корпусе ответов LLM и их мутациях.
+
+Каждый ответ из benchmarks/llm_outputs прогоняется как есть, обрезанным в
+случайном месте (оборванная генерация) и со вставками разметочных символов
+и тегов. Для результата проверяется, что Telegram его примет: только
+разрешенные теги, все закрыты и вложены правильно, нет голых < > &; каждая
+часть markdown_to_parts и split_html укладывается в лимит и сама по себе
+корректна, а вместе части содержат тот же видимый текст.
+
+Запуск:
+    python -m benchmarks.fuzz_markdown_to_html --iterations 5000 --seed 1
+"""
+import argparse
+import random
+import re
+import sys
+from html.parser import HTMLParser
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from telegram_wheel_bot.services.telegram_html import (  # noqa: E402
+    ALLOWED_TAGS,
+    markdown_to_html,
+    markdown_to_parts,
+    split_html,
+)
+
+CORPUS_DIR = Path(__file__).parent / "llm_outputs"
+INSERTS = [
+    "<", ">", "&", "**", "*", "#", "## ", "- ", "\n", "\n\n", "```", "```html\n", "<b>", "</b>", "<i>",
+    "</i>", "<u>", "</p>", "<p>", "<br>", "<h2>", "</h2>", "<code>", "</code>", "<pre>", "</pre>",
+    '<a href="https://example.com/?a=1&b=2">', "</a>", "&amp;", "&nbsp;", "&#128512;", "<3", "a<b", "->",
+    '<span class="tg-spoiler">', "</span>", "<script>", "🔥", " ",
+]
+BARE = re.compile(r"&(?!(?:lt|gt|amp|quot|#\d+|#x[0-9a-fA-F]+);)")
+
+
+class TelegramHTMLChecker(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack: list[str] = []
+        self.errors: list[str] = []
+        self.text: list[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in ALLOWED_TAGS:
+            self.errors.append(f"tag <{tag}>")
+        self.stack.append(tag)
+
+    def handle_endtag(self, tag):
+        if not self.stack or self.stack[-1] != tag:
+            self.errors.append(f"misnested </{tag}>, open {self.stack}")
+            return
+        self.stack.pop()
+
+    def handle_data(self, data):
+        self.text.append(data)
+
+
+def check(html: str) -> tuple[list[str], str]:
+    checker = TelegramHTMLChecker()
+    checker.feed(html)
+    checker.close()
+    errors = checker.errors
+    if checker.stack:
+        errors.append(f"unclosed {checker.stack}")
+    outside = re.sub(r"<[^<>]*>", "", html)
+    if "<" in outside or ">" in outside:
+        errors.append("bare < or >")
+    if BARE.search(outside):
+        errors.append("bare &")
+    return errors, re.sub(r"\s+", "", "".join(checker.text))
+
+
+def mutate(text: str, rng: random.Random) -> str:
+    if rng.random() < 0.3:
+        text = text[: rng.randrange(len(text) + 1)]
+    for _ in range(rng.randrange(1, 8)):
+        position = rng.randrange(len(text) + 1)
+        text = text[:position] + rng.choice(INSERTS) + text[position:]
+    return text
+
+
+def verify_parts(parts: list[str], limit: int, visible: str, label: str) -> list[str]:
+    errors = []
+    joined = ""
+    for part in parts:
+        if len(part) > limit:
+            errors.append(f"{label}: part of {len(part)} chars > {limit}")
+        part_errors, part_visible = check(part)
+        errors.extend(f"{label}: {e}" for e in part_errors)
+        joined += part_visible
+    if joined != visible:
+        errors.append(f"{label}: split changed visible text")
+    return errors
+
+
+def verify(text: str, limit: int) -> list[str]:
+    html = markdown_to_html(text)
+    errors, visible = check(html)
+    errors += verify_parts(markdown_to_parts(text, limit), limit, visible, "markdown_to_parts")
+    errors += verify_parts(split_html(html, limit), limit, visible, "split_html")
+    return errors
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = {path.stem: path.read_text(encoding="utf-8") for path in sorted(CORPUS_DIR.glob("*.txt"))}
+    failures = 0
+    for name, text in corpus.items():
+        errors = verify(text, 4096)
+        if errors:
+            failures += 1
+            print(f"{name}: {errors[:3]}")
+    for i in range(args.iterations):
+        name = rng.choice(list(corpus))
+        text = mutate(corpus[name], rng)
+        errors = verify(text, rng.choice([200, 1000, 4096]))
+        if errors:
+            failures += 1
+            if failures <= 10:
+                print(f"{name} #{i}: {errors[:3]}\n{text!r}\n")
+    print(f"{len(corpus)} samples, {args.iterations} mutations, {failures} failures")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
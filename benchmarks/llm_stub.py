@@ -0,0 +1,264 @@
+"""
+Локальная заглушка LLM-провайдеров для нагрузочных тестов без сети.
+
+Один HTTP-сервер отвечает за оба API, которые использует llm_service:
+  Ollama:  POST /api/generate (stream=false и NDJSON-поток), GET /api/tags
+  OpenAI:  POST [/v1]/chat/completions (JSON и SSE-поток), GET [/v1]/models
+
+Поведение задается отдельно для каждого провайдера (StubProfile):
+  latency=0.5   медиана полного времени генерации, сек
+  sigma=0.5     разброс: время = latency * exp(sigma * N(0, 1)), 0 — фиксированное
+  ttft=0.2      медиана времени до первого фрагмента в потоке (тот же разброс)
+  chunks=20     число фрагментов потока; остаток времени делится между ними
+  error_rate=0  доля ответов HTTP 500
+  overload_rate=0  доля ответов HTTP 429
+  break_rate=0  доля потоков, оборванных на середине
+  models=stub   модели в /api/tags и /models через "|"
+
+Тексты ответов берутся по кругу из benchmarks/llm_outputs. Запрос с
+num_predict / max_tokens = 1 (проверка модели) отвечает сразу.
+
+Запуск отдельно (например, для ручной проверки бота):
+    python -m benchmarks.llm_stub --port 11434 --ollama latency=2,sigma=0.3 --openai error_rate=0.1
+    OLLAMA_URL=http://127.0.0.1:11434 OPENAI_BASE_URL=http://127.0.0.1:11434/v1 python -m app.main
+"""
+import argparse
+import itertools
+import json
+import math
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, fields, replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+CORPUS_DIR = Path(__file__).parent / "llm_outputs"
+
+
+@dataclass(frozen=True)
+class StubProfile:
+    latency: float = 0.5
+    sigma: float = 0.5
+    ttft: float = 0.2
+    chunks: int = 20
+    error_rate: float = 0.0
+    overload_rate: float = 0.0
+    break_rate: float = 0.0
+    models: tuple[str, ...] = ("stub",)
+
+    @classmethod
+    def parse(cls, spec: str, base: "StubProfile | None" = None) -> "StubProfile":
+        """Профиль из строки вида "latency=0.5,error_rate=0.05,models=a|b"."""
+        base = base or cls()
+        types = {f.name: type(getattr(base, f.name)) for f in fields(cls)}
+        values = {}
+        for item in filter(None, (part.strip() for part in spec.split(","))):
+            name, _, value = item.partition("=")
+            if name not in types:
+                raise ValueError(f"unknown stub option {name!r}, expected one of {', '.join(types)}")
+            values[name] = tuple(value.split("|")) if types[name] is tuple else types[name](value)
+        return replace(base, **values)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: "StubHTTPServer"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _provider(self) -> str | None:
+        path = self.path.split("?", 1)[0]
+        if path.startswith("/api/"):
+            return "ollama"
+        if path.endswith("/chat/completions") or path.endswith("/models"):
+            return "openai"
+        return None
+
+    def do_GET(self):
+        provider = self._provider()
+        if provider is None or self.path.endswith("/generate"):
+            self._send(404, {"error": "not found"})
+            return
+        stub = self.server.stub
+        stub.count(provider, "models")
+        models = stub.profiles[provider].models
+        if provider == "ollama":
+            self._send(200, {"models": [{"name": m, "model": m} for m in models]})
+        else:
+            self._send(200, {"object": "list", "data": [{"id": m, "object": "model"} for m in models]})
+
+    def do_POST(self):
+        provider = self._provider()
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if provider is None:
+            self._send(404, {"error": "not found"})
+            return
+        request = json.loads(body or b"{}")
+        stub = self.server.stub
+        profile = stub.profiles[provider]
+        model = request.get("model", "stub")
+        if (request.get("options") or {}).get("num_predict") == 1 or request.get("max_tokens") == 1:
+            stub.count(provider, "probe")
+            self._reply(provider, model, "ok")
+            return
+        roll = stub.rng.random()
+        if roll < profile.error_rate:
+            stub.count(provider, "http_500")
+            time.sleep(stub.sample(profile.ttft, profile.sigma))
+            self._send(500, {"error": "stub: internal error"})
+            return
+        if roll < profile.error_rate + profile.overload_rate:
+            stub.count(provider, "http_429")
+            self._send(429, {"error": "stub: rate limited"})
+            return
+        text = stub.next_text()
+        if request.get("stream"):
+            self._stream(provider, model, text, profile)
+        else:
+            stub.count(provider, "ok")
+            time.sleep(stub.sample(profile.latency, profile.sigma))
+            self._reply(provider, model, text)
+
+    def _reply(self, provider: str, model: str, text: str) -> None:
+        if provider == "ollama":
+            self._send(200, {"model": model, "response": text, "done": True})
+        else:
+            self._send(200, {"model": model, "choices": [{"index": 0, "message": {"role": "assistant", "content": text}}]})
+
+    def _stream(self, provider: str, model: str, text: str, profile: StubProfile) -> None:
+        """Поток до закрытия соединения: NDJSON для Ollama, SSE для OpenAI."""
+        stub = self.server.stub
+        ttft = stub.sample(profile.ttft, profile.sigma)
+        total = max(stub.sample(profile.latency, profile.sigma), ttft)
+        count = max(profile.chunks, 1)
+        size = math.ceil(len(text) / count)
+        pieces = [text[i:i + size] for i in range(0, len(text), size)]
+        broken = stub.rng.random() < profile.break_rate
+        if broken:
+            pieces = pieces[: max(len(pieces) // 2, 1)]
+        stub.count(provider, "stream_break" if broken else "stream_ok")
+
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson" if provider == "ollama" else "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        time.sleep(ttft)
+        for i, piece in enumerate(pieces):
+            if i:
+                time.sleep((total - ttft) / max(len(pieces) - 1, 1))
+            if provider == "ollama":
+                line = json.dumps({"model": model, "response": piece, "done": False}, ensure_ascii=False) + "\n"
+            else:
+                chunk = {"model": model, "choices": [{"index": 0, "delta": {"content": piece}}]}
+                line = f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+            self.wfile.write(line.encode())
+            self.wfile.flush()
+        if broken:
+            return
+        if provider == "ollama":
+            self.wfile.write(json.dumps({"model": model, "response": "", "done": True}).encode() + b"\n")
+        else:
+            self.wfile.write(b"data: [DONE]\n\n")
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    stub: "LLMStub"
+
+    def handle_error(self, request, client_address):
+        # Клиент закрыл поток раньше времени (срок, хедж) — штатная ситуация
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class LLMStub:
+    def __init__(
+        self,
+        ollama: StubProfile | None = None,
+        openai: StubProfile | None = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        seed: int | None = None,
+    ):
+        self.profiles = {"ollama": ollama or StubProfile(), "openai": openai or StubProfile()}
+        self.rng = random.Random(seed)
+        texts = [path.read_text(encoding="utf-8") for path in sorted(CORPUS_DIR.glob("*.txt"))]
+        self._texts = itertools.cycle(texts or ["## Анализ\n**ok**"])
+        self._lock = threading.Lock()
+        self._counts: Counter[str] = Counter()
+        self._server = StubHTTPServer((host, port), StubHandler)
+        self._server.stub = self
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def sample(self, median: float, sigma: float) -> float:
+        if median <= 0:
+            return 0.0
+        with self._lock:
+            return median * math.exp(sigma * self.rng.gauss(0, 1)) if sigma else median
+
+    def next_text(self) -> str:
+        with self._lock:
+            return next(self._texts)
+
+    def count(self, provider: str, outcome: str) -> None:
+        with self._lock:
+            self._counts[f"{provider}.{outcome}"] += 1
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return dict(sorted(self._counts.items()))
+
+    def start(self) -> "LLMStub":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="llm-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--ollama", default="", help="профиль Ollama, например latency=2,sigma=0.3")
+    parser.add_argument("--openai", default="", help="профиль OpenAI, например latency=1,error_rate=0.05")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    stub = LLMStub(StubProfile.parse(args.ollama), StubProfile.parse(args.openai), args.host, args.port, args.seed)
+    print(f"LLM stub on {stub.url} (OpenAI base URL {stub.url}/v1)", file=sys.stderr)
+    try:
+        stub.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(stub.stats()), file=sys.stderr)
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
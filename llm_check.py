@@ -1,6 +1,7 @@
 import asyncio
 import httpx
 from telegram_wheel_bot.services.llm_service import analyze_wheel_with_ollama, format_scores
+from telegram_wheel_bot.services.llm_policy import LLMError
 from telegram_wheel_bot.config import OLLAMA_URL, OLLAMA_MODEL, PROMPTS_DIR
 
 
@@ -15,8 +16,12 @@ async def run():
         "Личное развитие": 8,
         "Работа/бизнес": 8,
     }
-    result = await analyze_wheel_with_ollama(scores)
-    if result == "Ошибка анализа":
+    try:
+        result = await analyze_wheel_with_ollama(scores)
+    except LLMError as e:
+        print(f"{type(e).__name__}: {e}")
+        result = None
+    if result is None:
         formatted_scores = format_scores(scores)
         with open(f"{PROMPTS_DIR}/wheel_analysis.txt", "r", encoding="utf-8") as f:
             prompt_template = f.read()
@@ -10,6 +10,99 @@ ADMIN_IDS = [
     int(x) for x in os.getenv("ADMIN_IDS", "").split(",") if x.strip().isdigit()
 ]
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///wheel_of_life.db")
+# Асинхронный драйвер для бота (по умолчанию тот же файл SQLite через aiosqlite)
+ASYNC_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL",
+    DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    if DATABASE_URL.startswith("sqlite://")
+    else DATABASE_URL,
+)
+# Профиль SQLite: применяется к каждому новому соединению (бот и админ-панель)
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Отрицательное значение — размер в КиБ (по правилам PRAGMA cache_size)
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))
+# Число соединений бота для чтения; запись всегда идет через одно соединение
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "4"))
+# Кэш telegram_id -> id пользователя в БД
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "3600"))
+# Буфер журнала действий пользователей: размер пачки и период сброса (сек)
+ACTION_LOG_BATCH_SIZE = int(os.getenv("ACTION_LOG_BATCH_SIZE", "100"))
+ACTION_LOG_FLUSH_INTERVAL = float(os.getenv("ACTION_LOG_FLUSH_INTERVAL", "2.0"))
+# Сколько раз повторять пачку, не записанную из-за недоступности БД, и предел
+# несохраненных записей в памяти (сверх него отбрасываются самые старые)
+ACTION_LOG_MAX_RETRIES = int(os.getenv("ACTION_LOG_MAX_RETRIES", "5"))
+ACTION_LOG_MAX_PENDING = int(os.getenv("ACTION_LOG_MAX_PENDING", "10000"))
+# Общий HTTP-клиент LLM: размер пула, keep-alive и таймауты (сек)
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20"))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "10"))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "60"))
+LLM_HTTP_CONNECT_TIMEOUT = float(os.getenv("LLM_HTTP_CONNECT_TIMEOUT", "10"))
+LLM_HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "120"))
+# HTTP/2 включается, только если установлен пакет h2 (httpx[http2])
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "1").lower() in ("1", "true", "yes")
+# Фоновая проверка LLM-провайдеров (сек) и размыкатель цепи
+LLM_HEALTH_INTERVAL = float(os.getenv("LLM_HEALTH_INTERVAL", "30"))
+LLM_HEALTH_TIMEOUT = float(os.getenv("LLM_HEALTH_TIMEOUT", "5"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+# Кэш ответов LLM: размер в памяти, максимум строк в БД и время жизни (сек)
+ANALYSIS_CACHE_ENABLED = os.getenv("ANALYSIS_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+ANALYSIS_CACHE_MEMORY_SIZE = int(os.getenv("ANALYSIS_CACHE_MEMORY_SIZE", "1000"))
+ANALYSIS_CACHE_MAX_ROWS = int(os.getenv("ANALYSIS_CACHE_MAX_ROWS", "50000"))
+ANALYSIS_CACHE_TTL = float(os.getenv("ANALYSIS_CACHE_TTL", str(30 * 24 * 3600)))
+# Потоковый вывод анализа: ответ LLM показывается по мере генерации,
+# сообщение редактируется не чаще раза в LLM_STREAM_EDIT_INTERVAL секунд
+LLM_STREAMING = os.getenv("LLM_STREAMING", "1").lower() in ("1", "true", "yes")
+LLM_STREAM_EDIT_INTERVAL = float(os.getenv("LLM_STREAM_EDIT_INTERVAL", "1.5"))
+# Фоновые задачи анализа: число воркеров, попыток и базовая пауза между попытками (сек)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", "10"))
+# Ограничение одновременных генераций на провайдера, длина очереди ожидания
+# и время ожидания слота (сек); запросы сверх очереди отклоняются сразу
+LLM_MAX_CONCURRENCY_OLLAMA = int(os.getenv("LLM_MAX_CONCURRENCY_OLLAMA", "2"))
+LLM_MAX_CONCURRENCY_OPENAI = int(os.getenv("LLM_MAX_CONCURRENCY_OPENAI", "8"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "20"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "60"))
+# Хеджирование (режим openai): если OpenAI не ответил за LLM_HEDGE_PERCENTILE-й
+# процентиль своей задержки, параллельно запрашивается Ollama. Пока замеров
+# меньше LLM_HEDGE_MIN_SAMPLES, ждем LLM_HEDGE_DEFAULT_DELAY сек, но не меньше LLM_HEDGE_MIN_DELAY
+LLM_HEDGING = os.getenv("LLM_HEDGING", "0").lower() in ("1", "true", "yes")
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "30"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1"))
+# Адаптивный выбор модели: вес нового замера в EWMA, доля ошибок, после которой
+# модель исключается (не раньше LLM_ROUTER_MIN_SAMPLES запросов), период
+# повторной проверки исключенных (сек) и ее таймаут, сколько бесплатных моделей
+# OpenAI брать в кандидаты и как часто ставить первой модель с устаревшим замером
+LLM_ROUTER_ALPHA = float(os.getenv("LLM_ROUTER_ALPHA", "0.2"))
+LLM_ROUTER_MAX_FAILURE_RATE = float(os.getenv("LLM_ROUTER_MAX_FAILURE_RATE", "0.5"))
+LLM_ROUTER_MIN_SAMPLES = int(os.getenv("LLM_ROUTER_MIN_SAMPLES", "3"))
+LLM_ROUTER_REPROBE_INTERVAL = float(os.getenv("LLM_ROUTER_REPROBE_INTERVAL", "300"))
+LLM_ROUTER_PROBE_TIMEOUT = float(os.getenv("LLM_ROUTER_PROBE_TIMEOUT", "30"))
+LLM_ROUTER_MAX_FREE_MODELS = int(os.getenv("LLM_ROUTER_MAX_FREE_MODELS", "3"))
+LLM_ROUTER_EXPLORE_EVERY = int(os.getenv("LLM_ROUTER_EXPLORE_EVERY", "20"))
+# Политика запросов к LLM: срок на весь запрос пользователя со всеми повторами
+# и переходами к другим моделям (сек), число попыток на модель и границы
+# паузы между ними (сек, экспонента с джиттером), бюджет ответа в токенах
+# (num_predict / max_tokens, 0 — без ограничения)
+LLM_DEADLINE_ANALYSIS = float(os.getenv("LLM_DEADLINE_ANALYSIS", "180"))
+LLM_DEADLINE_COMPARISON = float(os.getenv("LLM_DEADLINE_COMPARISON", "180"))
+LLM_RETRY_ATTEMPTS = int(os.getenv("LLM_RETRY_ATTEMPTS", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "1"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "10"))
+LLM_MAX_TOKENS_ANALYSIS = int(os.getenv("LLM_MAX_TOKENS_ANALYSIS", "1500"))
+LLM_MAX_TOKENS_COMPARISON = int(os.getenv("LLM_MAX_TOKENS_COMPARISON", "1500"))
+# Отрисовка диаграмм в пуле процессов: число процессов (0 — в потоке бота),
+# сколько запросов может ждать свободный процесс и таймаут отрисовки (сек)
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))
+RENDER_MAX_QUEUE = int(os.getenv("RENDER_MAX_QUEUE", "20"))
+RENDER_TIMEOUT = float(os.getenv("RENDER_TIMEOUT", "30"))
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://192.168.0.165:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "hhao/qwen2.5-coder-tools:32b")
 
@@ -23,4 +116,6 @@ LLM_DEFAULT_PROVIDER = os.getenv("LLM_DEFAULT_PROVIDER", "ollama")
 
 WHEELS_DIR = os.getenv("WHEELS_DIR", "./wheels")
 PROMPTS_DIR = os.getenv("PROMPTS_DIR", os.path.join(BASE_DIR, "prompts"))
+# Как часто (сек) проверять изменение файлов промптов для горячей перезагрузки
+PROMPT_RELOAD_INTERVAL = float(os.getenv("PROMPT_RELOAD_INTERVAL", "5"))
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
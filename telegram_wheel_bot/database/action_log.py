@@ -0,0 +1,191 @@
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from .models import UserActionLog
+from .writer import SingleWriter
+
+logger = logging.getLogger(__name__)
+
+
+class _Unavailable(Exception):
+    """БД недоступна (OperationalError в __cause__); unsaved — строки, которые не записаны."""
+
+    def __init__(self, unsaved: list[dict]):
+        super().__init__()
+        self.unsaved = list(unsaved)
+
+
+class ActionLogBuffer:
+    """Буферизованная запись UserActionLog.
+
+    log_user_action только добавляет запись в память; пачка сохраняется одним
+    executemany через очередь записи при достижении batch_size или раз в
+    flush_interval секунд, а также при остановке бота. Еще не сохраненные
+    записи учитываются в last_time(), чтобы частотные лимиты (показ рекламы)
+    видели их сразу.
+
+    Если пачка отклонена из-за данных (например, пользователь уже удален),
+    она делится пополам, пока испорченные строки не останутся по одной; они
+    отбрасываются с записью в лог, остальные сохраняются. Пачка, не
+    записанная из-за недоступности БД (OperationalError), повторяется при
+    следующих сбросах, но не больше max_retries раз. В буфере держится не
+    больше max_pending записей: при переполнении отбрасываются самые старые.
+    """
+
+    def __init__(
+        self,
+        writer: SingleWriter,
+        batch_size: int,
+        flush_interval: float,
+        max_retries: int,
+        max_pending: int,
+    ):
+        self._writer = writer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max(max_retries, 1)
+        self.max_pending = max_pending
+        self._pending: list[dict] = []
+        self._inflight: list[dict] = []
+        # Пачки, не записанные из-за недоступности БД, и число неудачных попыток
+        self._failed: deque[tuple[list[dict], int]] = deque()
+        self._timer: asyncio.Task | None = None
+        self._flush_lock: asyncio.Lock | None = None
+        self._flush_tasks: set[asyncio.Task] = set()
+        self.dropped = 0
+        self._overflowing = False
+
+    @property
+    def depth(self) -> int:
+        """Число записей, еще не сохраненных в БД."""
+        return len(self._pending) + len(self._inflight) + sum(len(rows) for rows, _ in self._failed)
+
+    def add(self, user_id: int, action: str, details: str | None = None, wheel_id: int | None = None) -> None:
+        self._pending.append({
+            "user_id": user_id,
+            "action": action,
+            "details": details,
+            "wheel_id": wheel_id,
+            "created_at": datetime.utcnow(),
+        })
+        self._trim()
+        self._ensure_timer()
+        if len(self._pending) >= self.batch_size:
+            task = asyncio.get_running_loop().create_task(self._flush_safely())
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+
+    def last_time(self, user_id: int, action: str) -> datetime | None:
+        """Время последней несохраненной записи пользователя с данным действием."""
+        failed = (row for rows, _ in self._failed for row in rows)
+        times = [
+            row["created_at"]
+            for row in (*failed, *self._inflight, *self._pending)
+            if row["user_id"] == user_id and row["action"] == action
+        ]
+        return max(times) if times else None
+
+    def _drop(self, rows: list[dict], reason: str) -> None:
+        self.dropped += len(rows)
+        logger.error(f"Action log: dropped {len(rows)} rows ({reason}): {rows[:5]}")
+
+    def _trim(self) -> None:
+        """Отбрасывает самые старые записи сверх max_pending, начиная с пачек на повтор."""
+        excess = self.depth - self.max_pending
+        if excess <= 0:
+            return
+        if not self._overflowing:
+            # Пока БД не примет очередную пачку, в лог попадает только начало переполнения
+            logger.error(f"Action log buffer is full ({self.max_pending} rows), dropping oldest")
+            self._overflowing = True
+        while excess > 0 and self._failed:
+            rows, _ = self._failed.popleft()
+            self.dropped += len(rows)
+            excess -= len(rows)
+        if excess > 0:
+            del self._pending[:excess]
+            self.dropped += excess
+
+    def _ensure_timer(self) -> None:
+        if self._timer is None or self._timer.done():
+            self._timer = asyncio.get_running_loop().create_task(self._flush_periodically(), name="action-log-flush")
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self._flush_safely()
+
+    async def _flush_safely(self) -> None:
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Action log flush failed: {e}", exc_info=True)
+
+    async def _save(self, rows: list[dict]) -> int:
+        """Сохраняет строки, отбрасывая отклоненные из-за данных. Возвращает число сохраненных."""
+        async def op(session: AsyncSession) -> None:
+            await session.execute(insert(UserActionLog), rows)
+
+        try:
+            await self._writer.submit(op)
+            return len(rows)
+        except OperationalError as e:
+            raise _Unavailable(rows) from e
+        except Exception as e:
+            if len(rows) == 1:
+                self._drop(rows, f"{type(e).__name__}: {e}")
+                return 0
+        middle = len(rows) // 2
+        try:
+            saved = await self._save(rows[:middle])
+        except _Unavailable as e:
+            e.unsaved += rows[middle:]
+            raise
+        return saved + await self._save(rows[middle:])
+
+    async def flush(self) -> int:
+        """Сохраняет накопленные записи. Возвращает число сохраненных строк."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            batches = list(self._failed)
+            self._failed.clear()
+            if self._pending:
+                batches.append((self._pending, 0))
+                self._pending = []
+            saved = 0
+            for index, (rows, attempts) in enumerate(batches):
+                self._inflight = rows
+                try:
+                    saved += await self._save(rows)
+                    self._overflowing = False
+                except _Unavailable as e:
+                    error = e.__cause__
+                    if attempts + 1 >= self.max_retries:
+                        self._drop(e.unsaved, f"{attempts + 1} failed attempts: {error}")
+                    else:
+                        self._failed.append((e.unsaved, attempts + 1))
+                    # БД недоступна: остальные пачки ждут следующего сброса без штрафа
+                    self._failed.extend(batches[index + 1:])
+                    raise error from None
+                finally:
+                    self._inflight = []
+            return saved
+
+    async def close(self) -> None:
+        """Останавливает периодический сброс и сохраняет остаток буфера."""
+        if self._timer is not None:
+            self._timer.cancel()
+            try:
+                await self._timer
+            except asyncio.CancelledError:
+                pass
+            self._timer = None
+        if self._flush_tasks:
+            await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+        if self._pending or self._failed:
+            await self.flush()
@@ -0,0 +1,517 @@
+from sqlalchemy import select, desc, delete, insert, update, func, or_, and_, bindparam
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from .models import User, Wheel, WheelCategory, UserActionLog, AnalysisCacheEntry, AnalysisJob, WheelComparison
+from dataclasses import dataclass
+from datetime import datetime, date
+from typing import Iterable
+from .repository import (
+    apply_sqlite_profile,
+    category_rows,
+    claim_period,
+    comparisons_of,
+    period_heirs,
+    periods_of,
+    wheels_without_period,
+)
+from .score_vector import pack_scores, unpack_scores
+from .writer import SingleWriter
+from .action_log import ActionLogBuffer
+from telegram_wheel_bot.utils import period_from_name
+from telegram_wheel_bot.config import (
+    ASYNC_DATABASE_URL,
+    DB_READ_POOL_SIZE,
+    ACTION_LOG_BATCH_SIZE,
+    ACTION_LOG_FLUSH_INTERVAL,
+    ACTION_LOG_MAX_RETRIES,
+    ACTION_LOG_MAX_PENDING,
+)
+
+
+# Асинхронный слой для хендлеров бота: не блокирует event loop на запросах к SQLite.
+# Синхронный repository.py остается для init_db и админ-панели (Flask).
+# Чтение идет через пул соединений (в режиме WAL читатели не ждут писателя),
+# запись — через одно соединение и очередь SingleWriter: SQLite допускает
+# одного писателя, а параллельные писатели только ждут друг друга в busy-handler.
+async_engine = create_async_engine(ASYNC_DATABASE_URL, future=True, pool_size=DB_READ_POOL_SIZE, max_overflow=0)
+writer_engine = create_async_engine(ASYNC_DATABASE_URL, future=True, pool_size=1, max_overflow=0)
+apply_sqlite_profile(async_engine.sync_engine)
+apply_sqlite_profile(writer_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+WriterSessionLocal = async_sessionmaker(bind=writer_engine, expire_on_commit=False)
+db_writer = SingleWriter(WriterSessionLocal)
+action_log = ActionLogBuffer(
+    db_writer, ACTION_LOG_BATCH_SIZE, ACTION_LOG_FLUSH_INTERVAL, ACTION_LOG_MAX_RETRIES, ACTION_LOG_MAX_PENDING
+)
+
+
+def _insert_for_dialect():
+    return pg_insert if async_engine.dialect.name == "postgresql" else sqlite_insert
+
+
+async def get_or_create_user_id(telegram_id: int, username: str | None, first_name: str | None) -> int:
+    """Атомарно регистрирует пользователя (INSERT ... ON CONFLICT DO NOTHING) и возвращает его id."""
+    async with AsyncSessionLocal() as session:
+        user_id = (await session.execute(select(User.id).where(User.telegram_id == telegram_id))).scalar_one_or_none()
+        if user_id is not None:
+            return user_id
+
+    async def op(session: AsyncSession) -> int:
+        now = datetime.utcnow()
+        stmt = (
+            _insert_for_dialect()(User)
+            .values(telegram_id=telegram_id, username=username, first_name=first_name, created_at=now, updated_at=now)
+            .on_conflict_do_nothing(index_elements=[User.telegram_id])
+        )
+        await session.execute(stmt)
+        return (await session.execute(select(User.id).where(User.telegram_id == telegram_id))).scalar_one()
+
+    return await db_writer.submit(op)
+
+
+async def create_wheel_with_categories(user_id: int, name: str, scores_ordered: list[tuple[str, int]]) -> int:
+    """Создает колесо (INSERT ... RETURNING) и его категории одним executemany. Возвращает id колеса."""
+    async def op(session: AsyncSession) -> int:
+        period = period_from_name(name)
+        if period is not None:
+            # Колесо за этот месяц уже может быть (например, двойное нажатие): месяц переходит к новому
+            await session.execute(claim_period(user_id, period))
+        wheel_id = (
+            await session.execute(
+                insert(Wheel)
+                .values(
+                    user_id=user_id,
+                    name=name,
+                    created_at=datetime.utcnow(),
+                    period=period,
+                    scores_packed=pack_scores(scores_ordered),
+                )
+                .returning(Wheel.id)
+            )
+        ).scalar_one()
+        await session.execute(insert(WheelCategory), category_rows(wheel_id, scores_ordered))
+        return wheel_id
+
+    return await db_writer.submit(op)
+
+
+async def update_wheel_analysis(wheel_id: int, analysis: str, prompt_version: str | None = None) -> None:
+    async def op(session: AsyncSession) -> None:
+        wheel = await session.get(Wheel, wheel_id)
+        if wheel:
+            wheel.llm_analysis = analysis
+            wheel.analysis_prompt_version = prompt_version
+
+    await db_writer.submit(op)
+
+
+async def store_wheel_analyses(results: list[tuple[int, str, str | None]]) -> None:
+    """Сохраняет пачку анализов (wheel_id, текст, версия промпта) одной транзакцией.
+
+    Колеса, удаленные за время анализа, пропускаются: UPDATE по таблице (Core
+    executemany), а не ORM-обновление по первичному ключу, которое требует,
+    чтобы нашлась каждая строка (StaleDataError).
+    """
+    if not results:
+        return
+
+    async def op(session: AsyncSession) -> None:
+        table = Wheel.__table__
+        await session.execute(
+            update(table)
+            .where(table.c.id == bindparam("wid"))
+            .values(llm_analysis=bindparam("analysis"), analysis_prompt_version=bindparam("version")),
+            [{"wid": i, "analysis": a, "version": v} for i, a, v in results],
+        )
+
+    await db_writer.submit(op)
+
+
+async def list_user_wheels(user_id: int) -> list[Wheel]:
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(Wheel).where(Wheel.user_id == user_id).order_by(desc(Wheel.created_at)))
+        return list(result.scalars())
+
+
+async def get_wheel_scores(wheel_id: int) -> dict[str, int]:
+    async with AsyncSessionLocal() as session:
+        packed = (await session.execute(select(Wheel.scores_packed).where(Wheel.id == wheel_id))).scalar_one_or_none()
+        if packed:
+            return unpack_scores(packed)
+        result = await session.execute(select(WheelCategory).where(WheelCategory.wheel_id == wheel_id).order_by(WheelCategory.order))
+        return {c.category_name: c.value for c in result.scalars()}
+
+
+async def get_latest_wheel(user_id: int) -> Wheel | None:
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(Wheel).where(Wheel.user_id == user_id).order_by(desc(Wheel.created_at)))
+        return result.scalars().first()
+
+
+async def get_wheel_by_id(wheel_id: int) -> Wheel | None:
+    async with AsyncSessionLocal() as session:
+        return await session.get(Wheel, wheel_id)
+
+
+@dataclass
+class WheelSnapshot:
+    """Колесо вместе с упорядоченными оценками (read model для истории и сравнения)."""
+    id: int
+    user_id: int
+    name: str
+    created_at: datetime
+    period: date | None
+    llm_analysis: str | None
+    scores: dict[str, int]
+    previous: "WheelSnapshot | None" = None
+
+    @classmethod
+    def from_wheel(cls, wheel: Wheel, scores: dict[str, int]) -> "WheelSnapshot":
+        return cls(
+            id=wheel.id,
+            user_id=wheel.user_id,
+            name=wheel.name,
+            created_at=wheel.created_at,
+            period=wheel.period,
+            llm_analysis=wheel.llm_analysis,
+            scores=scores,
+        )
+
+
+async def _load_snapshots(session: AsyncSession, condition) -> dict[int, WheelSnapshot]:
+    """Оценки берутся из wheels.scores_packed; к wheel_categories обращаемся только для колес без него."""
+    wheels = list((await session.execute(select(Wheel).where(condition))).scalars())
+    unpacked = [w.id for w in wheels if not w.scores_packed]
+    fallback: dict[int, dict[str, int]] = {}
+    if unpacked:
+        result = await session.execute(
+            select(WheelCategory).where(WheelCategory.wheel_id.in_(unpacked)).order_by(WheelCategory.wheel_id, WheelCategory.order)
+        )
+        for c in result.scalars():
+            fallback.setdefault(c.wheel_id, {})[c.category_name] = c.value
+    return {
+        w.id: WheelSnapshot.from_wheel(w, unpack_scores(w.scores_packed) if w.scores_packed else fallback.get(w.id, {}))
+        for w in wheels
+    }
+
+
+async def get_wheel_snapshots(wheel_ids: Iterable[int]) -> dict[int, WheelSnapshot]:
+    """Загружает несколько колес с оценками одним запросом к wheels."""
+    ids = list(wheel_ids)
+    if not ids:
+        return {}
+    async with AsyncSessionLocal() as session:
+        return await _load_snapshots(session, Wheel.id.in_(ids))
+
+
+async def get_wheel_snapshot(wheel_id: int, previous_period: date | None = None) -> WheelSnapshot | None:
+    """Колесо с оценками и, если задан previous_period, колесо того же пользователя за этот месяц.
+
+    Оба колеса читаются одним запросом: соседнее колесо ищется по индексу (user_id, period).
+    """
+    condition = Wheel.id == wheel_id
+    if previous_period is not None:
+        owner = select(Wheel.user_id).where(Wheel.id == wheel_id).scalar_subquery()
+        condition = or_(condition, and_(Wheel.user_id == owner, Wheel.period == previous_period))
+    async with AsyncSessionLocal() as session:
+        snapshots = await _load_snapshots(session, condition)
+    snapshot = snapshots.get(wheel_id)
+    if snapshot and previous_period is not None:
+        snapshot.previous = next(
+            (s for s in snapshots.values() if s.period == previous_period),
+            None,
+        )
+    return snapshot
+
+
+# До типизированных ошибок LLM текст ошибки мог сохраниться как анализ
+FAILED_ANALYSIS_PREFIX = "Ошибка анализа"
+
+
+def _analysis_condition(mode: str, prompt_version: str | None):
+    """Какие колеса нуждаются в анализе.
+
+    missing — анализа нет или сохранен текст ошибки; stale — кроме того,
+    анализ получен по другой (или неизвестной) версии промпта; all — все колеса.
+    """
+    if mode == "all":
+        return Wheel.id.is_not(None)
+    condition = or_(
+        Wheel.llm_analysis.is_(None),
+        Wheel.llm_analysis == "",
+        Wheel.llm_analysis.like(f"{FAILED_ANALYSIS_PREFIX}%"),
+    )
+    if mode == "stale":
+        condition = or_(
+            condition,
+            Wheel.analysis_prompt_version.is_(None),
+            Wheel.analysis_prompt_version != prompt_version,
+        )
+    return condition
+
+
+async def count_wheels_for_analysis(after_id: int, mode: str, prompt_version: str | None = None) -> int:
+    async with AsyncSessionLocal() as session:
+        return (
+            await session.execute(
+                select(func.count(Wheel.id)).where(Wheel.id > after_id, _analysis_condition(mode, prompt_version))
+            )
+        ).scalar_one()
+
+
+async def get_wheels_for_analysis(
+    after_id: int, limit: int, mode: str, prompt_version: str | None = None
+) -> list[WheelSnapshot]:
+    """Следующая страница колес для анализа по возрастанию id (keyset: id > after_id, без OFFSET)."""
+    page = (
+        select(Wheel.id)
+        .where(Wheel.id > after_id, _analysis_condition(mode, prompt_version))
+        .order_by(Wheel.id)
+        .limit(limit)
+    )
+    async with AsyncSessionLocal() as session:
+        snapshots = await _load_snapshots(session, Wheel.id.in_(page))
+    return sorted(snapshots.values(), key=lambda s: s.id)
+
+
+async def get_wheel_by_period(user_id: int, period: date) -> Wheel | None:
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(Wheel).where(Wheel.user_id == user_id, Wheel.period == period))
+        return result.scalar_one_or_none()
+
+
+async def get_filled_periods(user_id: int, periods: Iterable[date]) -> set[date]:
+    """Какие из указанных месяцев у пользователя уже заполнены."""
+    wanted = list(periods)
+    if not wanted:
+        return set()
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Wheel.period).where(Wheel.user_id == user_id, Wheel.period.in_(wanted))
+        )
+        return set(result.scalars())
+
+
+async def log_user_action(user_id: int, action: str, details: str | None = None, wheel_id: int | None = None) -> None:
+    action_log.add(user_id, action, details, wheel_id)
+
+
+async def delete_wheels_by_ids(user_id: int, wheel_ids: Iterable[int]) -> int:
+    ids = list(wheel_ids)
+    if not ids:
+        return 0
+
+    async def op(session: AsyncSession) -> int:
+        vacated = set((await session.execute(periods_of(user_id, ids))).scalars())
+        subq = select(Wheel.id).where(Wheel.user_id == user_id, Wheel.id.in_(ids))
+        await session.execute(delete(WheelCategory).where(WheelCategory.wheel_id.in_(subq)))
+        await session.execute(comparisons_of(subq))
+        result = await session.execute(delete(Wheel).where(Wheel.user_id == user_id, Wheel.id.in_(ids)))
+        if vacated:
+            # Месяц удаленного колеса не должен стать незаполненным, если за него есть другое колесо
+            heirs = period_heirs(vacated, (await session.execute(wheels_without_period(user_id))).all())
+            if heirs:
+                await session.execute(update(Wheel).execution_options(synchronize_session=False), heirs)
+        return result.rowcount
+
+    return await db_writer.submit(op)
+
+
+async def delete_all_user_wheels(user_id: int) -> int:
+    async def op(session: AsyncSession) -> int:
+        subq = select(Wheel.id).where(Wheel.user_id == user_id)
+        await session.execute(delete(WheelCategory).where(WheelCategory.wheel_id.in_(subq)))
+        await session.execute(comparisons_of(subq))
+        result = await session.execute(delete(Wheel).where(Wheel.user_id == user_id))
+        return result.rowcount
+
+    return await db_writer.submit(op)
+
+
+async def delete_user_with_wheels(telegram_id: int) -> None:
+    async def op(session: AsyncSession) -> None:
+        u = (await session.execute(select(User).where(User.telegram_id == telegram_id))).scalar_one_or_none()
+        if u:
+            subq = select(Wheel.id).where(Wheel.user_id == u.id)
+            await session.execute(delete(WheelCategory).where(WheelCategory.wheel_id.in_(subq)))
+            await session.execute(comparisons_of(subq))
+            await session.execute(delete(Wheel).where(Wheel.user_id == u.id))
+            await session.delete(u)
+
+    await db_writer.submit(op)
+
+
+async def get_last_user_action_time(user_id: int, action: str) -> datetime | None:
+    buffered = action_log.last_time(user_id, action)
+    async with AsyncSessionLocal() as session:
+        last_action = (
+            (
+                await session.execute(
+                    select(UserActionLog)
+                    .where(UserActionLog.user_id == user_id, UserActionLog.action == action)
+                    .order_by(desc(UserActionLog.created_at))
+                )
+            )
+            .scalars()
+            .first()
+        )
+    stored = last_action.created_at if last_action else None
+    return max(filter(None, (buffered, stored)), default=None)
+
+
+async def get_comparison(wheel_id_1: int, wheel_id_2: int) -> str | None:
+    """Сохраненный анализ сравнения для упорядоченной пары колес."""
+    async with AsyncSessionLocal() as session:
+        return (
+            await session.execute(
+                select(WheelComparison.comparison_analysis).where(
+                    WheelComparison.wheel_id_1 == wheel_id_1, WheelComparison.wheel_id_2 == wheel_id_2
+                )
+            )
+        ).scalar_one_or_none()
+
+
+async def save_comparison(wheel_id_1: int, wheel_id_2: int, analysis: str) -> None:
+    async def op(session: AsyncSession) -> None:
+        stmt = _insert_for_dialect()(WheelComparison).values(
+            wheel_id_1=wheel_id_1, wheel_id_2=wheel_id_2, comparison_analysis=analysis, created_at=datetime.utcnow()
+        )
+        await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[WheelComparison.wheel_id_1, WheelComparison.wheel_id_2],
+                set_={"comparison_analysis": analysis, "created_at": datetime.utcnow()},
+            )
+        )
+
+    await db_writer.submit(op)
+
+
+async def get_cached_analysis(keys: list[str], not_before: datetime) -> tuple[str, str] | None:
+    """Первая по порядку keys свежая запись кэша: (ключ, ответ)."""
+    async with AsyncSessionLocal() as session:
+        rows = dict(
+            (
+                await session.execute(
+                    select(AnalysisCacheEntry.key, AnalysisCacheEntry.result).where(
+                        AnalysisCacheEntry.key.in_(keys), AnalysisCacheEntry.created_at >= not_before
+                    )
+                )
+            ).all()
+        )
+    return next(((key, rows[key]) for key in keys if key in rows), None)
+
+
+async def touch_cached_analysis(key: str) -> None:
+    async def op(session: AsyncSession) -> None:
+        await session.execute(
+            update(AnalysisCacheEntry)
+            .where(AnalysisCacheEntry.key == key)
+            .values(hits=AnalysisCacheEntry.hits + 1, last_used_at=datetime.utcnow())
+        )
+
+    await db_writer.submit(op)
+
+
+async def store_cached_analysis(key: str, kind: str, provider: str, model: str, result: str) -> None:
+    async def op(session: AsyncSession) -> None:
+        now = datetime.utcnow()
+        values = dict(key=key, kind=kind, provider=provider, model=model, result=result, hits=0, created_at=now, last_used_at=now)
+        stmt = _insert_for_dialect()(AnalysisCacheEntry).values(**values)
+        await session.execute(stmt.on_conflict_do_update(index_elements=[AnalysisCacheEntry.key], set_=values))
+
+    await db_writer.submit(op)
+
+
+async def evict_cached_analyses(not_before: datetime, max_rows: int) -> int:
+    """Удаляет устаревшие записи кэша и самые давно использованные сверх max_rows."""
+    async def op(session: AsyncSession) -> int:
+        removed = (
+            await session.execute(delete(AnalysisCacheEntry).where(AnalysisCacheEntry.created_at < not_before))
+        ).rowcount
+        total = (await session.execute(select(func.count()).select_from(AnalysisCacheEntry))).scalar_one()
+        if total > max_rows:
+            oldest = (
+                select(AnalysisCacheEntry.key)
+                .order_by(AnalysisCacheEntry.last_used_at)
+                .limit(total - max_rows)
+                .scalar_subquery()
+            )
+            removed += (await session.execute(delete(AnalysisCacheEntry).where(AnalysisCacheEntry.key.in_(oldest)))).rowcount
+        return removed
+
+    return await db_writer.submit(op)
+
+
+async def create_job(
+    kind: str, wheel_id: int | None, user_id: int | None, chat_id: int | None, message_id: int | None
+) -> AnalysisJob:
+    async def op(session: AsyncSession) -> AnalysisJob:
+        now = datetime.utcnow()
+        job = AnalysisJob(
+            kind=kind,
+            status="queued",
+            wheel_id=wheel_id,
+            user_id=user_id,
+            chat_id=chat_id,
+            message_id=message_id,
+            attempts=0,
+            created_at=now,
+            next_run_at=now,
+        )
+        session.add(job)
+        await session.flush()
+        return job
+
+    return await db_writer.submit(op)
+
+
+async def start_job(job_id: int) -> AnalysisJob | None:
+    """Переводит задачу в running и увеличивает число попыток; None — задача уже не в очереди."""
+    async def op(session: AsyncSession) -> AnalysisJob | None:
+        job = await session.get(AnalysisJob, job_id)
+        if job is None or job.status != "queued":
+            return None
+        job.status = "running"
+        job.attempts += 1
+        job.started_at = datetime.utcnow()
+        return job
+
+    return await db_writer.submit(op)
+
+
+async def finish_job(job_id: int, status: str, error: str | None = None, next_run_at: datetime | None = None) -> None:
+    """Завершает попытку: done, failed или снова queued с временем следующего запуска."""
+    async def op(session: AsyncSession) -> None:
+        values = {"status": status, "last_error": error}
+        if status == "queued":
+            values["next_run_at"] = next_run_at or datetime.utcnow()
+        else:
+            values["finished_at"] = datetime.utcnow()
+        await session.execute(update(AnalysisJob).where(AnalysisJob.id == job_id).values(**values))
+
+    await db_writer.submit(op)
+
+
+async def requeue_interrupted_jobs() -> list[AnalysisJob]:
+    """Возвращает в очередь задачи, прерванные остановкой бота, и отдает все ожидающие."""
+    async def op(session: AsyncSession) -> list[AnalysisJob]:
+        await session.execute(
+            update(AnalysisJob).where(AnalysisJob.status == "running").values(status="queued")
+        )
+        return list(
+            (
+                await session.execute(
+                    select(AnalysisJob).where(AnalysisJob.status == "queued").order_by(AnalysisJob.next_run_at, AnalysisJob.id)
+                )
+            ).scalars()
+        )
+
+    return await db_writer.submit(op)
+
+
+async def dispose_engine() -> None:
+    await action_log.close()
+    await db_writer.close()
+    await writer_engine.dispose()
+    await async_engine.dispose()
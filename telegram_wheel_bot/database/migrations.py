@@ -0,0 +1,181 @@
+"""
+Версионированные миграции схемы БД.
+
+create_all() создает только отсутствующие таблицы и не меняет существующие,
+поэтому изменения схемы для уже развернутых баз (индексы, новые колонки)
+описываются здесь. Каждая миграция выполняется один раз; номер примененной
+версии хранится в таблице schema_migrations. Миграции должны быть
+идемпотентными: на свежей базе create_all уже мог создать нужные объекты.
+"""
+import logging
+from datetime import datetime
+from typing import Callable
+from sqlalchemy import text, inspect
+from sqlalchemy.engine import Connection, Engine
+from .score_vector import pack_scores
+from telegram_wheel_bot.utils import period_from_name
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = []
+
+
+def migration(version: int, name: str):
+    """Регистрирует функцию как миграцию с указанным номером версии."""
+    def decorator(fn: Callable[[Connection], None]):
+        MIGRATIONS.append((version, name, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return decorator
+
+
+def has_column(conn: Connection, table: str, column: str) -> bool:
+    return any(c["name"] == column for c in inspect(conn).get_columns(table))
+
+
+@migration(1, "composite indexes for hot queries")
+def _composite_indexes(conn: Connection) -> None:
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_wheels_user_id_created_at "
+        "ON wheels (user_id, created_at)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_user_action_logs_user_id_action_created_at "
+        "ON user_action_logs (user_id, action, created_at)"
+    ))
+
+
+@migration(2, "packed score vector on wheels")
+def _packed_scores(conn: Connection) -> None:
+    if not has_column(conn, "wheels", "scores_packed"):
+        conn.execute(text("ALTER TABLE wheels ADD COLUMN scores_packed BLOB"))
+    backfill_packed_scores(conn)
+
+
+def backfill_packed_scores(conn: Connection, batch_size: int = 1000) -> int:
+    """Заполняет wheels.scores_packed из wheel_categories постранично по id."""
+    last_id = 0
+    updated = 0
+    while True:
+        ids = conn.execute(
+            text(
+                "SELECT id FROM wheels WHERE scores_packed IS NULL AND id > :last "
+                "ORDER BY id LIMIT :limit"
+            ),
+            {"last": last_id, "limit": batch_size},
+        ).scalars().all()
+        if not ids:
+            return updated
+        last_id = ids[-1]
+        scores: dict[int, list[tuple[str, int]]] = {}
+        rows = conn.execute(
+            text(
+                "SELECT wheel_id, category_name, value FROM wheel_categories "
+                "WHERE wheel_id BETWEEN :first AND :last ORDER BY wheel_id, \"order\""
+            ),
+            {"first": ids[0], "last": last_id},
+        )
+        for wheel_id, name, value in rows:
+            scores.setdefault(wheel_id, []).append((name, value))
+        params = []
+        for wheel_id in ids:
+            packed = pack_scores(scores.get(wheel_id, []))
+            if packed is not None:
+                params.append({"id": wheel_id, "packed": packed})
+        if params:
+            conn.execute(text("UPDATE wheels SET scores_packed = :packed WHERE id = :id"), params)
+            updated += len(params)
+
+
+@migration(3, "period column with unique (user_id, period) index")
+def _wheel_period(conn: Connection) -> None:
+    if not has_column(conn, "wheels", "period"):
+        conn.execute(text("ALTER TABLE wheels ADD COLUMN period DATE"))
+    backfill_periods(conn)
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_wheels_user_id_period "
+        "ON wheels (user_id, period)"
+    ))
+
+
+def backfill_periods(conn: Connection) -> int:
+    """Заполняет wheels.period из названий колес.
+
+    Если у пользователя несколько колес за один месяц, период получает самое
+    новое из них, остальные остаются с NULL (уникальный индекс допускает NULL).
+    """
+    taken = {
+        (user_id, period)
+        for user_id, period in conn.execute(
+            text("SELECT user_id, period FROM wheels WHERE period IS NOT NULL")
+        )
+    }
+    params = []
+    rows = conn.execute(text(
+        "SELECT id, user_id, name FROM wheels WHERE period IS NULL "
+        "ORDER BY user_id, created_at DESC, id DESC"
+    )).all()
+    for wheel_id, user_id, name in rows:
+        period = period_from_name(name)
+        if period is None or (user_id, period.isoformat()) in taken:
+            continue
+        taken.add((user_id, period.isoformat()))
+        params.append({"id": wheel_id, "period": period.isoformat()})
+    if params:
+        conn.execute(text("UPDATE wheels SET period = :period WHERE id = :id"), params)
+    return len(params)
+
+
+@migration(4, "unique (wheel_id_1, wheel_id_2) index on wheel_comparisons")
+def _comparison_pair_index(conn: Connection) -> None:
+    # Таблица раньше не заполнялась; на всякий случай оставляем последнюю запись каждой пары
+    conn.execute(text(
+        "DELETE FROM wheel_comparisons WHERE id NOT IN "
+        "(SELECT MAX(id) FROM wheel_comparisons GROUP BY wheel_id_1, wheel_id_2)"
+    ))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_wheel_comparisons_pair "
+        "ON wheel_comparisons (wheel_id_1, wheel_id_2)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_wheel_comparisons_wheel_id_2 ON wheel_comparisons (wheel_id_2)"
+    ))
+
+
+@migration(5, "prompt version of wheel analysis")
+def _analysis_prompt_version(conn: Connection) -> None:
+    if not has_column(conn, "wheels", "analysis_prompt_version"):
+        conn.execute(text("ALTER TABLE wheels ADD COLUMN analysis_prompt_version VARCHAR(12)"))
+
+
+def _ensure_version_table(conn: Connection) -> None:
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, "
+        "name VARCHAR(255) NOT NULL, "
+        "applied_at DATETIME NOT NULL)"
+    ))
+
+
+def current_version(conn: Connection) -> int:
+    _ensure_version_table(conn)
+    return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")).scalar() or 0
+
+
+def run_migrations(engine: Engine) -> int:
+    """Применяет все недостающие миграции. Возвращает итоговую версию схемы."""
+    with engine.begin() as conn:
+        version = current_version(conn)
+    for number, name, fn in MIGRATIONS:
+        if number <= version:
+            continue
+        # Каждая миграция — отдельная транзакция вместе с записью о версии
+        with engine.begin() as conn:
+            logger.info(f"Applying migration {number}: {name}")
+            fn(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+                {"v": number, "n": name, "t": datetime.utcnow()},
+            )
+        version = number
+    return version
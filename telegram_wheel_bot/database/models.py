@@ -1,6 +1,6 @@
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy import Integer, String, DateTime, ForeignKey, Text
-from datetime import datetime
+from sqlalchemy import Integer, String, DateTime, Date, ForeignKey, Text, Index, LargeBinary
+from datetime import datetime, date
 
 
 class Base(DeclarativeBase):
@@ -20,11 +20,21 @@ class User(Base):
 
 class Wheel(Base):
     __tablename__ = "wheels"
+    __table_args__ = (
+        Index("ix_wheels_user_id_created_at", "user_id", "created_at"),
+        Index("ux_wheels_user_id_period", "user_id", "period", unique=True),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), index=True)
     name: Mapped[str] = mapped_column(String(255))
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Месяц колеса (первое число), разобранный из name; NULL для нераспознанных названий
+    period: Mapped[date | None] = mapped_column(Date, nullable=True)
     llm_analysis: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # Версия шаблона промпта (PromptTemplate.version), по которому получен llm_analysis; NULL — неизвестна
+    analysis_prompt_version: Mapped[str | None] = mapped_column(String(12), nullable=True)
+    # Оценки по CATEGORIES, по байту на категорию (см. score_vector.py); дублирует wheel_categories
+    scores_packed: Mapped[bytes | None] = mapped_column(LargeBinary(8), nullable=True)
     user: Mapped[User] = relationship(back_populates="wheels")
     categories: Mapped[list["WheelCategory"]] = relationship(back_populates="wheel", cascade="all, delete-orphan")
 
@@ -40,7 +50,12 @@ class WheelCategory(Base):
 
 
 class WheelComparison(Base):
+    """Сохраненный анализ сравнения пары колес (порядок пары важен)."""
     __tablename__ = "wheel_comparisons"
+    __table_args__ = (
+        Index("ux_wheel_comparisons_pair", "wheel_id_1", "wheel_id_2", unique=True),
+        Index("ix_wheel_comparisons_wheel_id_2", "wheel_id_2"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     wheel_id_1: Mapped[int] = mapped_column(ForeignKey("wheels.id", ondelete="CASCADE"))
     wheel_id_2: Mapped[int] = mapped_column(ForeignKey("wheels.id", ondelete="CASCADE"))
@@ -50,9 +65,44 @@ class WheelComparison(Base):
 
 class UserActionLog(Base):
     __tablename__ = "user_action_logs"
+    __table_args__ = (Index("ix_user_action_logs_user_id_action_created_at", "user_id", "action", "created_at"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), index=True)
     action: Mapped[str] = mapped_column(String(255))
     details: Mapped[str | None] = mapped_column(Text, nullable=True)
     wheel_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class AnalysisCacheEntry(Base):
+    """Кэш ответов LLM по содержимому запроса (см. services/analysis_cache.py)."""
+    __tablename__ = "llm_analysis_cache"
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    kind: Mapped[str] = mapped_column(String(32))
+    provider: Mapped[str] = mapped_column(String(32))
+    model: Mapped[str] = mapped_column(String(255))
+    result: Mapped[str] = mapped_column(Text)
+    hits: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+    last_used_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+
+class AnalysisJob(Base):
+    """Фоновая задача получения анализа (см. services/jobs.py)."""
+    __tablename__ = "analysis_jobs"
+    __table_args__ = (Index("ix_analysis_jobs_status_next_run_at", "status", "next_run_at"),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    kind: Mapped[str] = mapped_column(String(32))
+    # queued / running / done / failed
+    status: Mapped[str] = mapped_column(String(16), default="queued")
+    wheel_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    user_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # Куда доставить результат: сообщение-заглушка, которое будет заменено анализом
+    chat_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    message_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    next_run_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
@@ -1,17 +1,60 @@
-from sqlalchemy import create_engine, select, desc, func
+from sqlalchemy import create_engine, select, desc, func, event, insert, update, delete, or_, Select
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
-from .models import Base, User, Wheel, WheelCategory, UserActionLog
-from datetime import datetime, timedelta
+from .models import Base, User, Wheel, WheelCategory, UserActionLog, WheelComparison
+from .migrations import run_migrations
+from .score_vector import pack_scores
+from telegram_wheel_bot.utils import period_from_name
+from datetime import date, datetime, timedelta
 from typing import Iterable, Optional
-from telegram_wheel_bot.config import DATABASE_URL
-
-
-engine = create_engine(DATABASE_URL, future=True)
+from telegram_wheel_bot.config import (
+    DATABASE_URL,
+    SQLITE_JOURNAL_MODE,
+    SQLITE_SYNCHRONOUS,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_MMAP_SIZE,
+    SQLITE_CACHE_SIZE,
+)
+
+
+def sqlite_pragmas() -> list[str]:
+    """PRAGMA-настройки производственного профиля SQLite."""
+    return [
+        f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}",
+        f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}",
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size={SQLITE_CACHE_SIZE}",
+    ]
+
+
+def apply_sqlite_profile(target: Engine) -> Engine:
+    """Применяет PRAGMA-профиль к каждому новому соединению движка SQLite.
+
+    Для async-движка передается async_engine.sync_engine.
+    """
+    if target.dialect.name != "sqlite":
+        return target
+
+    @event.listens_for(target, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in sqlite_pragmas():
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    return target
+
+
+engine = apply_sqlite_profile(create_engine(DATABASE_URL, future=True))
 SessionLocal = sessionmaker(bind=engine, future=True)
 
 
 def init_db() -> None:
     Base.metadata.create_all(engine)
+    run_migrations(engine)
 
 
 def get_or_create_user(telegram_id: int, username: str | None, first_name: str | None) -> User:
@@ -26,16 +69,111 @@ def get_or_create_user(telegram_id: int, username: str | None, first_name: str |
         return user
 
 
-def create_wheel_with_categories(user_id: int, name: str, scores_ordered: list[tuple[str, int]]) -> Wheel:
-    with SessionLocal() as session:
-        wheel = Wheel(user_id=user_id, name=name, created_at=datetime.utcnow())
-        session.add(wheel)
-        session.flush()
-        for idx, (cat, val) in enumerate(scores_ordered):
-            session.add(WheelCategory(wheel_id=wheel.id, category_name=cat, value=val, order=idx))
+def claim_period(user_id: int, period: date):
+    """UPDATE, снимающий период с прежнего колеса пользователя за этот месяц.
+
+    Месяц принадлежит самому новому колесу (как в backfill_periods и
+    period_heirs): новое колесо за уже заполненный месяц забирает период себе,
+    старое остается в истории без периода. Выполняется в той же транзакции
+    перед вставкой нового колеса.
+    """
+    return (
+        update(Wheel)
+        .where(Wheel.user_id == user_id, Wheel.period == period)
+        .values(period=None)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def category_rows(wheel_id: int, scores_ordered: list[tuple[str, int]]) -> list[dict]:
+    """Параметры для executemany-вставки категорий колеса."""
+    return [
+        {"wheel_id": wheel_id, "category_name": cat, "value": val, "order": idx}
+        for idx, (cat, val) in enumerate(scores_ordered)
+    ]
+
+
+def bulk_import_wheels(
+    wheels: Iterable[tuple[int, str, datetime | None, list[tuple[str, int]]]],
+    batch_size: int = 1000,
+) -> list[int]:
+    """Массовый импорт колес для миграций данных.
+
+    Принимает кортежи (user_id, name, created_at, scores_ordered). Колеса каждой
+    пачки вставляются одним INSERT ... RETURNING, категории — одним executemany,
+    пачка коммитится целиком. Возвращает id созданных колес в порядке входа.
+    Период берется из названия; если за месяц пользователя есть несколько колес
+    (во входе или уже в базе), период получает самое новое по created_at, как
+    в claim_period, остальные остаются без периода.
+    """
+    created: list[int] = []
+    batch: list[tuple[int, str, datetime | None, list[tuple[str, int]]]] = []
+
+    def assign_periods(session, rows: list[dict]) -> None:
+        # Самое новое колесо пачки за каждый месяц; при равном created_at — более позднее во входе
+        newest: dict[tuple[int, date], dict] = {}
+        for row in rows:
+            period = row.pop("period")
+            if period is not None:
+                key = (row["user_id"], period)
+                if key not in newest or row["created_at"] >= newest[key]["created_at"]:
+                    newest[key] = row
+        holders = session.execute(
+            select(Wheel.id, Wheel.user_id, Wheel.period, Wheel.created_at).where(
+                Wheel.user_id.in_({user_id for user_id, _ in newest}),
+                Wheel.period.in_({period for _, period in newest}),
+            )
+        ).all() if newest else []
+        released = []
+        for wheel_id, user_id, period, created_at in holders:
+            row = newest.get((user_id, period))
+            if row is None:
+                continue
+            if row["created_at"] >= created_at:
+                released.append(wheel_id)
+            else:
+                del newest[(user_id, period)]
+        if released:
+            session.execute(
+                update(Wheel).where(Wheel.id.in_(released)).values(period=None).execution_options(synchronize_session=False)
+            )
+        for row in rows:
+            row["period"] = None
+        for (_, period), row in newest.items():
+            row["period"] = period
+
+    def flush(session) -> None:
+        rows = [
+            {
+                "user_id": user_id,
+                "name": name,
+                "created_at": created_at or datetime.utcnow(),
+                "period": period_from_name(name),
+                "scores_packed": pack_scores(scores_ordered),
+            }
+            for user_id, name, created_at, scores_ordered in batch
+        ]
+        assign_periods(session, rows)
+        wheel_ids = session.execute(
+            insert(Wheel).returning(Wheel.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+        rows = []
+        for wheel_id, (_, _, _, scores_ordered) in zip(wheel_ids, batch):
+            rows.extend(category_rows(wheel_id, scores_ordered))
+        if rows:
+            session.execute(insert(WheelCategory), rows)
         session.commit()
-        session.refresh(wheel)
-        return wheel
+        created.extend(wheel_ids)
+        batch.clear()
+
+    with SessionLocal() as session:
+        for item in wheels:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                flush(session)
+        if batch:
+            flush(session)
+    return created
 
 
 def update_wheel_analysis(wheel_id: int, analysis: str) -> None:
@@ -75,14 +213,58 @@ def log_user_action(user_id: int, action: str, details: str | None = None, wheel
         session.commit()
 
 
+def comparisons_of(wheel_ids: Select):
+    """DELETE сохраненных сравнений, в которых участвует любое из колес (wheel_ids — SELECT id)."""
+    return delete(WheelComparison).where(
+        or_(WheelComparison.wheel_id_1.in_(wheel_ids), WheelComparison.wheel_id_2.in_(wheel_ids))
+    )
+
+
+def periods_of(user_id: int, wheel_ids: list[int]) -> Select:
+    """SELECT периодов, которые занимают удаляемые колеса пользователя."""
+    return select(Wheel.period).where(Wheel.user_id == user_id, Wheel.id.in_(wheel_ids), Wheel.period.is_not(None))
+
+
+def wheels_without_period(user_id: int) -> Select:
+    """SELECT (id, name) колес пользователя без периода, от новых к старым."""
+    return (
+        select(Wheel.id, Wheel.name)
+        .where(Wheel.user_id == user_id, Wheel.period.is_(None))
+        .order_by(desc(Wheel.created_at), desc(Wheel.id))
+    )
+
+
+def period_heirs(vacated: set[date], candidates: Iterable[tuple[int, str]]) -> list[dict]:
+    """Параметры UPDATE, передающие освободившиеся периоды оставшимся колесам.
+
+    Период месяца есть только у одного колеса (уникальный индекс), поэтому
+    после удаления колеса с периодом месяц получает самое новое из оставшихся
+    колес с тем же месяцем в названии — как в backfill_periods и claim_period.
+    candidates — результат wheels_without_period.
+    """
+    params = []
+    for wheel_id, name in candidates:
+        period = period_from_name(name)
+        if period in vacated:
+            vacated.discard(period)
+            params.append({"id": wheel_id, "period": period})
+    return params
+
+
 def delete_wheels_by_ids(user_id: int, wheel_ids: Iterable[int]) -> int:
     ids = list(wheel_ids)
     if not ids:
         return 0
     with SessionLocal() as session:
+        vacated = set(session.execute(periods_of(user_id, ids)).scalars())
         subq = session.query(Wheel.id).filter(Wheel.user_id == user_id, Wheel.id.in_(ids))
         session.query(WheelCategory).filter(WheelCategory.wheel_id.in_(subq)).delete(synchronize_session=False)
+        session.execute(comparisons_of(select(Wheel.id).where(Wheel.user_id == user_id, Wheel.id.in_(ids))))
         deleted = session.query(Wheel).filter(Wheel.user_id == user_id, Wheel.id.in_(ids)).delete(synchronize_session=False)
+        if vacated:
+            heirs = period_heirs(vacated, session.execute(wheels_without_period(user_id)).all())
+            if heirs:
+                session.execute(update(Wheel).execution_options(synchronize_session=False), heirs)
         session.commit()
         return deleted
 
@@ -91,6 +273,7 @@ def delete_all_user_wheels(user_id: int) -> int:
     with SessionLocal() as session:
         subq = session.query(Wheel.id).filter(Wheel.user_id == user_id)
         session.query(WheelCategory).filter(WheelCategory.wheel_id.in_(subq)).delete(synchronize_session=False)
+        session.execute(comparisons_of(select(Wheel.id).where(Wheel.user_id == user_id)))
         deleted = session.query(Wheel).filter(Wheel.user_id == user_id).delete(synchronize_session=False)
         session.commit()
         return deleted
@@ -98,37 +281,74 @@ def delete_all_user_wheels(user_id: int) -> int:
 
 # Admin panel functions
 def get_all_users_with_last_action() -> list[dict]:
-    """Get all users with their last action date from wheel history."""
+    """Get all users with their last action date, wheel count and last wheel average score.
+
+    Single query: per-user aggregates come from GROUP BY subqueries joined to users,
+    the average of the latest wheel from a correlated subquery.
+    """
     with SessionLocal() as session:
-        users = session.execute(select(User)).scalars().all()
+        wheel_stats = (
+            select(
+                Wheel.user_id.label("user_id"),
+                func.count(Wheel.id).label("wheels_count"),
+                func.max(Wheel.created_at).label("last_wheel_at"),
+            )
+            .group_by(Wheel.user_id)
+            .subquery()
+        )
+        action_stats = (
+            select(
+                UserActionLog.user_id.label("user_id"),
+                func.max(UserActionLog.created_at).label("last_action_at"),
+            )
+            .group_by(UserActionLog.user_id)
+            .subquery()
+        )
+        latest_wheel_id = (
+            select(Wheel.id)
+            .where(Wheel.user_id == User.id)
+            .order_by(desc(Wheel.created_at), desc(Wheel.id))
+            .limit(1)
+            .correlate(User)
+            .scalar_subquery()
+        )
+        last_score_avg = (
+            select(func.avg(WheelCategory.value))
+            .where(WheelCategory.wheel_id == latest_wheel_id)
+            .correlate(User)
+            .scalar_subquery()
+        )
+        rows = session.execute(
+            select(
+                User.id,
+                User.telegram_id,
+                User.username,
+                User.first_name,
+                User.created_at,
+                func.coalesce(wheel_stats.c.wheels_count, 0),
+                wheel_stats.c.last_wheel_at,
+                action_stats.c.last_action_at,
+                last_score_avg,
+            )
+            .outerjoin(wheel_stats, wheel_stats.c.user_id == User.id)
+            .outerjoin(action_stats, action_stats.c.user_id == User.id)
+            .order_by(User.id)
+        ).all()
+
         result = []
-        for user in users:
-            # Get last wheel creation date
-            last_wheel = session.execute(
-                select(Wheel).where(Wheel.user_id == user.id).order_by(desc(Wheel.created_at))
-            ).scalars().first()
-            
-            # Get last action log date
-            last_action = session.execute(
-                select(UserActionLog).where(UserActionLog.user_id == user.id).order_by(desc(UserActionLog.created_at))
-            ).scalars().first()
-            
+        for user_id, telegram_id, username, first_name, created_at, wheels_count, last_wheel_at, last_action_at, avg in rows:
             # Use the most recent date
-            last_action_date = None
-            if last_wheel and last_action:
-                last_action_date = max(last_wheel.created_at, last_action.created_at)
-            elif last_wheel:
-                last_action_date = last_wheel.created_at
-            elif last_action:
-                last_action_date = last_action.created_at
-            
+            dates = [d for d in (last_wheel_at, last_action_at) if d]
+            last_action_date = max(dates) if dates else None
             result.append({
-                'id': user.id,
-                'telegram_id': user.telegram_id,
-                'username': user.username,
-                'first_name': user.first_name,
-                'created_at': user.created_at.isoformat() if user.created_at else None,
-                'last_action_date': last_action_date.isoformat() if last_action_date else None
+                'id': user_id,
+                'telegram_id': telegram_id,
+                'username': username,
+                'first_name': first_name,
+                'created_at': created_at.isoformat() if created_at else None,
+                'last_action_date': last_action_date.isoformat() if last_action_date else None,
+                'wheels_count': wheels_count,
+                'last_score_avg': round(float(avg), 2) if avg is not None else None
             })
         return result
 
@@ -0,0 +1,36 @@
+"""
+Компактное представление оценок колеса.
+
+Набор категорий фиксирован, поэтому оценки колеса хранятся в колонке
+wheels.scores_packed как 8 байт (по байту на категорию в порядке CATEGORIES).
+Это позволяет читать весь вектор оценок из одной строки wheels без запроса
+к wheel_categories. Таблица wheel_categories остается источником истины для
+колес с нестандартным набором категорий (для них scores_packed = NULL).
+"""
+
+CATEGORIES = [
+    "Семья",
+    "Друзья",
+    "Здоровье",
+    "Хобби",
+    "Деньги",
+    "Отдых",
+    "Личное развитие",
+    "Работа/бизнес",
+]
+
+
+def pack_scores(scores_ordered: list[tuple[str, int]]) -> bytes | None:
+    """Упаковывает оценки в 8 байт. Возвращает None, если набор категорий нестандартный."""
+    scores = dict(scores_ordered)
+    if len(scores) != len(CATEGORIES) or set(scores) != set(CATEGORIES):
+        return None
+    values = [scores[c] for c in CATEGORIES]
+    if any(not isinstance(v, int) or not 0 <= v <= 255 for v in values):
+        return None
+    return bytes(values)
+
+
+def unpack_scores(packed: bytes) -> dict[str, int]:
+    """Распаковывает оценки в словарь в порядке CATEGORIES."""
+    return dict(zip(CATEGORIES, packed))
@@ -0,0 +1,69 @@
+import asyncio
+from typing import Awaitable, Callable, TypeVar
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+T = TypeVar("T")
+
+
+class SingleWriter:
+    """Асинхронная очередь записи в БД.
+
+    Все изменения выполняются по одному в отдельной задаче-воркере через
+    единственное соединение, поэтому писатели бота не конкурируют за блокировку
+    SQLite, а читатели (WAL) не ждут писателей. Операция получает сессию,
+    commit выполняет воркер.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker[AsyncSession]):
+        self._session_factory = session_factory
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def depth(self) -> int:
+        """Число операций, ожидающих выполнения."""
+        return self._queue.qsize() if self._queue else 0
+
+    def _ensure_worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run(), name="db-single-writer")
+
+    async def submit(self, op: Callable[[AsyncSession], Awaitable[T]]) -> T:
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((op, future))
+        return await future
+
+    async def _run(self) -> None:
+        queue = self._queue
+        while True:
+            op, future = await queue.get()
+            try:
+                if future.cancelled():
+                    continue
+                async with self._session_factory() as session:
+                    result = await op(session)
+                    await session.commit()
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                queue.task_done()
+
+    async def close(self) -> None:
+        """Дожидается выполнения поставленных операций и останавливает воркер."""
+        if self._worker is None or self._worker.done():
+            return
+        await self._queue.join()
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
@@ -1,8 +1,13 @@
+import html
+import json
 from telegram import Update
+from telegram.constants import MessageLimit, ParseMode
 from telegram.ext import ContextTypes
 from telegram_wheel_bot.config import ADMIN_IDS
-from telegram_wheel_bot.database.repository import SessionLocal
-from telegram_wheel_bot.database.models import User, Wheel, WheelCategory
+from telegram_wheel_bot.database.async_repository import delete_user_with_wheels
+from telegram_wheel_bot.services.user_service import forget_user
+from telegram_wheel_bot.services.llm_service import health, router_stats, latency_stats, policy_stats
+from telegram_wheel_bot.services.render_pool import render_pool
 
 
 async def clear_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -10,11 +15,29 @@ async def clear_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if user.id not in ADMIN_IDS:
         await update.message.reply_text("❌ У тебя нет прав на эту команду")
         return
-    with SessionLocal() as session:
-        u = session.query(User).filter(User.telegram_id == user.id).first()
-        if u:
-            session.query(WheelCategory).filter(WheelCategory.wheel_id.in_(session.query(Wheel.id).filter(Wheel.user_id == u.id))).delete(synchronize_session=False)
-            session.query(Wheel).filter(Wheel.user_id == u.id).delete(synchronize_session=False)
-            session.delete(u)
-            session.commit()
+    await delete_user_with_wheels(user.id)
+    forget_user(user.id)
     await update.message.reply_text("✓ Все данные удалены")
+
+
+async def llm_status_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Отладка выбора модели: оценки кандидатов, последние решения, состояние провайдеров и пул отрисовки."""
+    user = update.effective_user
+    if user.id not in ADMIN_IDS:
+        await update.message.reply_text("❌ У тебя нет прав на эту команду")
+        return
+    router = router_stats()
+    report = {
+        "providers": health.snapshot(),
+        "models": router["candidates"],
+        "decisions": router["decisions"][-5:],
+        "latency": latency_stats(),
+        "retries": policy_stats(),
+        "render": render_pool.stats(),
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=1, default=str)
+    # Запас под теги <pre> и экранирование &<> в сообщениях об ошибках
+    limit = MessageLimit.MAX_TEXT_LENGTH - 1000
+    for start in range(0, len(text), limit):
+        chunk = html.escape(text[start:start + limit], quote=False)
+        await update.message.reply_text(f"<pre>{chunk}</pre>", parse_mode=ParseMode.HTML)
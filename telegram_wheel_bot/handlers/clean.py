@@ -1,7 +1,7 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, CallbackQueryHandler, CommandHandler
 from telegram_wheel_bot.services.history_service import get_history
-from telegram_wheel_bot.database.repository import delete_wheels_by_ids, delete_all_user_wheels, log_user_action
+from telegram_wheel_bot.database.async_repository import delete_wheels_by_ids, delete_all_user_wheels, log_user_action
 from telegram_wheel_bot.services.user_service import register_user
 from telegram_wheel_bot.config import WHEELS_DIR
 import os
@@ -25,11 +25,11 @@ async def clean_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.info(f"clean_cmd: Processing command from user {user.id}")
         
         # Регистрируем/получаем пользователя в базе данных
-        db_user = register_user(user.id, user.username, user.first_name)
-        logger.info(f"clean_cmd: User {user.id} (db_id: {db_user.id}) called /clean")
+        db_user_id = await register_user(user.id, user.username, user.first_name)
+        logger.info(f"clean_cmd: User {user.id} (db_id: {db_user_id}) called /clean")
         
         # Получаем колеса пользователя по database user_id
-        wheels = get_history(db_user.id)
+        wheels = await get_history(db_user_id)
         
         if not wheels:
             await update.message.reply_text("У вас нет колес для удаления")
@@ -102,8 +102,8 @@ async def confirm_delete(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         
         # Регистрируем/получаем пользователя в базе данных
-        db_user = register_user(user.id, user.username, user.first_name)
-        logger.info(f"confirm_delete: User {user.id} (db_id: {db_user.id}) decision={decision}, target={target}")
+        db_user_id = await register_user(user.id, user.username, user.first_name)
+        logger.info(f"confirm_delete: User {user.id} (db_id: {db_user_id}) decision={decision}, target={target}")
         
         if decision == "no":
             await q.edit_message_text("Отменено")
@@ -111,11 +111,11 @@ async def confirm_delete(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         
         if target == "all":
-            wheels = get_history(db_user.id)
+            wheels = await get_history(db_user_id)
             ids = [w.id for w in wheels]
             _remove_wheel_images(ids)
-            count = delete_all_user_wheels(db_user.id)
-            log_user_action(db_user.id, "delete_all_wheels", f"count={count}")
+            count = await delete_all_user_wheels(db_user_id)
+            await log_user_action(db_user_id, "delete_all_wheels", f"count={count}")
             context.user_data.pop("last_open_wheel_id", None)
             await q.edit_message_text("✓ Все колеса удалены")
             logger.info(f"confirm_delete: User {user.id} deleted all {count} wheels")
@@ -129,9 +129,9 @@ async def confirm_delete(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         
         _remove_wheel_images([wid])
-        deleted = delete_wheels_by_ids(db_user.id, [wid])
+        deleted = await delete_wheels_by_ids(db_user_id, [wid])
         if deleted:
-            log_user_action(db_user.id, "delete_wheel", wheel_id=wid)
+            await log_user_action(db_user_id, "delete_wheel", wheel_id=wid)
             try:
                 last_id = context.user_data.get("last_open_wheel_id")
                 if last_id and int(last_id) == wid:
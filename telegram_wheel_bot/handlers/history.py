@@ -1,33 +1,38 @@
+import logging
+import os
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.constants import ParseMode
 from telegram.ext import ContextTypes, CallbackQueryHandler
 from telegram_wheel_bot.services.history_service import (
     get_history,
-    get_latest,
-    get_scores,
-    get_wheel,
-    get_previous_filled,
+    get_snapshot,
+    get_snapshots,
+    get_saved_comparison,
+    store_comparison,
 )
-from telegram_wheel_bot.utils import parse_month_label
 from telegram_wheel_bot.services.user_service import register_user
-from telegram_wheel_bot.services.llm_service import compare_wheels, markdown_to_html
+from telegram_wheel_bot.utils import period_from_name
+from telegram_wheel_bot.services.llm_service import stream_comparison
+from telegram_wheel_bot.services.llm_policy import LLMError
+from telegram_wheel_bot.handlers.streaming import stream_to_message, finish_message, reply_answer
+from telegram_wheel_bot.services.render_pool import RenderError, render_pool
 from telegram_wheel_bot.services.visualization import (
+    comparison_path,
     draw_wheel_comparison,
     draw_wheel_new,
 )
 
+logger = logging.getLogger(__name__)
+
 
 async def history_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     if not user or not update.message:
         return
     # Регистрируем/получаем пользователя в базе данных
-    db_user = register_user(user.id, user.username, user.first_name)
-    wheels = get_history(db_user.id)
-    try:
-        wheels.sort(key=lambda w: parse_month_label(w.name))
-    except Exception:
-        pass
+    db_user_id = await register_user(user.id, user.username, user.first_name)
+    wheels = await get_history(db_user_id)
+    # У старших колес за тот же месяц period пуст: месяц берется из названия, иначе дата создания
+    wheels.sort(key=lambda w: w.period or period_from_name(w.name) or w.created_at.date())
     if not wheels:
         await update.message.reply_text("История пуста")
         return
@@ -48,7 +53,7 @@ async def open_wheel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     q = update.callback_query
     await q.answer()
     wheel_id = int(q.data.split(":")[1])
-    w = get_wheel(wheel_id)
+    w = await get_snapshot(wheel_id)
     if not w:
         await q.edit_message_text("Колесо не найдено")
         return
@@ -58,9 +63,8 @@ async def open_wheel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Рисуем картинку с новым стилем
     try:
-        scores = get_scores(wheel_id)
-        ordered = list(scores.items())
-        path = draw_wheel_new(wheel_id, ordered)
+        ordered = list(w.scores.items())
+        path = await render_pool.draw(draw_wheel_new, wheel_id, ordered)
         await q.message.reply_photo(photo=open(path, "rb"))
     except Exception:
         # Если не удалось, попробуем показать старую картинку, если она есть
@@ -71,9 +75,8 @@ async def open_wheel(update: Update, context: ContextTypes.DEFAULT_TYPE):
             pass
     if w.llm_analysis:
         # Конвертируем markdown в HTML для совместимости со старыми сообщениями
-        html_analysis = markdown_to_html(w.llm_analysis)
-        await q.message.reply_text(html_analysis, parse_mode=ParseMode.HTML)
-    prev_filled = get_previous_filled(w.user_id)
+        await reply_answer(q.message, w.llm_analysis)
+    prev_filled = w.previous
     if prev_filled:
         if prev_filled.id == w.id:
             await q.message.reply_text("Не могу сравнить месяц сам с собой")
@@ -99,32 +102,59 @@ async def compare_latest(update: Update, context: ContextTypes.DEFAULT_TYPE):
     _, a, b = q.data.split(":")
     wid1 = int(a)
     wid2 = int(b)
-    w1 = get_wheel(wid1)
-    w2 = get_wheel(wid2)
-    s1 = get_scores(wid1)
-    s2 = get_scores(wid2)
-    path = draw_wheel_comparison(
-        wid1,
-        wid2,
-        s1,
-        s2,
-        w1.name if w1 else "Выбранное",
-        w2.name if w2 else "Последнее",
-    )
+    snapshots = await get_snapshots([wid1, wid2])
+    w1 = snapshots.get(wid1)
+    w2 = snapshots.get(wid2)
+    s1 = w1.scores if w1 else {}
+    s2 = w2.scores if w2 else {}
+    # Сравнение пары уже выполнялось: берем сохраненный анализ и готовую картинку
+    saved = await get_saved_comparison(wid1, wid2)
+    path = comparison_path(wid1, wid2)
+    if saved is None or not os.path.exists(path):
+        try:
+            path = await render_pool.draw(
+                draw_wheel_comparison,
+                wid1,
+                wid2,
+                s1,
+                s2,
+                w1.name if w1 else "Выбранное",
+                w2.name if w2 else "Последнее",
+            )
+        except RenderError as e:
+            logger.warning(f"Comparison chart failed: {e}")
+            await q.message.reply_text("Не удалось построить сравнение, попробуй позже")
+            return
     await q.message.reply_photo(photo=open(path, "rb"))
 
+    await reply_comparison_analysis(q.message, w1, w2, saved)
+
+
+async def reply_comparison_analysis(message, w1, w2, saved: str | None) -> None:
+    """Отправляет анализ сравнения: сохраненный сразу, новый — потоком с сохранением."""
+    if saved is not None:
+        await reply_answer(message, saved)
+        return
     # Запрос к LLM для анализа сравнения
-    await q.message.reply_text(
+    analysis_msg = await message.reply_text(
         "Формирую результаты сравнения, мне нужно немного времени... "
     )
+    s1 = w1.scores if w1 else {}
+    s2 = w2.scores if w2 else {}
     date_1 = w1.created_at.date().strftime("%d.%m.%Y") if w1 else ""
     date_2 = w2.created_at.date().strftime("%d.%m.%Y") if w2 else ""
     try:
-        analysis = await compare_wheels(s2, s1, date_2, date_1)
-        html_analysis = markdown_to_html(analysis)
-        await q.message.reply_text(html_analysis, parse_mode=ParseMode.HTML)
+        analysis = await stream_to_message(analysis_msg, stream_comparison(s2, s1, date_2, date_1))
+        await finish_message(analysis_msg, analysis)
+    except LLMError as e:
+        logger.warning(f"Comparison analysis failed: {e}")
+        await analysis_msg.edit_text("Не удалось получить анализ сравнения, попробуй позже")
+        return
     except Exception as e:
-        await q.message.reply_text(f"Не удалось получить анализ сравнения: {e}")
+        await message.reply_text(f"Не удалось получить анализ сравнения: {e}")
+        return
+    if w1 and w2:
+        await store_comparison(w1.id, w2.id, analysis)
 
 
 def build_callbacks():
@@ -138,20 +168,20 @@ async def compare_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     if not user or not update.message:
         return
-    db_user = register_user(user.id, user.username, user.first_name)
+    await register_user(user.id, user.username, user.first_name)
 
     current_id = context.user_data.get("last_open_wheel_id")
     if not current_id:
         await update.message.reply_text("Сначала открой колесо в /history, затем вызови /compare")
         return
 
-    current_wheel = get_wheel(int(current_id))
+    current_wheel = await get_snapshot(int(current_id))
     if not current_wheel:
         context.user_data.pop("last_open_wheel_id", None)
         await update.message.reply_text("Выбранное колесо не найдено. Открой колесо в /history")
         return
 
-    prev_filled = get_previous_filled(db_user.id)
+    prev_filled = current_wheel.previous
     if not prev_filled:
         await update.message.reply_text("Недостаточно данных для сравнения")
         return
@@ -159,36 +189,29 @@ async def compare_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Не могу сравнить месяц сам с собой")
         return
 
-    wid1 = current_wheel.id
-    wid2 = prev_filled.id
-
-    w1 = get_wheel(wid1)
-    w2 = get_wheel(wid2)
-    s1 = get_scores(wid1)
-    s2 = get_scores(wid2)
-    path = draw_wheel_comparison(
-        wid1,
-        wid2,
-        s1,
-        s2,
-        w1.name if w1 else "Выбранное",
-        w2.name if w2 else "Последнее",
-    )
+    w1 = current_wheel
+    w2 = prev_filled
+    wid1 = w1.id
+    wid2 = w2.id
+    s1 = w1.scores
+    s2 = w2.scores
+    # Сравнение пары уже выполнялось: берем сохраненный анализ и готовую картинку
+    saved = await get_saved_comparison(wid1, wid2)
+    path = comparison_path(wid1, wid2)
     try:
+        if saved is None or not os.path.exists(path):
+            path = await render_pool.draw(
+                draw_wheel_comparison,
+                wid1,
+                wid2,
+                s1,
+                s2,
+                w1.name if w1 else "Выбранное",
+                w2.name if w2 else "Последнее",
+            )
         await update.message.reply_photo(photo=open(path, "rb"))
     except Exception:
         await update.message.reply_text("Не удалось построить сравнение")
         return
 
-    # Запрос к LLM для анализа сравнения
-    await update.message.reply_text(
-        "Формирую результаты сравнения, мне нужно немного времени... "
-    )
-    date_1 = w1.created_at.date().strftime("%d.%m.%Y") if w1 else ""
-    date_2 = w2.created_at.date().strftime("%d.%m.%Y") if w2 else ""
-    try:
-        analysis = await compare_wheels(s2, s1, date_2, date_1)
-        html_analysis = markdown_to_html(analysis)
-        await update.message.reply_text(html_analysis, parse_mode=ParseMode.HTML)
-    except Exception as e:
-        await update.message.reply_text(f"Не удалось получить анализ сравнения: {e}")
+    await reply_comparison_analysis(update.message, w1, w2, saved)
@@ -5,7 +5,7 @@ from telegram_wheel_bot.services.user_service import register_user
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     u = update.effective_user
-    register_user(u.id, u.username, u.first_name)
+    await register_user(u.id, u.username, u.first_name)
     text = (
         f"Привет, {u.first_name}! 👋\n"
         "Это бот для отслеживания качества твоей жизни.\n"
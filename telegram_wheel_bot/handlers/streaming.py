@@ -0,0 +1,90 @@
+import logging
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator
+from telegram import Bot, Message, InlineKeyboardMarkup
+from telegram.constants import MessageLimit, ParseMode
+from telegram.error import BadRequest, RetryAfter
+from telegram_wheel_bot.config import LLM_STREAM_EDIT_INTERVAL
+from telegram_wheel_bot.services.telegram_html import markdown_to_html, markdown_to_parts
+
+logger = logging.getLogger(__name__)
+
+CURSOR = " ▌"
+
+
+@dataclass
+class ChatMessageRef:
+    """Сообщение по chat_id/message_id с тем же интерфейсом, что у Message.
+
+    Нужна фоновым задачам: после перезапуска бота объекта Message нет, а
+    сообщение-заглушку все еще можно отредактировать.
+    """
+    bot: Bot
+    chat_id: int
+    message_id: int
+
+    async def edit_text(self, text: str, **kwargs):
+        return await self.bot.edit_message_text(text, chat_id=self.chat_id, message_id=self.message_id, **kwargs)
+
+    async def reply_text(self, text: str, **kwargs):
+        return await self.bot.send_message(self.chat_id, text, **kwargs)
+
+
+async def stream_to_message(
+    message: Message | ChatMessageRef, chunks: AsyncIterator[str], interval: float = LLM_STREAM_EDIT_INTERVAL
+) -> str:
+    """Показывает ответ LLM по мере генерации, редактируя message. Возвращает полный текст.
+
+    Промежуточный текст отправляется без разметки (незакрытые теги сломали бы
+    HTML) и не чаще раза в interval секунд; при RetryAfter правки
+    откладываются на указанное Telegram время. Итоговое форматирование —
+    finish_message(). Ошибка генерации (LLMError) пробрасывается, даже если
+    часть ответа уже показана: неполный ответ не должен сохраниться как анализ.
+    """
+    parts: list[str] = []
+    # Первый фрагмент показываем сразу: время до него и есть ожидание пользователя
+    next_edit = 0.0
+    shown = ""
+    async for chunk in chunks:
+        parts.append(chunk)
+        now = time.monotonic()
+        if now < next_edit:
+            continue
+        text = "".join(parts).strip()
+        if not text or text == shown or len(text) + len(CURSOR) > MessageLimit.MAX_TEXT_LENGTH:
+            continue
+        try:
+            await message.edit_text(text + CURSOR)
+            shown = text
+            next_edit = now + interval
+        except RetryAfter as e:
+            retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+            next_edit = now + retry_after
+        except BadRequest as e:
+            logger.debug(f"Stream edit skipped: {e}")
+            next_edit = now + interval
+    return "".join(parts)
+
+
+async def finish_message(message: Message | ChatMessageRef, answer: str, reply_markup: InlineKeyboardMarkup | None = None) -> None:
+    """Заменяет промежуточный текст ответом LLM в HTML; не поместившееся в лимит Telegram досылает новыми сообщениями.
+
+    Кнопки прикрепляются к последней части.
+    """
+    chunks = markdown_to_parts(answer) or [markdown_to_html(answer)]
+    first, rest = chunks[0], chunks[1:]
+    try:
+        await message.edit_text(first, parse_mode=ParseMode.HTML, reply_markup=None if rest else reply_markup)
+    except BadRequest as e:
+        logger.warning(f"Final edit failed, sending a new message: {e}")
+        rest = chunks
+    for i, chunk in enumerate(rest):
+        await message.reply_text(chunk, parse_mode=ParseMode.HTML, reply_markup=reply_markup if i == len(rest) - 1 else None)
+
+
+async def reply_answer(message: Message, answer: str, reply_markup: InlineKeyboardMarkup | None = None) -> None:
+    """Отправляет ответ LLM в HTML одним или несколькими сообщениями в пределах лимита Telegram."""
+    chunks = markdown_to_parts(answer) or [markdown_to_html(answer)]
+    for i, chunk in enumerate(chunks):
+        await message.reply_text(chunk, parse_mode=ParseMode.HTML, reply_markup=reply_markup if i == len(chunks) - 1 else None)
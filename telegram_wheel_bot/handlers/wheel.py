@@ -9,12 +9,14 @@ from telegram.ext import (
     filters,
     CommandHandler,
 )
-from telegram_wheel_bot.services.wheel_service import create_and_analyze_wheel
+from telegram_wheel_bot.services.wheel_service import create_wheel, save_analysis, stream_wheel_analysis
 from telegram_wheel_bot.services.user_service import register_user
-from telegram_wheel_bot.services.llm_service import markdown_to_html
-from telegram_wheel_bot.utils import default_wheel_name, last_three_months_labels, previous_month_label, parse_month_label
-from telegram_wheel_bot.services.history_service import get_history
-from telegram_wheel_bot.database.repository import get_last_user_action_time, log_user_action
+from telegram_wheel_bot.services.jobs import job_pool
+from telegram_wheel_bot.handlers.streaming import ChatMessageRef, stream_to_message, finish_message
+from telegram_wheel_bot.utils import default_wheel_name, last_three_months_labels, previous_month_label, period_from_name
+from telegram_wheel_bot.services.history_service import get_filled_months, get_scores
+from telegram_wheel_bot.database.async_repository import get_last_user_action_time, log_user_action
+from telegram_wheel_bot.database.score_vector import CATEGORIES
 from datetime import datetime, timedelta
 
 
@@ -22,17 +24,7 @@ CHOOSING = 0
 NAMING_WHEEL = 1
 RATING_CATEGORY = 2
 
-
-CATEGORIES = [
-    "Семья",
-    "Друзья",
-    "Здоровье",
-    "Хобби",
-    "Деньги",
-    "Отдых",
-    "Личное развитие",
-    "Работа/бизнес",
-]
+WHEEL_ANALYSIS_JOB = "wheel_analysis"
 
 
 def rating_keyboard(cat_idx: int, selected: int | None = None):
@@ -51,23 +43,10 @@ async def build_wheel_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
     filtered = labels
     user = update.effective_user
     if user:
-        db_user = register_user(user.id, user.username, user.first_name)
-        wheels = get_history(db_user.id)
-        used_dates = set()
-        for w in wheels:
-            try:
-                used_dates.add(parse_month_label(w.name))
-            except Exception:
-                pass
-        tmp = []
-        for lbl in labels:
-            try:
-                d = parse_month_label(lbl)
-            except Exception:
-                d = None
-            if d and d not in used_dates:
-                tmp.append(lbl)
-        filtered = tmp
+        db_user_id = await register_user(user.id, user.username, user.first_name)
+        periods = {lbl: period_from_name(lbl) for lbl in labels}
+        used_dates = await get_filled_months(db_user_id, [d for d in periods.values() if d])
+        filtered = [lbl for lbl, d in periods.items() if d and d not in used_dates]
     if not filtered:
         await update.message.reply_text("За последние три месяца все колеса уже созданы. Используй /history")
         return ConversationHandler.END
@@ -150,44 +129,80 @@ async def rate_category(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await q.edit_message_text("Ошибка: пользователь не найден")
         return ConversationHandler.END
     # Регистрируем/получаем пользователя в базе данных
-    db_user = register_user(user.id, user.username, user.first_name)
+    db_user_id = await register_user(user.id, user.username, user.first_name)
     name = context.user_data.get("wheel_name") or previous_month_label()
     scores = context.user_data.get("wheel_scores", {})
     await q.edit_message_text(
         "✓ Колесо создано! Рисую красивую диаграмму, мне нужно немного времени..."
     )
-    wheel_id, image_path, analysis = await create_and_analyze_wheel(
-        db_user.id, name, scores
-    )
+    wheel_id, image_path = await create_wheel(db_user_id, name, scores)
     if image_path:
         try:
             await q.message.reply_photo(photo=open(image_path, "rb"))
         except Exception:
             pass
-    # Конвертируем markdown в HTML для совместимости со старыми сообщениями
-    html_analysis = markdown_to_html(analysis)
+    # Анализ придет в это сообщение, когда фоновая задача его получит
+    analysis_msg = await q.message.reply_text("Готовлю анализ...")
+    await job_pool.enqueue(
+        WHEEL_ANALYSIS_JOB,
+        wheel_id=wheel_id,
+        user_id=db_user_id,
+        chat_id=analysis_msg.chat_id,
+        message_id=analysis_msg.message_id,
+    )
+    await q.message.reply_text("/history")
+    context.user_data.clear()
+    return ConversationHandler.END
+
+
+async def with_ad(db_user_id: int, scores: dict[str, int], analysis: str):
+    """Добавляет к анализу рекламу, если оценка финансов низкая и реклама не показывалась сутки.
+
+    Показ не записывается: ad_shown логирует вызывающий, когда сообщение доставлено.
+    """
     finance_score = scores.get("Деньги", 0)
     ad_markup = None
     if finance_score < 5:
-        last_ad = get_last_user_action_time(db_user.id, "ad_shown")
+        last_ad = await get_last_user_action_time(db_user_id, "ad_shown")
         if not last_ad or (datetime.utcnow() - last_ad) >= timedelta(hours=24):
             ad_text = (
                 "\n\n— Реклама —\n"
                 "Канал «Деньги по любви» — про финансы и инвестиции от финансового советника Лены Яковлевой @dengipolyubvi.\n"
                 "Подписывайтесь: https://t.me/dengipolyubvi"
             )
-            html_analysis = f"{html_analysis}{ad_text}"
+            analysis = f"{analysis}{ad_text}"
             ad_markup = InlineKeyboardMarkup(
                 [[InlineKeyboardButton("Деньги по любви", url="https://t.me/dengipolyubvi")]]
             )
-            log_user_action(db_user.id, "ad_shown")
+    return analysis, ad_markup
+
+
+async def deliver_wheel_analysis(job, bot) -> None:
+    """Задача WHEEL_ANALYSIS_JOB: получает анализ колеса и выводит его в сообщение-заглушку."""
+    scores = await get_scores(job.wheel_id)
+    if not scores:
+        # Колесо удалили до выполнения задачи
+        return
+    target = ChatMessageRef(bot, job.chat_id, job.message_id)
+    # LLMError и ошибка записи в БД уходят в job_pool: задача повторится,
+    # а при включенном кэше ответов повтор не будет заново запрашивать LLM
+    analysis = await stream_to_message(target, stream_wheel_analysis(scores))
+    await save_analysis(job.wheel_id, analysis)
+    # finish_message конвертирует markdown в HTML и делит на сообщения за один разбор
+    analysis, ad_markup = await with_ad(job.user_id, scores, analysis)
+    await finish_message(target, analysis, ad_markup)
     if ad_markup:
-        await q.message.reply_text(html_analysis, parse_mode=ParseMode.HTML, reply_markup=ad_markup)
-    else:
-        await q.message.reply_text(html_analysis, parse_mode=ParseMode.HTML)
-    await q.message.reply_text("/history")
-    context.user_data.clear()
-    return ConversationHandler.END
+        # Только после доставки: при повторе задачи реклама не должна считаться показанной
+        await log_user_action(job.user_id, "ad_shown")
+
+
+async def wheel_analysis_failed(job, bot, error: Exception) -> None:
+    await ChatMessageRef(bot, job.chat_id, job.message_id).edit_text(
+        "Не удалось получить анализ. Колесо сохранено — его можно открыть в /history"
+    )
+
+
+job_pool.register(WHEEL_ANALYSIS_JOB, deliver_wheel_analysis, wheel_analysis_failed)
 
 
 def build_conversation():
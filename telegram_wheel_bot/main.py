@@ -5,10 +5,25 @@ from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes, Messa
 from telegram import Update, BotCommand
 from telegram_wheel_bot.config import TELEGRAM_TOKEN, WHEELS_DIR, LOG_LEVEL
 from telegram_wheel_bot.database import init_db
+from telegram_wheel_bot.database.async_repository import dispose_engine
+from telegram_wheel_bot.services.llm_service import (
+    start_http_client,
+    close_http_client,
+    health,
+    limiter_stats,
+    latency_stats,
+    policy_stats,
+    router,
+)
+from telegram_wheel_bot.services.analysis_cache import analysis_cache
+from telegram_wheel_bot.services.jobs import job_pool
+from telegram_wheel_bot.services.render_pool import render_pool
+from telegram_wheel_bot.services.prompts import prompts
 from telegram_wheel_bot.handlers.start import start, about
 from telegram_wheel_bot.handlers.wheel import build_conversation
 from telegram_wheel_bot.handlers.history import history_cmd, build_callbacks, compare_cmd
 from telegram_wheel_bot.handlers.clean import build_clean_handlers, clean_cmd
+from telegram_wheel_bot.handlers.admin import llm_status_cmd
 
 # Настройка логирования
 logging.basicConfig(
@@ -23,6 +38,33 @@ def ensure_storage():
         os.makedirs(WHEELS_DIR, exist_ok=True)
 
 
+async def on_startup(app) -> None:
+    """Подготовка ресурсов бота (post_init приложения)."""
+    # Невалидный шаблон промпта останавливает запуск, а не ломает запрос пользователя
+    prompts.load()
+    await start_http_client()
+    await render_pool.start()
+    await health.start()
+    router.start()
+    await job_pool.start(app.bot)
+
+
+async def on_shutdown(app) -> None:
+    """Освобождение ресурсов бота (post_shutdown приложения)."""
+    await job_pool.stop()
+    logger.info(f"Background jobs: {job_pool.stats()}")
+    logger.info(f"Analysis cache: {analysis_cache.stats()}")
+    logger.info(f"LLM load: {limiter_stats()}")
+    logger.info(f"LLM latency: {latency_stats()}")
+    logger.info(f"LLM retries: {policy_stats()}")
+    logger.info(f"Chart rendering: {render_pool.stats()}")
+    await router.stop()
+    await health.stop()
+    await render_pool.stop()
+    await close_http_client()
+    await dispose_engine()
+
+
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработчик ошибок для логирования исключений."""
     logger.error(msg="Exception while handling an update", exc_info=context.error)
@@ -54,7 +96,13 @@ async def clean_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def run():
     init_db()
     ensure_storage()
-    app = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
+    app = (
+        ApplicationBuilder()
+        .token(TELEGRAM_TOKEN)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
     
     # Добавление обработчика ошибок
     app.add_error_handler(error_handler)
@@ -65,6 +113,7 @@ async def run():
     app.add_handler(CommandHandler("Посмотреть_историю", history_handler))
     app.add_handler(CommandHandler("history", history_handler))
     app.add_handler(CommandHandler("compare", compare_cmd))
+    app.add_handler(CommandHandler("llm", llm_status_cmd))
     
     # Регистрируем обработчики clean ПЕРЕД ConversationHandler
     clean_handlers = build_clean_handlers()
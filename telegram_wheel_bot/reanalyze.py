@@ -0,0 +1,263 @@
+"""
+Пакетный анализ колес вне бота: дозаполнение пропущенных и пересчет устаревших.
+
+Режимы (--mode):
+  missing  анализа нет или вместо него сохранен текст ошибки
+  stale    то же плюс анализы по другой (или неизвестной) версии промпта wheel_analysis
+  all      все колеса
+
+Анализ запрашивается через llm_service.analyze_wheel — с теми же
+ограничителями, выбором модели, повторами и кэшем ответов, что и в боте.
+Колеса читаются страницами по возрастанию id (keyset: id > последнего
+прочитанного, без OFFSET), одновременно выполняется не больше --concurrency
+анализов, результаты пишутся пачками по --batch-size одной транзакцией.
+После каждой пачки в --checkpoint сохраняется id, до которого все колеса
+обработаны: прерванный запуск продолжается с него (--restart — с начала).
+Колеса, анализ которых не удался, пропускаются и остаются кандидатами на
+следующий запуск с --restart. Раз в --report-every секунд в лог пишется
+прогресс: обработано, сохранено, ошибок, колес в минуту, оставшееся время.
+
+Запуск:
+    python -m telegram_wheel_bot.reanalyze --mode missing --dry-run
+    python -m telegram_wheel_bot.reanalyze --mode stale --concurrency 2 --batch-size 20
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from telegram_wheel_bot.config import LOG_LEVEL
+from telegram_wheel_bot.database import init_db
+from telegram_wheel_bot.database.async_repository import (
+    WheelSnapshot,
+    count_wheels_for_analysis,
+    dispose_engine,
+    get_wheels_for_analysis,
+    store_wheel_analyses,
+)
+from telegram_wheel_bot.services.llm_policy import LLMError
+from telegram_wheel_bot.services.llm_service import analyze_wheel, close_http_client, start_http_client
+from telegram_wheel_bot.services.prompts import prompts
+from telegram_wheel_bot.services.wheel_service import analysis_prompt_version, ordered_scores
+
+logger = logging.getLogger("telegram_wheel_bot.reanalyze")
+
+
+class Aborted(Exception):
+    """Слишком много ошибок LLM подряд: провайдер, видимо, недоступен."""
+
+
+@dataclass
+class Stats:
+    total: int = 0
+    saved: int = 0
+    failed: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    def line(self) -> str:
+        done = self.saved + self.failed
+        elapsed = time.monotonic() - self.started
+        rate = done / elapsed if elapsed else 0.0
+        eta = (self.total - done) / rate if rate else None
+        return (
+            f"{done}/{self.total} processed, {self.saved} saved, {self.failed} failed, "
+            f"{rate * 60:.1f} wheels/min, elapsed {elapsed:.0f}s"
+            + (f", ETA {eta:.0f}s" if eta is not None else "")
+        )
+
+
+class Checkpoint:
+    """Файл с позицией: все колеса с id <= last_id обработаны для данных mode и версии промпта."""
+
+    def __init__(self, path: str, mode: str, prompt_version: str):
+        self.path = path
+        self.mode = mode
+        self.prompt_version = prompt_version
+
+    def load(self) -> int:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as e:
+            logger.warning(f"Checkpoint {self.path} unreadable, starting over: {e}")
+            return 0
+        if data.get("mode") != self.mode or data.get("prompt_version") != self.prompt_version:
+            logger.info(
+                f"Checkpoint {self.path} is for mode={data.get('mode')} prompt={data.get('prompt_version')}, starting over"
+            )
+            return 0
+        return int(data.get("last_id", 0))
+
+    def save(self, last_id: int, stats: Stats) -> None:
+        data = {
+            "mode": self.mode,
+            "prompt_version": self.prompt_version,
+            "last_id": last_id,
+            "saved": stats.saved,
+            "failed": stats.failed,
+            "updated_at": datetime.utcnow().isoformat(),
+        }
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+
+class Watermark:
+    """Наибольший id, до которого все выданные колеса завершены (сохранены или пропущены).
+
+    Анализы завершаются не по порядку, поэтому позиция продвигается только
+    по непрерывному префиксу выданных id.
+    """
+
+    def __init__(self, start: int):
+        self.value = start
+        self._dispatched: deque[int] = deque()
+        self._finished: set[int] = set()
+
+    def dispatch(self, wheel_id: int) -> None:
+        self._dispatched.append(wheel_id)
+
+    def finish(self, wheel_id: int) -> None:
+        self._finished.add(wheel_id)
+        while self._dispatched and self._dispatched[0] in self._finished:
+            self.value = self._dispatched.popleft()
+            self._finished.discard(self.value)
+
+
+async def reanalyze(args: argparse.Namespace) -> bool:
+    """Обрабатывает колеса; False — остановлено из-за серии ошибок LLM."""
+    init_db()
+    prompts.load()
+    version = analysis_prompt_version()
+    checkpoint = Checkpoint(args.checkpoint, args.mode, version)
+    after_id = 0 if args.restart else checkpoint.load()
+    stats = Stats(total=await count_wheels_for_analysis(after_id, args.mode, version))
+    if args.limit:
+        stats.total = min(stats.total, args.limit)
+    logger.info(f"Reanalysis: mode={args.mode}, prompt={version}, after id {after_id}, {stats.total} wheels")
+    if args.dry_run or not stats.total:
+        await dispose_engine()
+        return True
+
+    await start_http_client()
+    queue: asyncio.Queue[WheelSnapshot | None] = asyncio.Queue(maxsize=args.concurrency * 2)
+    watermark = Watermark(after_id)
+    pending: list[tuple[int, str, str]] = []
+    failures_in_row = 0
+
+    async def produce() -> None:
+        last_id, sent = after_id, 0
+        while sent < stats.total:
+            page = await get_wheels_for_analysis(last_id, min(args.page_size, stats.total - sent), args.mode, version)
+            if not page:
+                break
+            for snapshot in page:
+                watermark.dispatch(snapshot.id)
+                await queue.put(snapshot)
+            sent += len(page)
+            last_id = page[-1].id
+        for _ in range(args.concurrency):
+            await queue.put(None)
+
+    async def flush() -> None:
+        nonlocal pending
+        batch, pending = pending, []
+        if batch:
+            try:
+                await store_wheel_analyses(batch)
+            except Exception:
+                # Пачка не записана: анализы остаются в pending, checkpoint не сдвигается
+                pending = batch + pending
+                raise
+            stats.saved += len(batch)
+            for wheel_id, _, _ in batch:
+                watermark.finish(wheel_id)
+        checkpoint.save(watermark.value, stats)
+
+    async def work() -> None:
+        nonlocal failures_in_row
+        while (snapshot := await queue.get()) is not None:
+            try:
+                analysis = await analyze_wheel(ordered_scores(snapshot.scores))
+            except LLMError as e:
+                stats.failed += 1
+                failures_in_row += 1
+                watermark.finish(snapshot.id)
+                logger.warning(f"Wheel {snapshot.id}: analysis failed: {type(e).__name__}: {e}")
+                if failures_in_row >= args.max_failures:
+                    raise Aborted(f"{failures_in_row} failures in a row")
+                continue
+            failures_in_row = 0
+            pending.append((snapshot.id, analysis, version))
+            if len(pending) >= args.batch_size:
+                await flush()
+
+    async def report() -> None:
+        while True:
+            await asyncio.sleep(args.report_every)
+            logger.info(stats.line())
+
+    reporter = asyncio.create_task(report())
+    completed = True
+    try:
+        # Ошибка любой задачи (в том числе Aborted) отменяет остальные
+        async with asyncio.TaskGroup() as tasks:
+            tasks.create_task(produce())
+            for _ in range(args.concurrency):
+                tasks.create_task(work())
+    except* Aborted as group:
+        logger.error(f"Reanalysis stopped: {group.exceptions[0]}")
+        completed = False
+    except* Exception as group:
+        logger.error(f"Reanalysis failed: {group.exceptions[0]}", exc_info=group.exceptions[0])
+        completed = False
+    finally:
+        reporter.cancel()
+        # Готовые анализы сохраняются и при прерывании (Ctrl+C, серия ошибок, ошибка записи)
+        try:
+            await flush()
+        except Exception as e:
+            logger.error(f"Could not save {len(pending)} analyses: {e}", exc_info=True)
+            completed = False
+        logger.info(f"Reanalysis finished: {stats.line()}, checkpoint id {watermark.value}")
+        await close_http_client()
+        await dispose_engine()
+    return completed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["missing", "stale", "all"], default="missing")
+    parser.add_argument("--concurrency", type=int, default=2, help="одновременных анализов")
+    parser.add_argument("--page-size", type=int, default=200, help="колес в одном запросе к БД")
+    parser.add_argument("--batch-size", type=int, default=20, help="анализов в одной транзакции записи")
+    parser.add_argument("--checkpoint", default="reanalyze_checkpoint.json")
+    parser.add_argument("--restart", action="store_true", help="игнорировать checkpoint и начать с начала")
+    parser.add_argument("--limit", type=int, default=0, help="обработать не больше N колес (0 — все)")
+    parser.add_argument("--max-failures", type=int, default=10, help="остановиться после N ошибок LLM подряд")
+    parser.add_argument("--report-every", type=float, default=30, help="период отчета о прогрессе, сек")
+    parser.add_argument("--dry-run", action="store_true", help="только посчитать колеса")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        level=getattr(logging, LOG_LEVEL.upper()),
+    )
+    try:
+        completed = asyncio.run(reanalyze(args))
+    except KeyboardInterrupt:
+        logger.info("Interrupted, progress saved to checkpoint")
+        completed = False
+    sys.exit(0 if completed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Кэш ответов LLM по содержимому запроса.
+
+Ключ — sha256 от вида запроса (analysis / comparison), входных данных
+(векторы оценок и даты), версии шаблона промпта, провайдера и модели.
+Ответ сохраняется под моделью, которая его дала (запасной провайдер,
+бесплатная модель, победитель хеджа), а не под моделью из конфигурации.
+При поиске перебираются ключи всех моделей-кандидатов в порядке
+конфигурации: одинаковые оценки при том же промпте дают готовый ответ любой
+из них без повторной генерации. Записи хранятся в таблице
+llm_analysis_cache, перед ней — LRU в памяти. Ответы с ошибкой не кэшируются.
+"""
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Awaitable, Callable
+from telegram_wheel_bot.config import (
+    ANALYSIS_CACHE_ENABLED,
+    ANALYSIS_CACHE_MEMORY_SIZE,
+    ANALYSIS_CACHE_MAX_ROWS,
+    ANALYSIS_CACHE_TTL,
+)
+from telegram_wheel_bot.database.async_repository import (
+    get_cached_analysis,
+    touch_cached_analysis,
+    store_cached_analysis,
+    evict_cached_analyses,
+)
+from telegram_wheel_bot.services.cache import TTLCache
+from telegram_wheel_bot.services.llm_router import Candidate
+from telegram_wheel_bot.services.prompts import prompts
+
+logger = logging.getLogger(__name__)
+
+# Как часто (в новых записях) чистить таблицу от устаревших и лишних строк
+EVICT_EVERY = 100
+
+
+class AnalysisCache:
+    def __init__(self, memory_size: int, max_rows: int, ttl: float):
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self._memory: TTLCache[str, str] = TTLCache(memory_size, ttl)
+        self._stored = 0
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def key(self, kind: str, payload: dict, prompt_name: str, provider: str, model: str) -> str:
+        raw = json.dumps(
+            [kind, payload, prompts.version(prompt_name), provider, model],
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _not_before(self) -> datetime:
+        return datetime.utcnow() - timedelta(seconds=self.ttl)
+
+    async def get(self, keys: list[str]) -> str | None:
+        """Ответ по первому найденному из keys (порядок — приоритет моделей)."""
+        for key in keys:
+            result = self._memory.get(key)
+            if result is not None:
+                self.memory_hits += 1
+                return result
+        try:
+            found = await get_cached_analysis(keys, self._not_before())
+            if found is not None:
+                await touch_cached_analysis(found[0])
+        except Exception as e:
+            logger.warning(f"Analysis cache lookup failed: {e}")
+            found = None
+        if found is None:
+            self.misses += 1
+            return None
+        self.db_hits += 1
+        key, result = found
+        self._memory.set(key, result)
+        return result
+
+    async def set(self, key: str, kind: str, provider: str, model: str, result: str) -> None:
+        self._memory.set(key, result)
+        try:
+            await store_cached_analysis(key, kind, provider, model, result)
+            self._stored += 1
+            if self._stored % EVICT_EVERY == 0:
+                await evict_cached_analyses(self._not_before(), self.max_rows)
+        except Exception as e:
+            logger.warning(f"Analysis cache store failed: {e}")
+
+    async def store(self, kind: str, payload: dict, prompt_name: str, answered: Candidate, result: str) -> None:
+        key = self.key(kind, payload, prompt_name, answered.provider, answered.model)
+        await self.set(key, kind, answered.provider, answered.model, result)
+
+    async def cached(
+        self,
+        kind: str,
+        payload: dict,
+        prompt_name: str,
+        models: list[Candidate],
+        produce: Callable[[], Awaitable[tuple[Candidate, str]]],
+    ) -> str:
+        """Возвращает ответ любой из models из кэша или вызывает produce() и сохраняет результат.
+
+        produce() возвращает ответ и модель, которая его дала; ошибка
+        генерации — исключение из produce(), в кэш она не попадает.
+        """
+        if not ANALYSIS_CACHE_ENABLED:
+            return (await produce())[1]
+        result = await self.get([self.key(kind, payload, prompt_name, m.provider, m.model) for m in models])
+        if result is not None:
+            return result
+        answered, result = await produce()
+        await self.store(kind, payload, prompt_name, answered, result)
+        return result
+
+    async def stream_cached(
+        self,
+        kind: str,
+        payload: dict,
+        prompt_name: str,
+        models: list[Candidate],
+        produce: Callable[[Callable[[Candidate], None]], AsyncIterator[str]],
+    ) -> AsyncIterator[str]:
+        """Потоковый вариант cached(): попадание отдается одним фрагментом.
+
+        produce(on_answer) сообщает через on_answer модель, чей поток выбран;
+        полный ответ сохраняется под ней, если поток завершился без ошибки.
+        """
+        answered: list[Candidate] = []
+        if not ANALYSIS_CACHE_ENABLED:
+            async for chunk in produce(answered.append):
+                yield chunk
+            return
+        result = await self.get([self.key(kind, payload, prompt_name, m.provider, m.model) for m in models])
+        if result is not None:
+            yield result
+            return
+        chunks = []
+        async for chunk in produce(answered.append):
+            chunks.append(chunk)
+            yield chunk
+        result = "".join(chunks)
+        if result and answered:
+            await self.store(kind, payload, prompt_name, answered[-1], result)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.memory_hits + self.db_hits + self.misses
+        return (self.memory_hits + self.db_hits) / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 3),
+            "memory_size": len(self._memory),
+        }
+
+
+analysis_cache = AnalysisCache(ANALYSIS_CACHE_MEMORY_SIZE, ANALYSIS_CACHE_MAX_ROWS, ANALYSIS_CACHE_TTL)
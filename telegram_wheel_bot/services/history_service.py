@@ -1,37 +1,57 @@
-from telegram_wheel_bot.database.repository import list_user_wheels, get_latest_wheel, get_wheel_scores, get_wheel_by_id
+import logging
+from telegram_wheel_bot.database.async_repository import (
+    list_user_wheels,
+    get_wheel_scores,
+    get_wheel_by_id,
+    get_wheel_snapshot,
+    get_wheel_snapshots,
+    get_filled_periods,
+    get_comparison,
+    save_comparison,
+    WheelSnapshot,
+)
+from datetime import date
 from telegram_wheel_bot.utils import parse_month_label, previous_month_label
 
+logger = logging.getLogger(__name__)
 
-def get_history(user_id: int):
-    return list_user_wheels(user_id)
 
+async def get_history(user_id: int):
+    return await list_user_wheels(user_id)
 
-def get_latest(user_id: int):
-    return get_latest_wheel(user_id)
 
+async def get_scores(wheel_id: int):
+    return await get_wheel_scores(wheel_id)
 
-def get_scores(wheel_id: int):
-    return get_wheel_scores(wheel_id)
 
+async def get_wheel(wheel_id: int):
+    return await get_wheel_by_id(wheel_id)
 
-def get_wheel(wheel_id: int):
-    return get_wheel_by_id(wheel_id)
 
-
-def get_previous_filled(user_id: int):
-    """Find the wheel for the previous calendar month relative to today."""
-    wheels = list_user_wheels(user_id)
+async def get_snapshot(wheel_id: int) -> WheelSnapshot | None:
+    """Колесо с оценками и колесом предыдущего календарного месяца (snapshot.previous)."""
     try:
         target_date = parse_month_label(previous_month_label())
     except Exception:
         target_date = None
-    if not target_date:
-        return None
-    for w in wheels:
-        try:
-            d = parse_month_label(w.name)
-        except Exception:
-            continue
-        if d == target_date:
-            return w
-    return None
+    return await get_wheel_snapshot(wheel_id, target_date)
+
+
+async def get_snapshots(wheel_ids: list[int]) -> dict[int, WheelSnapshot]:
+    return await get_wheel_snapshots(wheel_ids)
+
+
+async def get_filled_months(user_id: int, months: list[date]) -> set[date]:
+    return await get_filled_periods(user_id, months)
+
+
+async def get_saved_comparison(wheel_id_1: int, wheel_id_2: int) -> str | None:
+    return await get_comparison(wheel_id_1, wheel_id_2)
+
+
+async def store_comparison(wheel_id_1: int, wheel_id_2: int, analysis: str) -> None:
+    try:
+        await save_comparison(wheel_id_1, wheel_id_2, analysis)
+    except Exception:
+        # Пользователь анализ уже получил; без записи следующее сравнение пары запросит LLM снова
+        logger.error(f"Failed to save comparison {wheel_id_1}/{wheel_id_2}", exc_info=True)
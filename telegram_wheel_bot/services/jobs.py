@@ -0,0 +1,175 @@
+"""
+Фоновые задачи с хранением в БД (таблица analysis_jobs).
+
+Хендлер сохраняет задачу и сразу отвечает пользователю; задачу выполняет
+один из воркеров пула. Неудачная попытка повторяется с нарастающей паузой до
+max_attempts раз. Задачи, не завершенные к остановке бота, при следующем
+запуске возвращаются в очередь, поэтому перезапуск не теряет анализ.
+Обработчик для каждого вида задачи регистрируется через register().
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+from telegram import Bot
+from telegram_wheel_bot.config import JOB_WORKERS, JOB_MAX_ATTEMPTS, JOB_RETRY_DELAY
+from telegram_wheel_bot.database.models import AnalysisJob
+from telegram_wheel_bot.database.async_repository import (
+    create_job,
+    start_job,
+    finish_job,
+    requeue_interrupted_jobs,
+)
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[AnalysisJob, Bot], Awaitable[None]]
+FailureHandler = Callable[[AnalysisJob, Bot, Exception], Awaitable[None]]
+
+
+class JobPool:
+    def __init__(self, workers: int, max_attempts: int, retry_delay: float):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._handlers: dict[str, tuple[Handler, FailureHandler | None]] = {}
+        self._queue: asyncio.Queue[int] | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._timers: set[asyncio.TimerHandle] = set()
+        self._bot: Bot | None = None
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self._wait_times: deque[float] = deque(maxlen=1000)
+        self._run_times: deque[float] = deque(maxlen=1000)
+
+    def register(self, kind: str, handler: Handler, on_failure: FailureHandler | None = None) -> None:
+        self._handlers[kind] = (handler, on_failure)
+
+    @property
+    def depth(self) -> int:
+        """Задачи, ожидающие воркера, включая отложенные повторы."""
+        return (self._queue.qsize() if self._queue else 0) + len(self._timers)
+
+    async def start(self, bot: Bot) -> None:
+        """Возвращает в очередь незавершенные задачи и запускает воркеры."""
+        if self._tasks:
+            return
+        self._bot = bot
+        self._queue = asyncio.Queue()
+        pending = await requeue_interrupted_jobs()
+        for job in pending:
+            self._schedule(job.id, job.next_run_at)
+        if pending:
+            logger.info(f"Resumed {len(pending)} background jobs")
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._worker(), name=f"job-worker-{n}") for n in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Останавливает воркеры; прерванные задачи будут продолжены при следующем запуске."""
+        for timer in self._timers:
+            timer.cancel()
+        self._timers.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def enqueue(
+        self,
+        kind: str,
+        wheel_id: int | None = None,
+        user_id: int | None = None,
+        chat_id: int | None = None,
+        message_id: int | None = None,
+    ) -> int:
+        job = await create_job(kind, wheel_id, user_id, chat_id, message_id)
+        if self._queue is not None:
+            self._queue.put_nowait(job.id)
+        return job.id
+
+    def _schedule(self, job_id: int, run_at: datetime | None) -> None:
+        delay = (run_at - datetime.utcnow()).total_seconds() if run_at else 0
+        if delay <= 0:
+            self._queue.put_nowait(job_id)
+            return
+        loop = asyncio.get_running_loop()
+
+        def fire() -> None:
+            self._timers.discard(timer)
+            self._queue.put_nowait(job_id)
+
+        timer = loop.call_later(delay, fire)
+        self._timers.add(timer)
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                logger.error(f"Job {job_id} bookkeeping failed: {e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: int) -> None:
+        job = await start_job(job_id)
+        if job is None:
+            return
+        self._wait_times.append((job.started_at - job.next_run_at).total_seconds())
+        if job.kind not in self._handlers:
+            logger.error(f"Job {job.id}: no handler for kind {job.kind!r}")
+            await finish_job(job.id, "failed", f"unknown job kind {job.kind!r}")
+            self.failed += 1
+            return
+        handler, on_failure = self._handlers[job.kind]
+        self.running += 1
+        started = time.perf_counter()
+        try:
+            await handler(job, self._bot)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if job.attempts < self.max_attempts:
+                delay = self.retry_delay * 2 ** (job.attempts - 1)
+                logger.warning(f"Job {job.id} ({job.kind}) attempt {job.attempts} failed, retry in {delay:.0f}s: {error}")
+                run_at = datetime.utcnow() + timedelta(seconds=delay)
+                await finish_job(job.id, "queued", error, run_at)
+                self.retried += 1
+                self._schedule(job.id, run_at)
+            else:
+                logger.error(f"Job {job.id} ({job.kind}) failed after {job.attempts} attempts: {error}")
+                await finish_job(job.id, "failed", error)
+                self.failed += 1
+                if on_failure is not None:
+                    try:
+                        await on_failure(job, self._bot, e)
+                    except Exception as notify_error:
+                        logger.error(f"Job {job.id} failure handler failed: {notify_error}")
+        else:
+            await finish_job(job.id, "done")
+            self.completed += 1
+        finally:
+            self.running -= 1
+            self._run_times.append(time.perf_counter() - started)
+
+    def stats(self) -> dict:
+        def avg(values) -> float:
+            return round(sum(values) / len(values), 3) if values else 0.0
+
+        return {
+            "depth": self.depth,
+            "running": self.running,
+            "completed": self.completed,
+            "retried": self.retried,
+            "failed": self.failed,
+            "avg_wait_s": avg(self._wait_times),
+            "max_wait_s": round(max(self._wait_times, default=0.0), 3),
+            "avg_run_s": avg(self._run_times),
+            "max_run_s": round(max(self._run_times, default=0.0), 3),
+        }
+
+
+job_pool = JobPool(JOB_WORKERS, JOB_MAX_ATTEMPTS, JOB_RETRY_DELAY)
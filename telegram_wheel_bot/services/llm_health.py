@@ -0,0 +1,181 @@
+"""
+Состояние LLM-провайдеров.
+
+HealthMonitor в фоне раз в interval секунд опрашивает провайдеров (список
+моделей) и хранит результат, поэтому выбор провайдера при запросе не требует
+сетевых вызовов. CircuitBreaker на каждого провайдера размыкается после
+нескольких ошибок подряд (рабочих запросов или проверок): пока он открыт, провайдер пропускается сразу, без
+ожидания таймаута. По истечении reset_timeout пропускается один пробный
+запрос (half-open); успешный запрос или проверка монитора замыкают цепь.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+Probe = Callable[[], Awaitable[list[str]]]
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self) -> bool:
+        """Можно ли отправить запрос провайдеру прямо сейчас."""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._trial:
+            self._trial = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def release(self) -> None:
+        """Пробный запрос завершился без результата (отменен, отклонен ограничителем).
+
+        Ни успехом, ни ошибкой он не считается, но следующий запрос снова
+        может стать пробным, иначе цепь осталась бы закрытой для всех
+        запросов до проверки монитора.
+        """
+        self._trial = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+@dataclass
+class ProviderStatus:
+    name: str
+    breaker: CircuitBreaker
+    healthy: bool | None = None
+    models: list[str] = field(default_factory=list)
+    checked_at: float | None = None
+    error: str | None = None
+
+    def available(self) -> bool:
+        """Цепь пропускает запрос.
+
+        Неудачная проверка монитора учитывается как ошибка размыкателя, но
+        сама по себе провайдера не отключает: одиночный медленный ответ на
+        проверку не должен отклонять все запросы до следующего опроса.
+        Провайдер пропускается, только когда цепь разомкнута.
+        """
+        return self.breaker.allow()
+
+
+class HealthMonitor:
+    def __init__(self, interval: float, failure_threshold: int, reset_timeout: float):
+        self.interval = interval
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._probes: dict[str, Probe] = {}
+        self._status: dict[str, ProviderStatus] = {}
+        self._task: asyncio.Task | None = None
+
+    def add(self, name: str, probe: Probe) -> None:
+        self._probes[name] = probe
+        self._status[name] = ProviderStatus(name, CircuitBreaker(self.failure_threshold, self.reset_timeout))
+
+    def status(self, name: str) -> ProviderStatus:
+        return self._status[name]
+
+    def snapshot(self) -> dict[str, dict]:
+        """Состояние всех провайдеров для логов и отладки."""
+        return {
+            name: {
+                "healthy": s.healthy,
+                "breaker": s.breaker.state,
+                "failures": s.breaker.failures,
+                "models": len(s.models),
+                "checked_at": s.checked_at,
+                "error": s.error,
+            }
+            for name, s in self._status.items()
+        }
+
+    async def check(self, name: str) -> bool:
+        """Опрашивает провайдера и обновляет его состояние."""
+        status = self._status[name]
+        try:
+            status.models = await self._probes[name]()
+        except Exception as e:
+            if status.healthy is not False:
+                logger.warning(f"LLM provider {name} is unavailable: {type(e).__name__}: {e}")
+            status.healthy = False
+            status.error = f"{type(e).__name__}: {e}"
+            status.breaker.record_failure()
+        else:
+            if status.healthy is False:
+                logger.info(f"LLM provider {name} is available again")
+            status.healthy = True
+            status.error = None
+            status.breaker.record_success()
+        status.checked_at = time.time()
+        return bool(status.healthy)
+
+    async def check_all(self) -> None:
+        await asyncio.gather(*(self.check(name) for name in self._probes))
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check_all()
+            except Exception as e:
+                logger.error(f"LLM health check failed: {e}", exc_info=True)
+
+    async def start(self) -> None:
+        """Выполняет первую проверку и запускает периодический опрос."""
+        if self._task is not None and not self._task.done():
+            return
+        await self.check_all()
+        self._task = asyncio.get_running_loop().create_task(self._run(), name="llm-health")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def release(self, name: str) -> None:
+        """Запрос к провайдеру завершился без результата (см. CircuitBreaker.release)."""
+        self._status[name].breaker.release()
+
+    def record(self, name: str, ok: bool) -> None:
+        """Учитывает результат рабочего запроса к провайдеру."""
+        status = self._status[name]
+        if ok:
+            status.breaker.record_success()
+            status.healthy = True
+        else:
+            status.breaker.record_failure()
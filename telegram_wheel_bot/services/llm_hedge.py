@@ -0,0 +1,137 @@
+"""
+Хеджирование запросов к LLM.
+
+LatencyHistogram хранит распределение задержек провайдера в логарифмических
+корзинах. Hedger.run() запускает основной вызов и, если тот не дал
+приемлемого результата за delay секунд (p-й процентиль задержки основного
+провайдера), параллельно запускает запасной. Побеждает первый приемлемый
+результат, второй вызов отменяется. Лишняя нагрузка приходится только на
+медленные запросы: при p95 — примерно на каждый двадцатый.
+"""
+import asyncio
+from bisect import bisect_left
+from typing import Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+# Верхние границы корзин: от 50 мс с шагом x1.5 (последняя ~840 с)
+BUCKETS = [0.05 * 1.5 ** i for i in range(25)]
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def record(self, seconds: float) -> None:
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def percentile(self, p: float) -> float | None:
+        """Верхняя граница корзины, в которую попадает p-й процентиль."""
+        if not self.count:
+            return None
+        rank = self.count * p / 100
+        seen = 0
+        for i, n in enumerate(self.counts[:-1]):
+            seen += n
+            if seen >= rank:
+                return BUCKETS[i]
+        return BUCKETS[-1]
+
+    def snapshot(self) -> dict:
+        def rounded(value: float | None) -> float | None:
+            return round(value, 3) if value is not None else None
+
+        return {
+            "count": self.count,
+            "mean": rounded(self.total / self.count) if self.count else None,
+            "p50": rounded(self.percentile(50)),
+            "p95": rounded(self.percentile(95)),
+            "p99": rounded(self.percentile(99)),
+        }
+
+
+class Hedger:
+    def __init__(self, percentile: float, min_samples: int, default_delay: float, min_delay: float):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        # (провайдер, метрика): total — полный ответ, ttft — первый фрагмент потока
+        self._histograms: dict[tuple[str, str], LatencyHistogram] = {}
+        self.hedged = 0
+        self.secondary_won = 0
+
+    def histogram(self, provider: str, metric: str) -> LatencyHistogram:
+        return self._histograms.setdefault((provider, metric), LatencyHistogram())
+
+    def record(self, provider: str, metric: str, seconds: float) -> None:
+        self.histogram(provider, metric).record(seconds)
+
+    def delay(self, provider: str, metric: str) -> float:
+        """Сколько ждать основного провайдера, прежде чем запускать запасной."""
+        histogram = self.histogram(provider, metric)
+        if histogram.count < self.min_samples:
+            return self.default_delay
+        return max(self.min_delay, histogram.percentile(self.percentile))
+
+    async def run(
+        self,
+        primary: Callable[[], Awaitable[T | None]],
+        secondary: Callable[[], Awaitable[T | None]],
+        delay: float,
+        accept: Callable[[T | None], bool],
+        discard: Callable[[T], Awaitable[None]] | None = None,
+    ) -> T | None:
+        """Первый приемлемый результат основного или запасного вызова.
+
+        Запасной вызов стартует через delay секунд или сразу, как только
+        основной завершился неприемлемо. Если приемлемых результатов нет,
+        возвращается первый не-None результат (основного, затем запасного).
+        discard освобождает результат проигравшего, если тот успел
+        завершиться (например, закрывает открытый поток).
+        """
+        def good(task: asyncio.Future) -> bool:
+            return task.done() and not task.cancelled() and task.exception() is None and accept(task.result())
+
+        first = asyncio.ensure_future(primary())
+        tasks = [first]
+        chosen = None
+        try:
+            await asyncio.wait(tasks, timeout=delay)
+            if not good(first):
+                self.hedged += 1
+                tasks.append(asyncio.ensure_future(secondary()))
+            while True:
+                chosen = next((t for t in tasks if good(t)), None)
+                if chosen is not None:
+                    if chosen is not first:
+                        self.secondary_won += 1
+                    return chosen.result()
+                pending = [t for t in tasks if not t.done()]
+                if not pending:
+                    break
+                await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            completed = [t for t in tasks if not t.cancelled() and t.exception() is None]
+            if not completed:
+                return first.result()
+            chosen = next((t for t in completed if t.result() is not None), completed[0])
+            return chosen.result()
+        finally:
+            losers = [t for t in tasks if t is not chosen]
+            for task in losers:
+                task.cancel()
+            await asyncio.gather(*losers, return_exceptions=True)
+            if discard is not None:
+                for task in losers:
+                    if not task.cancelled() and task.exception() is None and task.result() is not None:
+                        await discard(task.result())
+
+    def stats(self) -> dict:
+        stats = {f"{provider}.{metric}": h.snapshot() for (provider, metric), h in self._histograms.items()}
+        stats["hedged"] = self.hedged
+        stats["secondary_won"] = self.secondary_won
+        return stats
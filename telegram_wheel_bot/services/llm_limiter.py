@@ -0,0 +1,97 @@
+"""
+Ограничение нагрузки на LLM-провайдеров.
+
+ProviderLimiter пропускает к провайдеру не больше max_concurrency генераций
+одновременно; остальные ждут в очереди длиной до max_queue не дольше
+queue_timeout секунд. Запрос сверх очереди или не дождавшийся слота
+отклоняется сразу (ProviderOverloaded), чтобы всплеск не превратился в
+десятки одновременных таймаутов. Coalescer объединяет одинаковые запросы,
+выполняющиеся одновременно: они ждут один вызов провайдера.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+from telegram_wheel_bot.services.llm_policy import LLMError
+
+T = TypeVar("T")
+
+
+class ProviderOverloaded(LLMError):
+    """Провайдер занят: очередь заполнена или слот не освободился вовремя."""
+
+
+class ProviderLimiter:
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+        self.completed = 0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        if self.in_flight >= self.max_concurrency and self.queued >= self.max_queue:
+            self.rejected += 1
+            raise ProviderOverloaded(f"{self.name}: очередь заполнена ({self.queued})")
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise ProviderOverloaded(f"{self.name}: нет свободного слота за {self.queue_timeout:.0f}с") from None
+        finally:
+            self.queued -= 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "max_concurrency": self.max_concurrency,
+        }
+
+
+class Coalescer:
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._waiters: dict[asyncio.Future, int] = {}
+        self.coalesced = 0
+
+    async def run(self, key: str, call: Callable[[], Awaitable[T]]) -> T:
+        """Выполняет call() или присоединяется к уже идущему вызову с тем же ключом.
+
+        Общий вызов защищен от отмены отдельного ожидающего: остальные все
+        равно получат результат. Когда уходит последний ожидающий (например,
+        проигравший хедж-запрос), вызов отменяется и освобождает провайдера.
+        """
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            future = asyncio.ensure_future(call())
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._inflight.pop(key) if self._inflight.get(key) is f else None)
+        self._waiters[future] = self._waiters.get(future, 0) + 1
+        try:
+            return await asyncio.shield(future)
+        finally:
+            self._waiters[future] -= 1
+            if not self._waiters[future]:
+                del self._waiters[future]
+                if not future.done():
+                    future.cancel()
+
+    def __len__(self) -> int:
+        return len(self._inflight)
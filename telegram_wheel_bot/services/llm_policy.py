@@ -0,0 +1,163 @@
+"""
+Политика запросов к LLM: срок, повторы, бюджет ответа и типизированные ошибки.
+
+Запрос пользователя (анализ, сравнение) получает срок — Deadline: все
+попытки, паузы и переходы к другим моделям укладываются в него, а таймаут
+HTTP каждой попытки не выходит за оставшееся время. Повторяются только
+временные отказы (таймаут, обрыв соединения, HTTP 429 и 5xx) — с
+экспоненциальной паузой и полным джиттером, не короче Retry-After
+провайдера; если пауза не помещается в срок, повтора нет. Длина ответа
+ограничена бюджетом токенов для типа промпта, чтобы зависшая генерация не
+держала слот ограничителя до таймаута.
+
+Ошибки — исключения LLMError, а не строки "Ошибка анализа: ...", поэтому
+неудачный анализ не попадает в базу и кэш как обычный текст.
+"""
+import asyncio
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, TypeVar
+import httpx
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Ответы, после которых имеет смысл повторить тот же запрос
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """Ответ модели не получен; текст — для логов, не для пользователя."""
+    retryable = False
+
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ProviderError(LLMError):
+    """Временный отказ провайдера: таймаут, обрыв соединения, HTTP 429 или 5xx."""
+    retryable = True
+
+
+class ResponseError(LLMError):
+    """Провайдер ответил, но ответ непригоден: HTTP 4xx, не JSON, пустой текст."""
+
+
+class DeadlineExceeded(LLMError):
+    """Срок запроса истек."""
+
+
+class LLMUnavailable(LLMError):
+    """Ни одна модель не ответила; причина — в __cause__."""
+
+
+def retry_after(response: httpx.Response) -> float | None:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def http_error(provider: str, response: httpx.Response) -> LLMError:
+    message = f"{provider}: HTTP {response.status_code}: {response.text[:200]}"
+    if response.status_code in RETRYABLE_STATUS:
+        return ProviderError(message, retry_after(response))
+    return ResponseError(message)
+
+
+def transport_error(provider: str, error: httpx.HTTPError) -> LLMError:
+    return ProviderError(f"{provider}: {type(error).__name__}: {error}")
+
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return self.at - time.monotonic()
+
+    def check(self) -> float:
+        """Оставшееся время; DeadlineExceeded, если срок истек."""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"срок запроса {self.seconds:.0f}с истек")
+        return remaining
+
+    def timeout(self, limit: float, connect: float) -> httpx.Timeout:
+        """Таймаут попытки: не больше limit и не дольше оставшегося срока."""
+        remaining = self.check()
+        return httpx.Timeout(min(limit, remaining), connect=min(connect, remaining))
+
+
+class RequestPolicy:
+    def __init__(
+        self,
+        deadlines: dict[str, float],
+        budgets: dict[str, int],
+        attempts: int,
+        base_delay: float,
+        max_delay: float,
+    ):
+        self.deadlines = deadlines
+        self.budgets = budgets
+        self.attempts = max(attempts, 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+        self.gave_up = 0
+        self.deadline_exceeded = 0
+        self._random = random.Random()
+
+    def deadline(self, kind: str) -> Deadline:
+        return Deadline(self.deadlines[kind])
+
+    def budget(self, kind: str) -> int:
+        """Максимум токенов ответа для типа промпта; 0 — без ограничения."""
+        return self.budgets.get(kind, 0)
+
+    def backoff(self, attempt: int, error: LLMError) -> float:
+        """Пауза перед повтором attempt (с 1): полный джиттер, не меньше Retry-After."""
+        delay = self._random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        if error.retry_after is not None:
+            delay = max(delay, error.retry_after)
+        return delay
+
+    async def run(self, call: Callable[[], Awaitable[T]], deadline: Deadline) -> T:
+        """Вызывает call() с повторами временных отказов в пределах срока."""
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                deadline.check()
+                return await call()
+            except DeadlineExceeded:
+                self.deadline_exceeded += 1
+                raise
+            except LLMError as e:
+                if deadline.remaining() <= 0:
+                    self.deadline_exceeded += 1
+                    raise DeadlineExceeded(f"срок запроса {deadline.seconds:.0f}с истек: {e}") from e
+                if not e.retryable:
+                    raise
+                delay = self.backoff(attempt, e)
+                if attempt >= self.attempts or delay >= deadline.remaining():
+                    self.gave_up += 1
+                    raise
+                self.retries += 1
+                logger.info(f"LLM attempt {attempt} failed, retry in {delay:.1f}s: {e}")
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        return {"retries": self.retries, "gave_up": self.gave_up, "deadline_exceeded": self.deadline_exceeded}
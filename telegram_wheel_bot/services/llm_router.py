@@ -0,0 +1,186 @@
+"""
+Адаптивный выбор модели.
+
+ModelRouter хранит для каждой пары (провайдер, модель) скользящие средние
+(EWMA) задержки и доли ошибок отдельно по типам запросов и для каждого
+запроса упорядочивает кандидатов: сначала измеренные по возрастанию
+задержки, затем еще не измеренные в порядке конфигурации. Модель, у которой
+доля ошибок превысила max_failure_rate, исключается; фоновая задача раз в
+reprobe_interval секунд проверяет исключенные модели коротким запросом и
+возвращает ответившие. Раз в explore_every запросов первой ставится модель с
+самым старым замером, чтобы оценки не устаревали.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+Discover = Callable[[], list[tuple[str, str]]]
+ModelProbe = Callable[[str, str], Awaitable[bool]]
+
+
+@dataclass
+class KindStats:
+    latency: float | None = None
+    failure_rate: float = 0.0
+    samples: int = 0
+    measured_at: float | None = None
+
+
+@dataclass
+class Candidate:
+    provider: str
+    model: str
+    kinds: dict[str, KindStats] = field(default_factory=dict)
+    dropped_at: float | None = None
+    last_error: str | None = None
+
+    @property
+    def key(self) -> str:
+        return f"{self.provider}/{self.model}"
+
+    def stats(self, kind: str) -> KindStats:
+        return self.kinds.setdefault(kind, KindStats())
+
+
+class ModelRouter:
+    def __init__(
+        self,
+        discover: Discover,
+        probe: ModelProbe,
+        alpha: float,
+        max_failure_rate: float,
+        min_samples: int,
+        reprobe_interval: float,
+        explore_every: int,
+    ):
+        self.discover = discover
+        self.probe = probe
+        self.alpha = alpha
+        self.max_failure_rate = max_failure_rate
+        self.min_samples = min_samples
+        self.reprobe_interval = reprobe_interval
+        self.explore_every = explore_every
+        self._candidates: dict[str, Candidate] = {}
+        self._requests: dict[str, int] = {}
+        self.decisions: deque[dict] = deque(maxlen=20)
+        self._task: asyncio.Task | None = None
+
+    def candidates(self) -> list[Candidate]:
+        """Кандидаты в порядке конфигурации; список обновляется по discover()."""
+        listed = self.discover()
+        keys = [f"{provider}/{model}" for provider, model in listed]
+        for (provider, model), key in zip(listed, keys):
+            if key not in self._candidates:
+                self._candidates[key] = Candidate(provider, model)
+        for key in set(self._candidates) - set(keys):
+            del self._candidates[key]
+        return [self._candidates[key] for key in keys]
+
+    def rank(self, kind: str) -> list[Candidate]:
+        """Порядок, в котором стоит пробовать модели для запроса типа kind."""
+        candidates = self.candidates()
+        active = [c for c in candidates if c.dropped_at is None] or candidates
+        measured = sorted((c for c in active if c.stats(kind).latency is not None), key=lambda c: c.stats(kind).latency)
+        ranked = measured + [c for c in active if c.stats(kind).latency is None]
+        self._requests[kind] = self._requests.get(kind, 0) + 1
+        explore = self.explore_every and len(ranked) > 1 and self._requests[kind] % self.explore_every == 0
+        if explore:
+            stalest = min(ranked, key=lambda c: c.stats(kind).measured_at or 0.0)
+            ranked.remove(stalest)
+            ranked.insert(0, stalest)
+        self.decisions.append(
+            {"at": time.time(), "kind": kind, "order": [c.key for c in ranked], "explore": bool(explore)}
+        )
+        return ranked
+
+    def record(self, candidate: Candidate, kind: str, ok: bool, seconds: float, error: str | None = None) -> None:
+        stats = candidate.stats(kind)
+        failed = 0.0 if ok else 1.0
+        stats.failure_rate = failed if not stats.samples else stats.failure_rate + self.alpha * (failed - stats.failure_rate)
+        stats.samples += 1
+        if ok:
+            stats.latency = seconds if stats.latency is None else stats.latency + self.alpha * (seconds - stats.latency)
+            stats.measured_at = time.monotonic()
+            return
+        candidate.last_error = error
+        if (
+            candidate.dropped_at is None
+            and stats.samples >= self.min_samples
+            and stats.failure_rate > self.max_failure_rate
+        ):
+            candidate.dropped_at = time.monotonic()
+            logger.warning(f"LLM model {candidate.key} dropped for {kind}: failure rate {stats.failure_rate:.2f}")
+
+    def restore(self, candidate: Candidate) -> None:
+        candidate.dropped_at = None
+        for stats in candidate.kinds.values():
+            stats.failure_rate = 0.0
+        logger.info(f"LLM model {candidate.key} restored")
+
+    async def reprobe(self) -> None:
+        """Проверяет исключенные модели, у которых истек reprobe_interval."""
+        now = time.monotonic()
+        for candidate in self.candidates():
+            if candidate.dropped_at is None or now - candidate.dropped_at < self.reprobe_interval:
+                continue
+            try:
+                ok = await self.probe(candidate.provider, candidate.model)
+            except Exception as e:
+                ok = False
+                candidate.last_error = f"{type(e).__name__}: {e}"
+            if ok:
+                self.restore(candidate)
+            else:
+                candidate.dropped_at = time.monotonic()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.reprobe_interval)
+            try:
+                await self.reprobe()
+            except Exception as e:
+                logger.error(f"LLM model reprobe failed: {e}", exc_info=True)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="llm-router")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> dict:
+        """Оценки моделей и последние решения для отладки."""
+        now = time.monotonic()
+
+        def rounded(value: float | None) -> float | None:
+            return round(value, 3) if value is not None else None
+
+        return {
+            "candidates": {
+                c.key: {
+                    "dropped_for_s": rounded(now - c.dropped_at) if c.dropped_at is not None else None,
+                    "last_error": c.last_error,
+                    "kinds": {
+                        kind: {
+                            "latency": rounded(s.latency),
+                            "failure_rate": rounded(s.failure_rate),
+                            "samples": s.samples,
+                        }
+                        for kind, s in c.kinds.items()
+                    },
+                }
+                for c in self.candidates()
+            },
+            "decisions": list(self.decisions),
+        }
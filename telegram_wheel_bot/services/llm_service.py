@@ -1,316 +1,759 @@
+import asyncio
+import hashlib
 import httpx
-import re
+import importlib.util
+import logging
 import json
+import time
+from typing import AsyncIterator, Awaitable, Callable
 from telegram_wheel_bot.config import (
+    LLM_HTTP_MAX_CONNECTIONS,
+    LLM_HTTP_MAX_KEEPALIVE,
+    LLM_HTTP_KEEPALIVE_EXPIRY,
+    LLM_HTTP_CONNECT_TIMEOUT,
+    LLM_HTTP_TIMEOUT,
+    LLM_HTTP2,
+    LLM_HEALTH_INTERVAL,
+    LLM_HEALTH_TIMEOUT,
+    LLM_BREAKER_FAILURES,
+    LLM_BREAKER_RESET,
+    LLM_STREAMING,
+    LLM_MAX_CONCURRENCY_OLLAMA,
+    LLM_MAX_CONCURRENCY_OPENAI,
+    LLM_MAX_QUEUE,
+    LLM_QUEUE_TIMEOUT,
+    LLM_HEDGING,
+    LLM_HEDGE_PERCENTILE,
+    LLM_HEDGE_MIN_SAMPLES,
+    LLM_HEDGE_DEFAULT_DELAY,
+    LLM_HEDGE_MIN_DELAY,
+    LLM_ROUTER_ALPHA,
+    LLM_ROUTER_MAX_FAILURE_RATE,
+    LLM_ROUTER_MIN_SAMPLES,
+    LLM_ROUTER_REPROBE_INTERVAL,
+    LLM_ROUTER_PROBE_TIMEOUT,
+    LLM_ROUTER_MAX_FREE_MODELS,
+    LLM_ROUTER_EXPLORE_EVERY,
+    LLM_DEADLINE_ANALYSIS,
+    LLM_DEADLINE_COMPARISON,
+    LLM_RETRY_ATTEMPTS,
+    LLM_RETRY_BASE_DELAY,
+    LLM_RETRY_MAX_DELAY,
+    LLM_MAX_TOKENS_ANALYSIS,
+    LLM_MAX_TOKENS_COMPARISON,
     OLLAMA_URL,
     OLLAMA_MODEL,
-    PROMPTS_DIR,
     OPENAI_BASE_URL,
     OPENAI_API_KEY,
     OPENAI_MODEL,
     LLM_DEFAULT_PROVIDER,
 )
+from telegram_wheel_bot.services.llm_health import HealthMonitor
+from telegram_wheel_bot.services.llm_hedge import Hedger
+from telegram_wheel_bot.services.llm_router import Candidate, ModelRouter
+from telegram_wheel_bot.services.llm_limiter import ProviderLimiter, ProviderOverloaded, Coalescer
+from telegram_wheel_bot.services.llm_policy import (
+    Deadline,
+    DeadlineExceeded,
+    LLMError,
+    LLMUnavailable,
+    ProviderError,
+    RequestPolicy,
+    ResponseError,
+    http_error,
+    transport_error,
+)
+from telegram_wheel_bot.services.analysis_cache import analysis_cache
+from telegram_wheel_bot.services.prompts import prompts
+
+logger = logging.getLogger(__name__)
+
+_http_client: httpx.AsyncClient | None = None
+
+
+def http2_available() -> bool:
+    return LLM_HTTP2 and importlib.util.find_spec("h2") is not None
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Создает клиент с пулом соединений для всех запросов к LLM."""
+    return httpx.AsyncClient(
+        http2=http2_available(),
+        limits=httpx.Limits(
+            max_connections=LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(LLM_HTTP_TIMEOUT, connect=LLM_HTTP_CONNECT_TIMEOUT),
+    )
+
+
+async def start_http_client() -> httpx.AsyncClient:
+    """Открывает общий клиент (post_init приложения)."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = create_http_client()
+        logger.info(f"LLM HTTP client started (http2={http2_available()})")
+    return _http_client
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Возвращает общий клиент; создает его при первом обращении вне бота (скрипты)."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = create_http_client()
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Закрывает общий клиент и его соединения (post_shutdown приложения)."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
 
 
 def format_scores(scores: dict[str, int]) -> str:
     return "\n".join([f"{k}: {v}/10" for k, v in scores.items()])
 
 
-def clean_text(text: str) -> str:
-    """Очищает текст от markdown code blocks и лишних символов."""
-    # Удаляем markdown code blocks в начале (```html, ```markdown, ``` и т.д.)
-    text = re.sub(r"^```\w*\s*\n?", "", text, flags=re.MULTILINE)
-    # Удаляем закрывающие ``` в конце
-    text = re.sub(r"\n?```\s*$", "", text, flags=re.MULTILINE)
-    # Удаляем если остались в начале/конце после strip
-    text = text.strip()
-    # Дополнительная проверка и очистка
-    while text.startswith("```"):
-        # Удаляем открывающий блок с любым языком
-        text = re.sub(r"^```\w*\s*\n?", "", text)
-        text = text.strip()
-    while text.endswith("```"):
-        # Удаляем закрывающий блок
-        text = re.sub(r"\n?```\s*$", "", text)
-        text = text.strip()
-    return text.strip()
-
-
-def markdown_to_html(text: str) -> str:
-    """Конвертирует markdown в HTML для Telegram."""
-    # Сначала очищаем от code blocks
-    text = clean_text(text)
-    # Заменяем заголовки ## на жирный текст
-    text = re.sub(r"^##\s+(.+)$", r"<b>\1</b>", text, flags=re.MULTILINE)
-    # Заменяем **текст** на <b>текст</b>
-    text = re.sub(r"\*\*(.+?)\*\*", r"<b>\1</b>", text)
-    # Заменяем маркеры списка - на •
-    text = re.sub(r"^-\s+", "• ", text, flags=re.MULTILINE)
-    return text
+def analysis_prompt(scores: dict[str, int]) -> str:
+    return prompts.render("wheel_analysis", wheel_scores_formatted=format_scores(scores))
 
 
-async def analyze_wheel_with_ollama(scores: dict[str, int]) -> str:
-    formatted_scores = format_scores(scores)
-    try:
-        with open(f"{PROMPTS_DIR}/wheel_analysis.txt", "r", encoding="utf-8") as f:
-            prompt_template = f.read()
-        prompt = prompt_template.format(wheel_scores_formatted=formatted_scores)
-        async with httpx.AsyncClient(timeout=httpx.Timeout(120.0)) as client:
-            response = await client.post(
-                f"{OLLAMA_URL}/api/generate",
-                json={"model": OLLAMA_MODEL, "prompt": prompt, "stream": False},
-            )
+def comparison_prompt(scores_1: dict[str, int], scores_2: dict[str, int], date_1: str, date_2: str) -> str:
+    return prompts.render(
+        "comparison",
+        date_1=date_1,
+        date_2=date_2,
+        wheel_scores_1_formatted=format_scores(scores_1),
+        wheel_scores_2_formatted=format_scores(scores_2),
+    )
+
+
+limiters = {
+    "ollama": ProviderLimiter("ollama", LLM_MAX_CONCURRENCY_OLLAMA, LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUT),
+    "openai": ProviderLimiter("openai", LLM_MAX_CONCURRENCY_OPENAI, LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUT),
+}
+coalescer = Coalescer()
+policy = RequestPolicy(
+    {"analysis": LLM_DEADLINE_ANALYSIS, "comparison": LLM_DEADLINE_COMPARISON},
+    {"analysis": LLM_MAX_TOKENS_ANALYSIS, "comparison": LLM_MAX_TOKENS_COMPARISON},
+    LLM_RETRY_ATTEMPTS,
+    LLM_RETRY_BASE_DELAY,
+    LLM_RETRY_MAX_DELAY,
+)
+
+
+def request_key(provider: str, payload: dict) -> str:
+    raw = json.dumps([provider, payload], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+async def generate(provider: str, url: str, payload: dict, deadline: Deadline, headers: dict | None = None) -> dict:
+    """POST к провайдеру через его ограничитель, с повторами в пределах срока; JSON ответа.
+
+    Одинаковые одновременные запросы объединяются. Слот ограничителя
+    занят только на время попытки, пауза перед повтором — вне слота.
+    """
+    async def attempt() -> dict:
+        async with limiters[provider].slot():
+            try:
+                response = await get_http_client().post(
+                    url,
+                    json=payload,
+                    headers=headers,
+                    timeout=deadline.timeout(LLM_HTTP_TIMEOUT, LLM_HTTP_CONNECT_TIMEOUT),
+                )
+                await response.aread()
+            except httpx.HTTPError as e:
+                raise transport_error(provider, e) from e
         if response.status_code != 200:
-            return f"Ошибка анализа: HTTP {response.status_code}: {response.text}"
+            raise http_error(provider, response)
         try:
             data = response.json()
-        except Exception:
-            return response.text
-        return data.get("response", "Ошибка анализа")
-    except Exception as e:
-        return f"Ошибка анализа: {type(e).__name__}: {e}"
+        except ValueError as e:
+            raise ResponseError(f"{provider}: ответ не JSON: {response.text[:200]}") from e
+        if not isinstance(data, dict):
+            raise ResponseError(f"{provider}: неожиданный ответ: {response.text[:200]}")
+        return data
 
+    return await coalescer.run(request_key(provider, payload), lambda: policy.run(attempt, deadline))
 
-async def compare_wheels_with_ollama(
-    scores_1: dict[str, int], scores_2: dict[str, int], date_1: str, date_2: str
+
+def answer_text(provider: str, text) -> str:
+    if not isinstance(text, str) or not text.strip():
+        raise ResponseError(f"{provider}: пустой ответ")
+    return text
+
+
+def ollama_payload(prompt: str, kind: str, stream: bool, options: dict | None = None) -> dict:
+    payload = {"model": OLLAMA_MODEL, "prompt": prompt, "stream": stream}
+    options = dict(options or {})
+    if policy.budget(kind):
+        options["num_predict"] = policy.budget(kind)
+    if options:
+        payload["options"] = options
+    return payload
+
+
+def openai_payload(prompt: str, kind: str, stream: bool, model: str | None = None) -> dict:
+    payload = {
+        "model": model or OPENAI_MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": 0.7,
+    }
+    if policy.budget(kind):
+        payload["max_tokens"] = policy.budget(kind)
+    if stream:
+        payload["stream"] = True
+    return payload
+
+
+async def ollama_generate(
+    prompt: str, kind: str, deadline: Deadline | None = None, options: dict | None = None
 ) -> str:
-    f1 = format_scores(scores_1)
-    f2 = format_scores(scores_2)
-    try:
-        with open(f"{PROMPTS_DIR}/comparison.txt", "r", encoding="utf-8") as f:
-            prompt_template = f.read()
-        prompt = prompt_template.format(
-            date_1=date_1,
-            date_2=date_2,
-            wheel_scores_1_formatted=f1,
-            wheel_scores_2_formatted=f2,
-        )
-        async with httpx.AsyncClient(timeout=httpx.Timeout(120.0)) as client:
-            response = await client.post(
-                f"{OLLAMA_URL}/api/generate",
-                json={
-                    "model": OLLAMA_MODEL,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {"temperature": 0.7, "top_p": 0.9},
-                },
-            )
-        if response.status_code != 200:
-            return f"Ошибка анализа: HTTP {response.status_code}: {response.text}"
-        try:
-            data = response.json()
-        except Exception:
-            return response.text
-        return data.get("response", "Ошибка анализа")
-    except Exception as e:
-        return f"Ошибка анализа: {type(e).__name__}: {e}"
+    data = await generate(
+        "ollama", f"{OLLAMA_URL}/api/generate", ollama_payload(prompt, kind, False, options), deadline or policy.deadline(kind)
+    )
+    if data.get("done_reason") == "length":
+        logger.warning(f"Ollama answer for {kind} cut at {policy.budget(kind)} tokens")
+    return answer_text("ollama", data.get("response"))
 
 
-async def analyze_wheel_with_openai(scores: dict[str, int], model: str | None = None) -> str:
-    formatted_scores = format_scores(scores)
-    try:
-        with open(f"{PROMPTS_DIR}/wheel_analysis.txt", "r", encoding="utf-8") as f:
-            prompt_template = f.read()
-        prompt = prompt_template.format(wheel_scores_formatted=formatted_scores)
-
-        async with httpx.AsyncClient(timeout=httpx.Timeout(120.0)) as client:
-            response = await client.post(
-                f"{OPENAI_BASE_URL}/chat/completions",
-                headers={"Authorization": f"Bearer {OPENAI_API_KEY}"},
-                json={
-                    "model": model or OPENAI_MODEL,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "temperature": 0.7,
-                },
-            )
+async def openai_generate(prompt: str, kind: str, deadline: Deadline | None = None, model: str | None = None) -> str:
+    data = await generate(
+        "openai",
+        f"{OPENAI_BASE_URL}/chat/completions",
+        openai_payload(prompt, kind, False, model),
+        deadline or policy.deadline(kind),
+        headers={"Authorization": f"Bearer {OPENAI_API_KEY}"},
+    )
+    choices = data.get("choices")
+    choice = choices[0] if isinstance(choices, list) and choices and isinstance(choices[0], dict) else {}
+    if choice.get("finish_reason") == "length":
+        logger.warning(f"OpenAI answer for {kind} cut at {policy.budget(kind)} tokens")
+    message = choice.get("message")
+    return answer_text("openai", message.get("content") if isinstance(message, dict) else None)
 
-        if response.status_code != 200:
-            return f"Ошибка анализа: HTTP {response.status_code}: {response.text}"
 
-        try:
-            data = response.json()
-            return (
-                data.get("choices", [{}])[0]
-                .get("message", {})
-                .get("content", "Ошибка анализа")
-            )
-        except Exception:
-            return response.text
-    except Exception as e:
-        return f"Ошибка анализа: {type(e).__name__}: {e}"
+async def analyze_wheel_with_ollama(scores: dict[str, int], deadline: Deadline | None = None) -> str:
+    return await ollama_generate(analysis_prompt(scores), "analysis", deadline)
+
+
+async def compare_wheels_with_ollama(
+    scores_1: dict[str, int], scores_2: dict[str, int], date_1: str, date_2: str, deadline: Deadline | None = None
+) -> str:
+    return await ollama_generate(
+        comparison_prompt(scores_1, scores_2, date_1, date_2),
+        "comparison",
+        deadline,
+        {"temperature": 0.7, "top_p": 0.9},
+    )
+
+
+async def analyze_wheel_with_openai(
+    scores: dict[str, int], model: str | None = None, deadline: Deadline | None = None
+) -> str:
+    return await openai_generate(analysis_prompt(scores), "analysis", deadline, model)
 
 
 async def compare_wheels_with_openai(
-    scores_1: dict[str, int], scores_2: dict[str, int], date_1: str, date_2: str
+    scores_1: dict[str, int],
+    scores_2: dict[str, int],
+    date_1: str,
+    date_2: str,
+    model: str | None = None,
+    deadline: Deadline | None = None,
 ) -> str:
-    f1 = format_scores(scores_1)
-    f2 = format_scores(scores_2)
+    return await openai_generate(comparison_prompt(scores_1, scores_2, date_1, date_2), "comparison", deadline, model)
+
+
+# Provider selection functions
+def model_names(data) -> list[str]:
+    """Имена моделей из ответа /models (OpenAI) или /api/tags (Ollama)."""
+    names = []
+    if isinstance(data, dict):
+        items = data.get("data") if isinstance(data.get("data"), list) else data.get("models")
+        for m in items if isinstance(items, list) else []:
+            n = m.get("id") or m.get("name") if isinstance(m, dict) else None
+            if isinstance(n, str):
+                names.append(n)
+    return names
+
+
+async def probe_openai() -> list[str]:
+    response = await get_http_client().get(
+        f"{OPENAI_BASE_URL}/models",
+        headers={"Authorization": f"Bearer {OPENAI_API_KEY}"},
+        timeout=LLM_HEALTH_TIMEOUT,
+    )
+    response.raise_for_status()
     try:
-        with open(f"{PROMPTS_DIR}/comparison.txt", "r", encoding="utf-8") as f:
-            prompt_template = f.read()
-        prompt = prompt_template.format(
-            date_1=date_1,
-            date_2=date_2,
-            wheel_scores_1_formatted=f1,
-            wheel_scores_2_formatted=f2,
-        )
+        return model_names(response.json())
+    except Exception:
+        return []
 
-        async with httpx.AsyncClient(timeout=httpx.Timeout(120.0)) as client:
-            response = await client.post(
-                f"{OPENAI_BASE_URL}/chat/completions",
-                headers={"Authorization": f"Bearer {OPENAI_API_KEY}"},
-                json={
-                    "model": OPENAI_MODEL,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "temperature": 0.7,
-                },
-            )
 
-        if response.status_code != 200:
-            return f"Ошибка анализа: HTTP {response.status_code}: {response.text}"
+async def probe_ollama() -> list[str]:
+    response = await get_http_client().get(f"{OLLAMA_URL}/api/tags", timeout=LLM_HEALTH_TIMEOUT)
+    response.raise_for_status()
+    try:
+        return model_names(response.json())
+    except Exception:
+        return []
 
-        try:
-            data = response.json()
-            return (
-                data.get("choices", [{}])[0]
-                .get("message", {})
-                .get("content", "Ошибка анализа")
-            )
-        except Exception:
-            return response.text
-    except Exception as e:
-        return f"Ошибка анализа: {type(e).__name__}: {e}"
 
+# Проверяются только провайдеры текущего режима: Ollama всегда, OpenAI — в режиме openai
+health = HealthMonitor(LLM_HEALTH_INTERVAL, LLM_BREAKER_FAILURES, LLM_BREAKER_RESET)
+health.add("ollama", probe_ollama)
+if LLM_DEFAULT_PROVIDER == "openai":
+    health.add("openai", probe_openai)
 
-# Provider selection functions
-async def analyze_wheel(scores: dict[str, int]) -> str:
+
+async def probe_model(provider: str, model: str) -> bool:
+    """Короткая генерация (один токен): отвечает ли модель вообще."""
+    if provider == "openai":
+        response = await get_http_client().post(
+            f"{OPENAI_BASE_URL}/chat/completions",
+            headers={"Authorization": f"Bearer {OPENAI_API_KEY}"},
+            json={"model": model, "messages": [{"role": "user", "content": "ping"}], "max_tokens": 1},
+            timeout=LLM_ROUTER_PROBE_TIMEOUT,
+        )
+    else:
+        response = await get_http_client().post(
+            f"{OLLAMA_URL}/api/generate",
+            json={"model": model, "prompt": "ping", "stream": False, "options": {"num_predict": 1}},
+            timeout=LLM_ROUTER_PROBE_TIMEOUT,
+        )
+    return response.status_code == 200
+
+
+def discover_models() -> list[tuple[str, str]]:
+    """Кандидаты в порядке конфигурации: OPENAI_MODEL, бесплатные модели OpenAI, OLLAMA_MODEL.
+
+    Бесплатные модели берутся из последнего списка HealthMonitor, без сетевых вызовов.
+    """
+    models = []
     if LLM_DEFAULT_PROVIDER == "openai":
-        try:
-            async with httpx.AsyncClient(timeout=httpx.Timeout(10.0)) as client:
-                models_resp = await client.get(
-                    f"{OPENAI_BASE_URL}/models",
-                    headers={"Authorization": f"Bearer {OPENAI_API_KEY}"},
-                )
-            openai_accessible = models_resp.status_code == 200
-        except Exception:
-            openai_accessible = False
-
-        if openai_accessible:
-            r = await analyze_wheel_with_openai(scores)
-            if r.startswith("Ошибка анализа:"):
-                try:
-                    data = models_resp.json()
-                except Exception:
-                    data = {}
-                names = []
-                if isinstance(data, dict):
-                    if isinstance(data.get("data"), list):
-                        for m in data["data"]:
-                            n = m.get("id") or m.get("name")
-                            if isinstance(n, str):
-                                names.append(n)
-                    elif isinstance(data.get("models"), list):
-                        for m in data["models"]:
-                            n = m.get("id") or m.get("name")
-                            if isinstance(n, str):
-                                names.append(n)
-                free_model = next((n for n in names if n.endswith(":free")), None)
-                if free_model:
-                    return await analyze_wheel_with_openai(scores, free_model)
-                return r
-            return r
-        try:
-            async with httpx.AsyncClient(timeout=httpx.Timeout(5.0)) as client:
-                ollama_resp = await client.get(f"{OLLAMA_URL}/api/tags")
-            ollama_accessible = ollama_resp.status_code == 200
-        except Exception:
-            ollama_accessible = False
-        if ollama_accessible:
-            return await analyze_wheel_with_ollama(scores)
-        return "Ошибка анализа: LLM сервис недоступен"
+        models.append(("openai", OPENAI_MODEL))
+        free = [n for n in health.status("openai").models if n.endswith(":free") and n != OPENAI_MODEL]
+        models.extend(("openai", n) for n in free[:LLM_ROUTER_MAX_FREE_MODELS])
+    models.append(("ollama", OLLAMA_MODEL))
+    return models
+
+
+router = ModelRouter(
+    discover_models,
+    probe_model,
+    LLM_ROUTER_ALPHA,
+    LLM_ROUTER_MAX_FAILURE_RATE,
+    LLM_ROUTER_MIN_SAMPLES,
+    LLM_ROUTER_REPROBE_INTERVAL,
+    LLM_ROUTER_EXPLORE_EVERY,
+)
+hedger = Hedger(LLM_HEDGE_PERCENTILE, LLM_HEDGE_MIN_SAMPLES, LLM_HEDGE_DEFAULT_DELAY, LLM_HEDGE_MIN_DELAY)
+
+
+def split_for_hedging(ranked: list[Candidate]) -> tuple[list[Candidate], list[Candidate]]:
+    """Основная цепочка — модели первого по рангу провайдера, запасная — остальные.
+
+    Запасная пуста, если хеджирование выключено: тогда все модели пробуются по очереди.
+    """
+    if not LLM_HEDGING or not ranked:
+        return ranked, []
+    primary = [c for c in ranked if c.provider == ranked[0].provider]
+    return primary, [c for c in ranked if c.provider != ranked[0].provider]
+
+
+async def call_candidate(candidate: Candidate, kind: str, call: Callable[[], Awaitable[str]]) -> str | None:
+    """Вызывает модель, если цепь ее провайдера пропускает запрос; None — модель пропущена.
+
+    Отказ ограничителя (ProviderOverloaded) и отмена пробрасываются и не
+    считаются ни ошибкой, ни успехом провайдера: размыкатель цепи только
+    освобождает пробный запрос. Время успешного ответа идет в
+    оценку модели (router) и гистограмму провайдера; у отмененного
+    (проигравшего хедж) запроса — время до отмены, иначе медленные ответы
+    выпадали бы из распределения.
+    """
+    name = candidate.provider
+    if not health.status(name).available():
+        return None
+    started = time.perf_counter()
+    try:
+        result = await call()
+    except asyncio.CancelledError:
+        health.release(name)
+        hedger.record(name, "total", time.perf_counter() - started)
+        raise
+    except ProviderOverloaded:
+        health.release(name)
+        raise
+    except LLMError as e:
+        health.record(name, False)
+        router.record(candidate, kind, False, time.perf_counter() - started, str(e)[:200])
+        raise
+    elapsed = time.perf_counter() - started
+    health.record(name, True)
+    router.record(candidate, kind, True, elapsed)
+    hedger.record(name, "total", elapsed)
+    return result
+
+
+def route_error(errors: list[LLMError], deadline: Deadline) -> LLMError:
+    """Итоговая ошибка запроса, если ни одна модель не ответила."""
+    if deadline.remaining() <= 0 or any(isinstance(e, DeadlineExceeded) for e in errors):
+        return DeadlineExceeded(f"срок запроса {deadline.seconds:.0f}с истек")
+    if errors and all(isinstance(e, ProviderOverloaded) for e in errors):
+        return ProviderOverloaded(f"LLM сервис перегружен: {errors[-1]}")
+    return LLMUnavailable(f"LLM сервис недоступен: {errors[-1]}" if errors else "LLM сервис недоступен")
+
+
+async def route(kind: str, openai_call, ollama_call) -> tuple[Candidate, str]:
+    """Выбор модели без сетевых проверок: по оценкам router и состоянию из HealthMonitor.
+
+    Модели пробуются в порядке router.rank(kind) до первого успешного ответа
+    в пределах срока запроса (policy); модель с разомкнутой цепью провайдера
+    пропускается сразу. С LLM_HEDGING модели другого провайдера
+    запрашиваются параллельно, если первый по рангу провайдер не ответил за
+    свой процентиль задержки или ответил ошибкой; используется первый
+    успешный ответ. Возвращает модель, которая ответила, и ответ; если
+    ответа нет — LLMError.
+    """
+    deadline = policy.deadline(kind)
+    errors: list[LLMError] = []
+
+    async def chain(candidates: list[Candidate]) -> tuple[Candidate, str] | None:
+        for candidate in candidates:
+            if deadline.remaining() <= 0:
+                break
+            if candidate.provider == "openai":
+                call = lambda model=candidate.model: openai_call(model, deadline)
+            else:
+                call = lambda: ollama_call(deadline)
+            try:
+                result = await call_candidate(candidate, kind, call)
+            except LLMError as e:
+                errors.append(e)
+                continue
+            if result is not None:
+                return candidate, result
+        return None
+
+    primary, secondary = split_for_hedging(router.rank(kind))
+    if secondary:
+        r = await hedger.run(
+            lambda: chain(primary),
+            lambda: chain(secondary),
+            hedger.delay(primary[0].provider, "total"),
+            lambda result: result is not None,
+        )
     else:
-        return await analyze_wheel_with_ollama(scores)
+        r = await chain(primary)
+    if r is None:
+        raise route_error(errors, deadline) from (errors[-1] if errors else None)
+    return r
+
+
+def cache_models() -> list[Candidate]:
+    """Модели, чьи сохраненные ответы подходят запросу, в порядке конфигурации (поиск в кэше)."""
+    return router.candidates()
+
+
+async def analyze_wheel(scores: dict[str, int]) -> str:
+    return await analysis_cache.cached(
+        "analysis",
+        {"scores": list(scores.items())},
+        "wheel_analysis",
+        cache_models(),
+        lambda: route(
+            "analysis",
+            lambda model, deadline: analyze_wheel_with_openai(scores, model, deadline),
+            lambda deadline: analyze_wheel_with_ollama(scores, deadline),
+        ),
+    )
 
 
 async def compare_wheels(
     scores_1: dict[str, int], scores_2: dict[str, int], date_1: str, date_2: str
 ) -> str:
-    if LLM_DEFAULT_PROVIDER == "openai":
-        try:
-            async with httpx.AsyncClient(timeout=httpx.Timeout(10.0)) as client:
-                models_resp = await client.get(
-                    f"{OPENAI_BASE_URL}/models",
-                    headers={"Authorization": f"Bearer {OPENAI_API_KEY}"},
-                )
-            openai_accessible = models_resp.status_code == 200
-        except Exception:
-            openai_accessible = False
-
-        if openai_accessible:
-            r = await compare_wheels_with_openai(scores_1, scores_2, date_1, date_2)
-            if r.startswith("Ошибка анализа:"):
-                try:
-                    data = models_resp.json()
-                except Exception:
-                    data = {}
-                names = []
-                if isinstance(data, dict):
-                    if isinstance(data.get("data"), list):
-                        for m in data["data"]:
-                            n = m.get("id") or m.get("name")
-                            if isinstance(n, str):
-                                names.append(n)
-                    elif isinstance(data.get("models"), list):
-                        for m in data["models"]:
-                            n = m.get("id") or m.get("name")
-                            if isinstance(n, str):
-                                names.append(n)
-                free_model = next((n for n in names if n.endswith(":free")), None)
-                if free_model:
-                    try:
-                        formatted_f1 = format_scores(scores_1)
-                        formatted_f2 = format_scores(scores_2)
-                        with open(f"{PROMPTS_DIR}/comparison.txt", "r", encoding="utf-8") as f:
-                            prompt_template = f.read()
-                        prompt = prompt_template.format(
-                            date_1=date_1,
-                            date_2=date_2,
-                            wheel_scores_1_formatted=formatted_f1,
-                            wheel_scores_2_formatted=formatted_f2,
-                        )
-                        async with httpx.AsyncClient(timeout=httpx.Timeout(120.0)) as client:
-                            resp2 = await client.post(
-                                f"{OPENAI_BASE_URL}/chat/completions",
-                                headers={"Authorization": f"Bearer {OPENAI_API_KEY}"},
-                                json={
-                                    "model": free_model,
-                                    "messages": [{"role": "user", "content": prompt}],
-                                    "temperature": 0.7,
-                                },
-                            )
-                        if resp2.status_code == 200:
-                            try:
-                                j = resp2.json()
-                                return (
-                                    j.get("choices", [{}])[0]
-                                    .get("message", {})
-                                    .get("content", "Ошибка анализа")
-                                )
-                            except Exception:
-                                return resp2.text
-                        return f"Ошибка анализа: HTTP {resp2.status_code}: {resp2.text}"
-                    except Exception as e:
-                        return f"Ошибка анализа: {type(e).__name__}: {e}"
-                return r
-            return r
+    return await analysis_cache.cached(
+        "comparison",
+        {"scores_1": list(scores_1.items()), "scores_2": list(scores_2.items()), "date_1": date_1, "date_2": date_2},
+        "comparison",
+        cache_models(),
+        lambda: route(
+            "comparison",
+            lambda model, deadline: compare_wheels_with_openai(scores_1, scores_2, date_1, date_2, model, deadline),
+            lambda deadline: compare_wheels_with_ollama(scores_1, scores_2, date_1, date_2, deadline),
+        ),
+    )
+
+
+# Streaming
+def stream_json(provider: str, line: str) -> dict:
+    try:
+        data = json.loads(line)
+    except ValueError as e:
+        raise ResponseError(f"{provider}: строка потока не JSON: {line[:200]}") from e
+    if not isinstance(data, dict):
+        raise ResponseError(f"{provider}: неожиданная строка потока: {line[:200]}")
+    return data
+
+
+def stream_choice(provider: str, line: str) -> dict:
+    """Первый элемент choices строки потока OpenAI; {} для строк без choices (например, usage)."""
+    choices = stream_json(provider, line).get("choices") or [{}]
+    if (
+        not isinstance(choices, list)
+        or not isinstance(choices[0], dict)
+        or not isinstance(choices[0].get("delta") or {}, dict)
+    ):
+        raise ResponseError(f"{provider}: неожиданная строка потока: {line[:200]}")
+    return choices[0]
+
+
+async def stream_ollama(
+    prompt: str, kind: str, deadline: Deadline, options: dict | None = None
+) -> AsyncIterator[str]:
+    """Фрагменты ответа Ollama из потока NDJSON (stream=True)."""
+    try:
+        async with limiters["ollama"].slot(), get_http_client().stream(
+            "POST",
+            f"{OLLAMA_URL}/api/generate",
+            json=ollama_payload(prompt, kind, True, options),
+            timeout=deadline.timeout(LLM_HTTP_TIMEOUT, LLM_HTTP_CONNECT_TIMEOUT),
+        ) as response:
+            if response.status_code != 200:
+                await response.aread()
+                raise http_error("ollama", response)
+            async for line in response.aiter_lines():
+                deadline.check()
+                if not line.strip():
+                    continue
+                data = stream_json("ollama", line)
+                if data.get("error"):
+                    raise ProviderError(f"ollama: {data['error']}")
+                if data.get("response"):
+                    yield data["response"]
+                if data.get("done"):
+                    if data.get("done_reason") == "length":
+                        logger.warning(f"Ollama answer for {kind} cut at {policy.budget(kind)} tokens")
+                    return
+    except httpx.HTTPError as e:
+        raise transport_error("ollama", e) from e
+
+
+async def stream_openai(prompt: str, kind: str, deadline: Deadline, model: str | None = None) -> AsyncIterator[str]:
+    """Фрагменты ответа OpenAI-совместимого API из потока SSE (stream=True)."""
+    try:
+        async with limiters["openai"].slot(), get_http_client().stream(
+            "POST",
+            f"{OPENAI_BASE_URL}/chat/completions",
+            headers={"Authorization": f"Bearer {OPENAI_API_KEY}"},
+            json=openai_payload(prompt, kind, True, model),
+            timeout=deadline.timeout(LLM_HTTP_TIMEOUT, LLM_HTTP_CONNECT_TIMEOUT),
+        ) as response:
+            if response.status_code != 200:
+                await response.aread()
+                raise http_error("openai", response)
+            async for line in response.aiter_lines():
+                deadline.check()
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    return
+                choice = stream_choice("openai", data)
+                if choice.get("finish_reason") == "length":
+                    logger.warning(f"OpenAI answer for {kind} cut at {policy.budget(kind)} tokens")
+                content = (choice.get("delta") or {}).get("content")
+                if content is not None and not isinstance(content, str):
+                    raise ResponseError(f"openai: неожиданная строка потока: {data[:200]}")
+                if content:
+                    yield content
+    except httpx.HTTPError as e:
+        raise transport_error("openai", e) from e
+
+
+async def open_stream(
+    candidate: Candidate, kind: str, make_stream: Callable[[], AsyncIterator[str]], deadline: Deadline
+) -> tuple[Candidate, AsyncIterator[str], str] | None:
+    """Открывает поток модели и ждет первый фрагмент; None — модель пропущена.
+
+    До первого фрагмента пользователь еще ничего не видел, поэтому
+    временные отказы повторяются по policy. Время до первого фрагмента
+    (ttft) идет в оценку модели и в гистограмму провайдера, по ней
+    считается задержка хеджирования потоков.
+    """
+    name = candidate.provider
+    if not health.status(name).available():
+        return None
+
+    async def first_chunk() -> tuple[AsyncIterator[str], str]:
+        stream = make_stream()
         try:
-            async with httpx.AsyncClient(timeout=httpx.Timeout(5.0)) as client:
-                ollama_resp = await client.get(f"{OLLAMA_URL}/api/tags")
-            ollama_accessible = ollama_resp.status_code == 200
-        except Exception:
-            ollama_accessible = False
-        if ollama_accessible:
-            return await compare_wheels_with_ollama(scores_1, scores_2, date_1, date_2)
-        return "Ошибка анализа: LLM сервис недоступен"
+            return stream, await stream.__anext__()
+        except StopAsyncIteration:
+            raise ResponseError(f"{name}: пустой ответ") from None
+        except BaseException:
+            await stream.aclose()
+            raise
+
+    started = time.perf_counter()
+    try:
+        stream, first = await policy.run(first_chunk, deadline)
+    except asyncio.CancelledError:
+        health.release(name)
+        hedger.record(name, "ttft", time.perf_counter() - started)
+        raise
+    except ProviderOverloaded:
+        health.release(name)
+        raise
+    except LLMError as e:
+        health.record(name, False)
+        router.record(candidate, kind, False, time.perf_counter() - started, str(e)[:200])
+        raise
+    elapsed = time.perf_counter() - started
+    hedger.record(name, "ttft", elapsed)
+    router.record(candidate, kind, True, elapsed)
+    return candidate, stream, first
+
+
+async def stream_route(
+    kind: str, openai_stream, ollama_stream, on_answer: Callable[[Candidate], None] | None = None
+) -> AsyncIterator[str]:
+    """Потоковый аналог route(): тот же порядок моделей, размыкатели цепи и срок.
+
+    Модели ранжируются по времени до первого фрагмента (тип запроса
+    "{kind}.stream"). Если модель упала или перегружена до первого фрагмента,
+    запрос уходит следующей; ошибка посреди ответа пробрасывается вызывающему.
+    Потоки не объединяются (Coalescer), но занимают слот ограничителя на все
+    время ответа. С LLM_HEDGING поток другого провайдера открывается, если
+    первый по рангу не прислал первый фрагмент за свой процентиль;
+    проигравший поток закрывается. Модель выбранного потока передается в
+    on_answer (ключ кэша ответов). Если ни одна модель не ответила — LLMError.
+    """
+    deadline = policy.deadline(kind)
+    kind = f"{kind}.stream"
+    errors: list[LLMError] = []
+
+    async def first_available(candidates: list[Candidate]) -> tuple[Candidate, AsyncIterator[str], str] | None:
+        for candidate in candidates:
+            if deadline.remaining() <= 0:
+                break
+            if candidate.provider == "openai":
+                make_stream = lambda model=candidate.model: openai_stream(model, deadline)
+            else:
+                make_stream = lambda: ollama_stream(deadline)
+            try:
+                opened = await open_stream(candidate, kind, make_stream, deadline)
+            except LLMError as e:
+                errors.append(e)
+                continue
+            if opened is not None:
+                return opened
+        return None
+
+    async def discard(opened: tuple[Candidate, AsyncIterator[str], str]) -> None:
+        # Проигравший хедж поток закрывается без результата
+        health.release(opened[0].provider)
+        await opened[1].aclose()
+
+    primary, secondary = split_for_hedging(router.rank(kind))
+    if secondary:
+        opened = await hedger.run(
+            lambda: first_available(primary),
+            lambda: first_available(secondary),
+            hedger.delay(primary[0].provider, "ttft"),
+            lambda result: result is not None,
+            discard,
+        )
     else:
-        return await compare_wheels_with_ollama(scores_1, scores_2, date_1, date_2)
+        opened = await first_available(primary)
+    if opened is None:
+        raise route_error(errors, deadline) from (errors[-1] if errors else None)
+    candidate, stream, first = opened
+    if on_answer is not None:
+        on_answer(candidate)
+    try:
+        yield first
+        async for chunk in stream:
+            yield chunk
+    except Exception as e:
+        health.record(candidate.provider, False)
+        router.record(candidate, kind, False, 0.0, f"{type(e).__name__}: {e}")
+        raise
+    except BaseException:
+        # Поток закрыт потребителем или отменен: ответ не завершен, но и не ошибка
+        health.release(candidate.provider)
+        raise
+    finally:
+        await stream.aclose()
+    health.record(candidate.provider, True)
+
+
+def stream_analysis(scores: dict[str, int]) -> AsyncIterator[str]:
+    """Потоковый analyze_wheel(); при LLM_STREAMING=0 отдает ответ одним фрагментом."""
+    if not LLM_STREAMING:
+        return single_chunk(analyze_wheel(scores))
+    prompt = analysis_prompt(scores)
+    return analysis_cache.stream_cached(
+        "analysis",
+        {"scores": list(scores.items())},
+        "wheel_analysis",
+        cache_models(),
+        lambda on_answer: stream_route(
+            "analysis",
+            lambda model, deadline: stream_openai(prompt, "analysis", deadline, model),
+            lambda deadline: stream_ollama(prompt, "analysis", deadline),
+            on_answer,
+        ),
+    )
+
+
+def stream_comparison(
+    scores_1: dict[str, int], scores_2: dict[str, int], date_1: str, date_2: str
+) -> AsyncIterator[str]:
+    """Потоковый compare_wheels()."""
+    if not LLM_STREAMING:
+        return single_chunk(compare_wheels(scores_1, scores_2, date_1, date_2))
+    prompt = comparison_prompt(scores_1, scores_2, date_1, date_2)
+    return analysis_cache.stream_cached(
+        "comparison",
+        {"scores_1": list(scores_1.items()), "scores_2": list(scores_2.items()), "date_1": date_1, "date_2": date_2},
+        "comparison",
+        cache_models(),
+        lambda on_answer: stream_route(
+            "comparison",
+            lambda model, deadline: stream_openai(prompt, "comparison", deadline, model),
+            lambda deadline: stream_ollama(prompt, "comparison", deadline, {"temperature": 0.7, "top_p": 0.9}),
+            on_answer,
+        ),
+    )
+
+
+async def single_chunk(result: Awaitable[str]) -> AsyncIterator[str]:
+    yield await result
+
+
+def limiter_stats() -> dict:
+    """Загрузка провайдеров: генерации в работе, в очереди, отклоненные, объединенные."""
+    stats = {name: limiter.stats() for name, limiter in limiters.items()}
+    stats["coalesced"] = coalescer.coalesced
+    return stats
+
+
+def latency_stats() -> dict:
+    """Гистограммы задержек провайдеров и счетчики хеджирования."""
+    return hedger.stats()
+
+
+def policy_stats() -> dict:
+    """Повторы, отказы после всех попыток и истекшие сроки запросов."""
+    return policy.stats()
+
+
+def router_stats() -> dict:
+    """Оценки моделей и последние решения адаптивного выбора."""
+    return router.snapshot()
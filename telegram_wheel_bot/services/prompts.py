@@ -0,0 +1,116 @@
+"""
+Реестр шаблонов промптов.
+
+Все шаблоны из PROMPTS_DIR читаются и проверяются один раз при запуске:
+набор плейсхолдеров в файле должен совпадать с ожидаемым, иначе бот не
+стартует. Дальше текст берется из памяти; раз в PROMPT_RELOAD_INTERVAL секунд
+проверяется mtime файла, и измененный шаблон перечитывается. Если новая
+версия невалидна, остается предыдущая. version — короткий sha256 текста,
+по нему ключуются кэш ответов и метрики.
+"""
+import hashlib
+import logging
+import os
+import string
+import time
+from dataclasses import dataclass
+from telegram_wheel_bot.config import PROMPTS_DIR, PROMPT_RELOAD_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+
+class PromptError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    name: str
+    text: str
+    version: str
+    mtime: float
+
+    def render(self, **values: str) -> str:
+        return self.text.format(**values)
+
+
+def placeholders(text: str) -> set[str]:
+    return {field for _, field, _, _ in string.Formatter().parse(text) if field is not None}
+
+
+class PromptRegistry:
+    def __init__(self, directory: str, specs: dict[str, set[str]], reload_interval: float):
+        self.directory = directory
+        self.specs = specs
+        self.reload_interval = reload_interval
+        self._templates: dict[str, PromptTemplate] = {}
+        self._checked_at: dict[str, float] = {}
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.txt")
+
+    def _read(self, name: str) -> PromptTemplate:
+        path = self.path(name)
+        try:
+            mtime = os.path.getmtime(path)
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except OSError as e:
+            raise PromptError(f"Prompt {name!r}: cannot read {path}: {e}") from e
+        try:
+            found = placeholders(text)
+        except ValueError as e:
+            raise PromptError(f"Prompt {name!r}: malformed template: {e}") from e
+        expected = self.specs[name]
+        if found != expected:
+            missing = ", ".join(sorted(expected - found)) or "-"
+            unknown = ", ".join(sorted(found - expected)) or "-"
+            raise PromptError(f"Prompt {name!r}: missing placeholders [{missing}], unknown [{unknown}]")
+        version = hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+        return PromptTemplate(name, text, version, mtime)
+
+    def load(self) -> None:
+        """Загружает и проверяет все шаблоны; при ошибке бросает PromptError."""
+        templates = {name: self._read(name) for name in self.specs}
+        self._templates = templates
+        now = time.monotonic()
+        self._checked_at = {name: now for name in templates}
+        logger.info("Prompts loaded: " + ", ".join(f"{t.name}@{t.version}" for t in templates.values()))
+
+    def get(self, name: str) -> PromptTemplate:
+        if not self._templates:
+            self.load()
+        template = self._templates[name]
+        now = time.monotonic()
+        if now - self._checked_at.get(name, 0) < self.reload_interval:
+            return template
+        self._checked_at[name] = now
+        try:
+            if os.path.getmtime(self.path(name)) == template.mtime:
+                return template
+            template = self._read(name)
+        except (OSError, PromptError) as e:
+            logger.error(f"Prompt reload failed, keeping version {template.version}: {e}")
+            return template
+        logger.info(f"Prompt {name} reloaded: version {template.version}")
+        self._templates[name] = template
+        return template
+
+    def render(self, name: str, **values: str) -> str:
+        return self.get(name).render(**values)
+
+    def version(self, name: str) -> str:
+        return self.get(name).version
+
+    def versions(self) -> dict[str, str]:
+        return {name: self.version(name) for name in self.specs}
+
+
+prompts = PromptRegistry(
+    PROMPTS_DIR,
+    {
+        "wheel_analysis": {"wheel_scores_formatted"},
+        "comparison": {"date_1", "date_2", "wheel_scores_1_formatted", "wheel_scores_2_formatted"},
+    },
+    PROMPT_RELOAD_INTERVAL,
+)
@@ -0,0 +1,200 @@
+"""
+Отрисовка диаграмм вне цикла событий.
+
+matplotlib рисует колесо сотни миллисекунд и все это время держит GIL,
+поэтому вызов draw_* прямо в хендлере останавливает весь бот, включая опрос
+Telegram. RenderPool выполняет функции visualization в пуле процессов.
+Процессы создаются при старте бота, и в каждом заранее импортирован
+matplotlib и загружены шрифты (пробная отрисовка), так что первый запрос
+пользователя не платит за прогрев.
+
+Одновременно рисуют не больше workers диаграмм, еще до max_queue ждут
+свободный процесс; запрос сверх очереди или не уложившийся в timeout
+отклоняется сразу (RenderError). По таймауту ждать перестает только
+пользователь: процесс дорисовывает диаграмму, и до этого его слот занят,
+иначе медленные отрисовки накапливались бы сверх workers. Аварийно
+завершившийся процесс ломает весь ProcessPoolExecutor, поэтому пул в этом
+случае пересоздается. При workers=0 и до start() диаграммы рисуются по
+одной в отдельном потоке: цикл событий не блокируется, но GIL делится с ботом.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import types
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, TypeVar
+from telegram_wheel_bot.config import RENDER_WORKERS, RENDER_MAX_QUEUE, RENDER_TIMEOUT
+from telegram_wheel_bot.services.llm_hedge import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class RenderError(Exception):
+    """Диаграмма не построена: очередь заполнена, истек таймаут или упал процесс пула."""
+
+
+def _init_worker() -> None:
+    """Прогрев процесса пула: бэкенд Agg, импорт pyplot и кэш шрифтов."""
+    import matplotlib
+
+    matplotlib.use("Agg")
+    from telegram_wheel_bot.services import visualization
+
+    visualization.warm_up()
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _submit(executor: Executor, fn: Callable[..., T], *args) -> asyncio.Future:
+    """run_in_executor, при котором новый процесс пула не импортирует модуль запуска бота.
+
+    spawn передает процессу имя модуля __main__ (python -m app.main), и тот
+    импортируется заново как __mp_main__: весь бот со своими импортами и
+    настройкой логирования. Процессу отрисовки он не нужен — функции
+    передаются по имени своего модуля. Процессы пула запускаются внутри
+    submit в этом же потоке, поэтому на время вызова __main__ подменяется
+    пустым модулем.
+    """
+    main = sys.modules["__main__"]
+    sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        return asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+    finally:
+        sys.modules["__main__"] = main
+
+
+class RenderPool:
+    def __init__(self, workers: int, max_queue: int, timeout: float):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor: ProcessPoolExecutor | None = None
+        # В запасном режиме pyplot не потокобезопасен: рисуем по одной
+        self._semaphore = asyncio.Semaphore(max(workers, 1))
+        self._thread_lock = threading.Lock()
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.failed = 0
+        self.completed = 0
+        self.restarts = 0
+        self.wait = LatencyHistogram()
+        self.render = LatencyHistogram()
+
+    @property
+    def capacity(self) -> int:
+        return max(self.workers, 1)
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        # spawn, а не fork: в процессе бота уже работают потоки aiosqlite и httpx
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+
+    async def start(self) -> None:
+        """Запускает процессы пула и ждет, пока они прогреются."""
+        if self._executor is not None or self.workers <= 0:
+            return
+        started = time.perf_counter()
+        self._executor = self._create_executor()
+        # Каждая отправка без свободного процесса запускает новый: workers пингов поднимают весь пул
+        pids = await asyncio.gather(*(_submit(self._executor, _ping) for _ in range(self.workers)))
+        logger.info(
+            f"Render pool started: {len(set(pids))}/{self.workers} workers warm in {time.perf_counter() - started:.1f}s"
+        )
+
+    async def stop(self) -> None:
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+
+    def _run_locked(self, fn: Callable[..., T], args: tuple) -> T:
+        with self._thread_lock:
+            return fn(*args)
+
+    def _release(self, future: asyncio.Future | None = None) -> None:
+        self.in_flight -= 1
+        self._semaphore.release()
+        if future is not None and not future.cancelled():
+            # Результат отрисовки, которую перестали ждать по таймауту, не нужен
+            future.exception()
+
+    async def _run(self, fn: Callable[..., T], args: tuple) -> T:
+        """Отрисовка в занятом слоте; слот освобождается, когда работа действительно закончена."""
+        executor = self._executor
+        try:
+            if executor is None:
+                future = asyncio.get_running_loop().run_in_executor(None, self._run_locked, fn, args)
+            else:
+                future = _submit(executor, fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        try:
+            # shield: таймаут draw прерывает ожидание, но не отрисовку, и слот остается занятым
+            return await asyncio.shield(future)
+        except BrokenProcessPool:
+            # Пул мог пересоздать уже другой запрос, упавший на том же процессе
+            if self._executor is executor:
+                self.restarts += 1
+                logger.error("Render worker died, restarting pool")
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._create_executor()
+            raise RenderError("процесс отрисовки аварийно завершился") from None
+
+    async def draw(self, fn: Callable[..., T], *args) -> T:
+        """Выполняет fn(*args) из visualization в пуле и возвращает результат (путь к PNG)."""
+        if self.in_flight >= self.capacity and self.queued >= self.max_queue:
+            self.rejected += 1
+            raise RenderError(f"очередь отрисовки заполнена ({self.queued})")
+        started = time.perf_counter()
+        try:
+            async with asyncio.timeout(self.timeout):
+                self.queued += 1
+                try:
+                    await self._semaphore.acquire()
+                finally:
+                    self.queued -= 1
+                self.in_flight += 1
+                rendering = time.perf_counter()
+                self.wait.record(rendering - started)
+                result = await self._run(fn, args)
+        except TimeoutError:
+            self.timed_out += 1
+            raise RenderError(f"диаграмма не построена за {self.timeout:.0f}с") from None
+        except Exception:
+            self.failed += 1
+            raise
+        self.render.record(time.perf_counter() - rendering)
+        self.completed += 1
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers if self._executor is not None else 0,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "failed": self.failed,
+            "completed": self.completed,
+            "restarts": self.restarts,
+            "wait_s": self.wait.snapshot(),
+            "render_s": self.render.snapshot(),
+        }
+
+
+render_pool = RenderPool(RENDER_WORKERS, RENDER_MAX_QUEUE, RENDER_TIMEOUT)
@@ -0,0 +1,313 @@
+"""
+Ответ LLM -> HTML для Telegram за один проход.
+
+Ответ модели — смесь markdown (## заголовки, **жирный**, списки через -)
+и HTML-тегов, которые просит промпт. Токенизатор проходит текст одним
+регулярным выражением: разрешенные Telegram теги сохраняются (незакрытые
+закрываются, лишние закрывающие отбрасываются), markdown превращается в теги,
+блоки ``` убираются, а все остальные <, > и & экранируются — один случайный
+символ больше не ломает все сообщение. markdown_to_parts() делит те же
+токены на сообщения не длиннее лимита Telegram, не разбирая текст второй
+раз: только между токенами или по пробелам внутри текста; открытые теги
+закрываются в конце части и открываются заново в начале следующей.
+"""
+import html
+import re
+from telegram.constants import MessageLimit
+
+# Теги, которые принимает Telegram (parse_mode=HTML)
+ALLOWED_TAGS = {
+    "b", "strong", "i", "em", "u", "ins", "s", "strike", "del",
+    "code", "pre", "a", "span", "tg-spoiler", "blockquote",
+}
+TAG_ALIASES = {f"h{n}": "b" for n in range(1, 7)}
+# Внутри этих тегов разметка не разбирается: Telegram не допускает вложенных сущностей
+RAW_TAGS = {"code", "pre"}
+
+# Разметка начинается только с \n, <, >, & или *: опережающая проверка позволяет
+# движку regex быстро пропускать обычный текст. Конструкции начала строки
+# (``` , ##, -) разбираются вместе с предшествующим переводом строки.
+TOKEN = re.compile(
+    r"(?=[\n<>&*])(?:"
+    r"(?P<newline>\n)(?:(?P<fence>[ \t]*```[\w+-]*[ \t]*(?=\n|$))|(?P<heading>#{1,6}[ \t]+)|(?P<bullet>[ \t]*[-*+][ \t]+))?"
+    r"|(?P<bold>\*\*)"
+    r"|(?P<tag><(?P<closing>/?)(?P<name>[a-zA-Z][a-zA-Z0-9-]*)(?P<attributes>(?:\s[^<>]*)?/?)>)"
+    r"|(?P<entity>&(?:lt|gt|amp|quot|#\d+|#x[0-9a-fA-F]+);)"
+    r"|(?P<stray>[<>&])"
+    r")"
+)
+# Видимый текст вне тегов: часть из одних тегов и пробелов не отправляется
+TEXT_CONTENT = re.compile(r"(?:^|>)[^<]*[^<\s]")
+ATTRIBUTE = re.compile(r"""([a-zA-Z-]+)\s*=\s*(?:"([^"]*)"|'([^']*)')""")
+
+# Токен: (вид, html, имя тега); вид — "text", "open" или "close". Соседний
+# текст склеивается в один токен, кроме перевода строки: по нему split_tokens
+# находит границы абзацев
+Token = tuple[str, str, str]
+NEWLINE: Token = ("text", "\n", "")
+
+
+def escape(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def open_tag(name: str, attributes: str) -> str | None:
+    """HTML открывающего тега с допустимыми атрибутами; None — тег не поддерживается."""
+    if not attributes:
+        return None if name in ("a", "span") else f"<{name}>"
+    attrs = {m.group(1).lower(): m.group(2) if m.group(2) is not None else m.group(3) for m in ATTRIBUTE.finditer(attributes)}
+    if name == "a":
+        href = attrs.get("href")
+        return f'<a href="{html.escape(html.unescape(href))}">' if href else None
+    if name == "span":
+        return '<span class="tg-spoiler">' if attrs.get("class") == "tg-spoiler" else None
+    if name == "code" and attrs.get("class", "").startswith("language-"):
+        return f'<code class="{html.escape(attrs["class"])}">'
+    if name == "blockquote" and re.search(r"\bexpandable\b", attributes):
+        return "<blockquote expandable>"
+    return f"<{name}>"
+
+
+def tokenize(text: str, markdown: bool = True) -> list[Token]:
+    """Разбирает ответ LLM в сбалансированную последовательность токенов.
+
+    markdown=False — только теги и сущности (повторный разбор готового HTML).
+    """
+    tokens: list[Token] = []
+    # Текст после последнего тега или перевода строки, еще не добавленный в tokens
+    pending: list[str] = []
+    # Открытые теги: (имя, вид), вид — "tag", "heading" или "bold" (**)
+    stack: list[tuple[str, str]] = []
+    bold_at = -1
+    # Сколько открыто <code>/<pre>: внутри разметка не разбирается
+    raw = 0
+
+    def flush_text() -> None:
+        if pending:
+            tokens.append(("text", "".join(pending), ""))
+            pending.clear()
+
+    def add_tag(kind: str, rendered: str, name: str) -> None:
+        flush_text()
+        tokens.append((kind, rendered, name))
+
+    def add_newline() -> None:
+        flush_text()
+        tokens.append(NEWLINE)
+
+    def find(name: str) -> int | None:
+        return next((i for i in range(len(stack) - 1, -1, -1) if stack[i][0] == name), None)
+
+    def close_until(index: int) -> None:
+        nonlocal raw
+        while len(stack) > index:
+            name, _ = stack.pop()
+            add_tag("close", f"</{name}>", name)
+            if name in RAW_TAGS:
+                raw -= 1
+
+    def drop_bold(start: int = 0) -> None:
+        """** без пары остается текстом, как в исходном ответе."""
+        nonlocal bold_at
+        for i in range(start, len(stack)):
+            if stack[i][1] == "bold":
+                tokens[bold_at] = ("text", "**", "")
+                del stack[i]
+                bold_at = -1
+                return
+
+    def end_line() -> None:
+        # Пара для ** ищется только в пределах строки
+        drop_bold()
+        for i, (_, kind) in enumerate(stack):
+            if kind == "heading":
+                close_until(i)
+                break
+
+    # Перевод строки в начале делает первую строку такой же, как остальные
+    text = "\n" + text.strip()
+    position = 1
+    # Обычный текст между совпадениями не содержит <, > и & и идет в вывод как есть
+    for match in TOKEN.finditer(text):
+        start = match.start()
+        if start > position:
+            pending.append(text[position:start])
+        position = match.end()
+        kind = match.lastgroup
+        if match.group("newline") is not None:
+            if stack and not raw:
+                end_line()
+            if start:
+                add_newline()
+            if kind == "newline":
+                continue
+            value = text[start + 1:position]
+        else:
+            value = match.group()
+        if kind == "stray":
+            pending.append(escape(value))
+        elif kind == "entity":
+            pending.append(value)
+        elif kind == "tag":
+            closing = match.group("closing")
+            name = match.group("name").lower()
+            name = TAG_ALIASES.get(name, name)
+            attributes = match.group("attributes")
+            self_closing = attributes.endswith("/")
+            # В <pre> допускается только <code>, в <code> — ничего, кроме закрывающих code/pre
+            if name == "br" and not raw:
+                add_newline()
+            elif name not in ALLOWED_TAGS or (
+                raw and not (closing and name in RAW_TAGS or not closing and name == "code" and stack[-1][0] == "pre")
+            ):
+                pending.append(escape(value))
+            elif closing:
+                if stack and stack[-1] == (name, "tag"):
+                    close_until(len(stack) - 1)
+                elif find(name) is not None:
+                    drop_bold(find(name))
+                    index = find(name)
+                    if index is not None:
+                        close_until(index)
+            elif not self_closing:
+                rendered = open_tag(name, attributes)
+                if rendered is None:
+                    pending.append(escape(value))
+                else:
+                    add_tag("open", rendered, name)
+                    stack.append((name, "tag"))
+                    if name in RAW_TAGS:
+                        raw += 1
+        elif raw or not markdown:
+            pending.append(value)
+        elif kind == "fence":
+            # Строка ``` удаляется целиком вместе со своим переводом строки
+            if start and tokens[-1] is NEWLINE:
+                tokens.pop()
+        elif kind == "heading":
+            add_tag("open", "<b>", "b")
+            stack.append(("b", "heading"))
+        elif kind == "bullet":
+            indent = value[: len(value) - len(value.lstrip(" \t"))]
+            pending.append(f"{indent}• ")
+        elif kind == "bold":
+            index = next((i for i, (_, k) in enumerate(stack) if k == "bold"), None)
+            if index is not None:
+                close_until(index)
+                bold_at = -1
+            else:
+                flush_text()
+                bold_at = len(tokens)
+                add_tag("open", "<b>", "b")
+                stack.append(("b", "bold"))
+    if position < len(text):
+        pending.append(text[position:])
+    end_line()
+    close_until(0)
+    flush_text()
+    return tokens
+
+
+def markdown_to_html(text: str) -> str:
+    """Конвертирует ответ LLM (markdown и HTML) в безопасный HTML для Telegram."""
+    return "".join(html for _, html, _ in tokenize(text)).strip()
+
+
+def break_point(text: str, room: int) -> int:
+    """Где резать текст, чтобы первая часть уместилась в room символов."""
+    head = text[:room]
+    for separator in ("\n\n", "\n", " "):
+        index = head.rfind(separator)
+        if index > 0:
+            return index + len(separator)
+    # Пробелов нет: режем посимвольно, но не внутри &amp;-сущности
+    amp = head.rfind("&")
+    if amp >= 0 and ";" not in head[amp:]:
+        return amp
+    return room
+
+
+def markdown_to_parts(text: str, limit: int = MessageLimit.MAX_TEXT_LENGTH) -> list[str]:
+    """markdown_to_html(), сразу разбитый на сообщения не длиннее limit (см. split_tokens)."""
+    return split_tokens(tokenize(text), limit)
+
+
+def split_html(html_text: str, limit: int = MessageLimit.MAX_TEXT_LENGTH) -> list[str]:
+    """Делит готовый HTML на части не длиннее limit; ответ LLM лучше сразу отдавать в markdown_to_parts()."""
+    html_text = html_text.strip()
+    if len(html_text) <= limit:
+        return [html_text] if TEXT_CONTENT.search(html_text) else []
+    return split_tokens(tokenize(html_text, markdown=False), limit)
+
+
+def split_tokens(tokens: list[Token], limit: int) -> list[str]:
+    """Собирает токены в части не длиннее limit символов, каждая — с закрытыми тегами.
+
+    Режет по возможности между абзацами (пустая строка вне тегов), если
+    такая граница есть во второй половине части; иначе — по строке или
+    пробелу внутри текста. Если весь текст помещается в limit, это одна
+    часть, равная markdown_to_html().
+    """
+    if sum(len(value) for _, value, _ in tokens) <= limit:
+        html_text = "".join(value for _, value, _ in tokens).strip()
+        return [html_text] if TEXT_CONTENT.search(html_text) else []
+    chunks: list[str] = []
+    stack: list[tuple[str, str]] = []
+    parts: list[str] = []
+    size = 0
+    # Индекс в parts сразу после последней пустой строки вне тегов
+    paragraph = 0
+
+    def closing() -> int:
+        return sum(len(name) + 3 for name, _ in stack)
+
+    def emit(chunk_parts: list[str], closing_tags: str) -> None:
+        chunk = ("".join(chunk_parts) + closing_tags).strip()
+        if TEXT_CONTENT.search(chunk):
+            chunks.append(chunk)
+
+    def flush(last: bool = False) -> None:
+        nonlocal parts, size, paragraph
+        if not last and paragraph and sum(len(p) for p in parts[:paragraph]) * 2 >= limit:
+            emit(parts[:paragraph], "")
+            parts = parts[paragraph:]
+        else:
+            emit(parts, "".join(f"</{name}>" for name, _ in reversed(stack)))
+            parts = [opened for _, opened in stack]
+        size = sum(len(p) for p in parts)
+        paragraph = 0
+
+    for kind, value, name in tokens:
+        if kind == "open":
+            if size + len(value) + closing() + len(name) + 3 > limit:
+                flush()
+            parts.append(value)
+            size += len(value)
+            stack.append((name, value))
+        elif kind == "close":
+            parts.append(value)
+            size += len(value)
+            stack.pop()
+        else:
+            while value:
+                room = limit - size - closing()
+                if len(value) <= room:
+                    if value == "\n" and not stack and parts and parts[-1] == "\n":
+                        paragraph = len(parts) + 1
+                    parts.append(value)
+                    size += len(value)
+                    break
+                if paragraph:
+                    flush()
+                    continue
+                cut = break_point(value, room) if room > 0 else 0
+                if cut <= 0 and TEXT_CONTENT.search("".join(parts)):
+                    flush()
+                    continue
+                cut = max(cut, 1)
+                parts.append(value[:cut])
+                size += cut
+                value = value[cut:]
+                flush()
+    flush(last=True)
+    return chunks
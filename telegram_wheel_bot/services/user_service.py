@@ -1,5 +1,20 @@
-from telegram_wheel_bot.database.repository import get_or_create_user
+from telegram_wheel_bot.database.async_repository import get_or_create_user_id
+from telegram_wheel_bot.services.cache import TTLCache
+from telegram_wheel_bot.config import USER_CACHE_SIZE, USER_CACHE_TTL
 
+# telegram_id -> id пользователя в БД; избавляет от запроса к БД на каждый апдейт
+_user_ids: TTLCache[int, int] = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
 
-def register_user(telegram_id: int, username: str | None, first_name: str | None):
-    return get_or_create_user(telegram_id, username, first_name)
+
+async def register_user(telegram_id: int, username: str | None, first_name: str | None) -> int:
+    """Возвращает id пользователя в БД, создавая запись при первом обращении."""
+    user_id = _user_ids.get(telegram_id)
+    if user_id is None:
+        user_id = await get_or_create_user_id(telegram_id, username, first_name)
+        _user_ids.set(telegram_id, user_id)
+    return user_id
+
+
+def forget_user(telegram_id: int) -> None:
+    """Удаляет пользователя из кэша (после удаления его данных из БД)."""
+    _user_ids.pop(telegram_id)
@@ -1,3 +1,4 @@
+import io
 import os
 import numpy as np
 import matplotlib.pyplot as plt
@@ -9,6 +10,16 @@ def ensure_dir(path: str) -> None:
         os.makedirs(path, exist_ok=True)
 
 
+def warm_up() -> None:
+    """Пробная отрисовка в память: заранее загружает шрифты и полярную проекцию."""
+    fig, ax = plt.subplots(figsize=(2, 2), subplot_kw=dict(projection="polar"))
+    ax.set_xticks([0, np.pi])
+    ax.set_xticklabels(["Семья", "Работа/бизнес"], fontweight="bold")
+    ax.set_title("Колесо Жизни", fontweight="bold")
+    fig.savefig(io.BytesIO(), format="png", dpi=50, bbox_inches="tight")
+    plt.close(fig)
+
+
 def draw_wheel(wheel_id: int, scores_ordered: list[tuple[str, int]]) -> str:
     ensure_dir(WHEELS_DIR)
     categories = [c for c, _ in scores_ordered]
@@ -117,6 +128,10 @@ def draw_wheel_new(wheel_id: int, scores_ordered: list[tuple[str, int]]) -> str:
     return path
 
 
+def comparison_path(wheel_id_1: int, wheel_id_2: int) -> str:
+    return os.path.join(WHEELS_DIR, f"comparison_{wheel_id_1}_{wheel_id_2}.png")
+
+
 def draw_wheel_comparison(
     wheel_id_1: int,
     wheel_id_2: int,
@@ -144,7 +159,7 @@ def draw_wheel_comparison(
     ax.set_yticks(list(range(1, 11)))
     ax.grid(True)
     ax.legend(loc="upper right", bbox_to_anchor=(1.3, 1.1))
-    path = os.path.join(WHEELS_DIR, f"comparison_{wheel_id_1}_{wheel_id_2}.png")
+    path = comparison_path(wheel_id_1, wheel_id_2)
     plt.savefig(path, dpi=150, bbox_inches="tight")
     plt.close()
     return path
@@ -1,43 +1,48 @@
-from telegram_wheel_bot.database.repository import (
+import asyncio
+from telegram_wheel_bot.database.async_repository import (
     create_wheel_with_categories,
     update_wheel_analysis,
-    get_wheel_scores,
 )
+from telegram_wheel_bot.database.score_vector import CATEGORIES
 from telegram_wheel_bot.services.visualization import draw_wheel, draw_wheel_new
-from telegram_wheel_bot.services.llm_service import analyze_wheel
+from telegram_wheel_bot.services.render_pool import render_pool
+from telegram_wheel_bot.services.llm_service import stream_analysis
+from telegram_wheel_bot.services.prompts import prompts
 
 
-async def create_and_analyze_wheel(
+async def create_wheel(
     user_id: int, name: str, scores: dict[str, int]
-) -> tuple[int, str | None, str]:
-    ordered = [
-        ("Семья", scores.get("Семья", 0)),
-        ("Друзья", scores.get("Друзья", 0)),
-        ("Здоровье", scores.get("Здоровье", 0)),
-        ("Хобби", scores.get("Хобби", 0)),
-        ("Деньги", scores.get("Деньги", 0)),
-        ("Отдых", scores.get("Отдых", 0)),
-        ("Личное развитие", scores.get("Личное развитие", 0)),
-        ("Работа/бизнес", scores.get("Работа/бизнес", 0)),
-    ]
-    wheel = create_wheel_with_categories(user_id, name, ordered)
-    legacy_img = None
-    try:
-        legacy_img = draw_wheel(wheel.id, ordered)
-    except Exception:
+) -> tuple[int, str | None]:
+    """Сохраняет колесо и рисует диаграмму; анализ запрашивается отдельно."""
+    ordered = [(c, scores.get(c, 0)) for c in CATEGORIES]
+    wheel_id = await create_wheel_with_categories(user_id, name, ordered)
+    # Обе диаграммы рисуются параллельно в пуле процессов, не блокируя бота
+    legacy_img, img = await asyncio.gather(
+        render_pool.draw(draw_wheel, wheel_id, ordered),
+        render_pool.draw(draw_wheel_new, wheel_id, ordered),
+        return_exceptions=True,
+    )
+    if isinstance(legacy_img, BaseException):
         legacy_img = None
-    img = None
-    try:
-        img = draw_wheel_new(wheel.id, ordered)
-    except Exception:
+    if isinstance(img, BaseException):
         img = legacy_img
-    analysis = await analyze_wheel({k: v for k, v in ordered})
-    try:
-        update_wheel_analysis(wheel.id, analysis)
-    except Exception:
-        pass
-    return wheel.id, img, analysis
+    return wheel_id, img
 
 
-def get_wheel_scores_dict(wheel_id: int) -> dict[str, int]:
-    return get_wheel_scores(wheel_id)
+def ordered_scores(scores: dict[str, int]) -> dict[str, int]:
+    return {c: scores.get(c, 0) for c in CATEGORIES}
+
+
+def analysis_prompt_version() -> str:
+    """Версия промпта анализа: сохраняется с анализом, чтобы найти устаревшие (reanalyze --mode stale)."""
+    return prompts.get("wheel_analysis").version
+
+
+async def save_analysis(wheel_id: int, analysis: str) -> None:
+    """Сохраняет анализ колеса; ошибка записи пробрасывается (задача анализа повторится)."""
+    await update_wheel_analysis(wheel_id, analysis, analysis_prompt_version())
+
+
+def stream_wheel_analysis(scores: dict[str, int]):
+    """Фрагменты анализа колеса по мере генерации (см. llm_service.stream_analysis)."""
+    return stream_analysis(ordered_scores(scores))
@@ -64,6 +64,14 @@ def last_three_months_labels(today: datetime | None = None) -> list[str]:
     return labels
 
 
+def period_from_name(name: str) -> date | None:
+    """Первое число месяца, за который построено колесо, или None, если название не распознано."""
+    try:
+        return parse_month_label(name)
+    except ValueError:
+        return None
+
+
 def parse_month_label(label: str) -> date:
     s = label.strip().lower()
     parts = s.split()